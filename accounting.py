@@ -0,0 +1,170 @@
+import os
+import time
+import atexit
+import threading
+from models import Session as UserSession
+from storage import IntegrityError, DataError
+from config import Config
+
+
+# sessions.data_used is DECIMAL(10,2) and time_used INT; larger totals cannot be stored.
+MAX_DATA_USED = 99999999.99
+MAX_TIME_USED = 2 ** 31 - 1
+
+# Errors caused by the values in a chunk rather than by the database being unavailable.
+_REJECTED = IntegrityError + DataError + (ArithmeticError, ValueError)
+
+
+# ----------------------------------------------------------
+# USAGE ACCUMULATOR (INTERIM-UPDATE INGESTION)
+# ----------------------------------------------------------
+class UsageAccumulator:
+    """Coalesces gateway usage reports per session and flushes them in batches.
+
+    Reports carry cumulative counters, so coalescing keeps the highest value
+    seen for each session; a flush applies one row per session no matter how
+    many reports arrived in between. Flushes run every ``flush_interval_ms``
+    or once ``max_pending`` sessions are waiting. A chunk the database
+    rejects is split until the offending sessions are isolated; those are
+    discarded (counted under ``rejected``) so they cannot hold back the rest.
+    """
+
+    def __init__(self, flush_interval_ms=1000, max_pending=5000, chunk_size=500):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._listeners = []
+        self._stats = {
+            'received': 0,
+            'coalesced': 0,
+            'flushes': 0,
+            'sessions_flushed': 0,
+            'users_charged': 0,
+            'failures': 0,
+            'rejected': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    # ------------------------------------------------------
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pending = {}
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='usage-accumulator', daemon=True)
+            self._thread.start()
+
+    def add_listener(self, callback):
+        """Call ``callback(user_ids)`` after each flush that charged balances."""
+        self._listeners.append(callback)
+
+    def record(self, updates):
+        """Merge an iterable of (session_id, data_used, time_used) reports."""
+        self._ensure_started()
+        count = 0
+        with self._lock:
+            pending = self._pending
+            for session_id, data_used, time_used in updates:
+                count += 1
+                current = pending.get(session_id)
+                if current is None:
+                    pending[session_id] = (data_used, time_used)
+                else:
+                    self._stats['coalesced'] += 1
+                    pending[session_id] = (max(current[0], data_used), max(current[1], time_used))
+            self._stats['received'] += count
+            backlog = len(pending)
+        if backlog >= self.max_pending:
+            self._wakeup.set()
+        return count
+
+    # ------------------------------------------------------
+    def _merge_back(self, batch):
+        with self._lock:
+            for session_id, (data_used, time_used) in batch.items():
+                current = self._pending.get(session_id)
+                if current is None:
+                    self._pending[session_id] = (data_used, time_used)
+                else:
+                    self._pending[session_id] = (max(current[0], data_used), max(current[1], time_used))
+
+    def flush(self):
+        """Apply everything pending; chunks that fail to reach the DB are kept for the next flush."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        session_ids = list(batch)
+        for i in range(0, len(session_ids), self.chunk_size):
+            self._apply({sid: batch[sid] for sid in session_ids[i:i + self.chunk_size]})
+
+        self._stats['flushes'] += 1
+        self._stats['last_flush_ms'] = (time.perf_counter() - started) * 1000
+
+    def _apply(self, chunk):
+        try:
+            user_ids = UserSession.apply_usage(chunk)
+        except _REJECTED as e:
+            self._stats['failures'] += 1
+            if len(chunk) == 1:
+                print(f"[ACCOUNTING ERROR] Discarding usage for session {next(iter(chunk))}: {e}")
+                self._stats['rejected'] += 1
+                return
+            # Retry each half so one bad session does not keep the others from being charged.
+            items = list(chunk.items())
+            half = len(items) // 2
+            self._apply(dict(items[:half]))
+            self._apply(dict(items[half:]))
+            return
+        except Exception as e:
+            print(f"[ACCOUNTING ERROR] Flush of {len(chunk)} sessions failed: {e}")
+            self._stats['failures'] += 1
+            self._merge_back(chunk)
+            return
+        self._stats['sessions_flushed'] += len(chunk)
+        self._stats['users_charged'] += len(user_ids)
+        for callback in self._listeners:
+            try:
+                callback(user_ids)
+            except Exception as e:
+                print(f"[ACCOUNTING ERROR] Listener failed: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def shutdown(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_sessions'] = len(self._pending)
+        return stats
+
+
+usage_accumulator = UsageAccumulator(
+    flush_interval_ms=Config.ACCOUNTING_FLUSH_MS,
+    max_pending=Config.ACCOUNTING_MAX_PENDING,
+    chunk_size=Config.ACCOUNTING_CHUNK_SIZE,
+)
+atexit.register(usage_accumulator.shutdown)
@@ -1,12 +1,33 @@
 from flask import (
-    Blueprint, render_template, session, redirect, url_for, request,
-    jsonify, flash, send_file
+    Blueprint, render_template, redirect, url_for, request,
+    jsonify, flash, send_file, send_from_directory, Response, stream_with_context
 )
-from models import User, Plan, Voucher, Session as UserSession, Payment, get_db_connection
-from utils import log_action, generate_voucher_code, format_data_size, format_time_duration
-import csv
-import io
-from datetime import datetime
+from models import (
+    User, Plan, Voucher, Session as UserSession, Stats, Rollups, get_db_connection, get_pool,
+    is_valid_cursor
+)
+from utils import (
+    log_action, generate_voucher_codes, generate_report_filename, format_data_size, format_time_duration,
+    get_log_writer_stats
+)
+from config import Config
+from sweeper import session_sweeper
+from accounting import usage_accumulator
+from metrics import db_metrics
+from hashing import password_hasher
+from admission import admission_control
+from log_archive import log_archiver
+from assets import asset_pipeline
+from tokens import current_identity, current_user_id, token_revocations
+from session_index import session_index
+from voucher_filter import voucher_filter
+from reports import REPORT_QUERIES, parse_report_date
+from report_jobs import report_jobs
+from user_import import UserImport, import_dir, import_running
+import os
+import hmac
+import json
+from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -15,9 +36,12 @@ admin_bp = Blueprint('admin', __name__)
 # ADMIN LOGIN REQUIRED DECORATOR
 # ----------------------------------------------------------
 def admin_required(f):
-    """Ensure only admin can access the route."""
+    """Ensure only admin can access the route (portal session or bearer access token)."""
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session or session.get('role') != 'admin':
+        identity = current_identity()
+        if identity is None or identity['role'] != 'admin':
+            if request.headers.get('Authorization'):
+                return jsonify({'success': False, 'message': 'Admin login required'}), 403
             flash("Access denied! Admin login required.", "error")
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -25,51 +49,65 @@ def admin_required(f):
     return decorated_function
 
 
+def metrics_access_required(f):
+    """Admin session, or the METRICS_TOKEN bearer token for scrapers."""
+    def decorated_function(*args, **kwargs):
+        auth = request.headers.get('Authorization', '')
+        if Config.METRICS_TOKEN and hmac.compare_digest(auth, f'Bearer {Config.METRICS_TOKEN}'):
+            return f(*args, **kwargs)
+        identity = current_identity()
+        if identity is None or identity['role'] != 'admin':
+            return jsonify({'success': False, 'message': 'Admin login or metrics token required'}), 401
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+
+# ----------------------------------------------------------
+# LISTING PAGINATION HELPERS
+# ----------------------------------------------------------
+def _listing_filters(*names):
+    """Non-empty filter values from the query string, plus sort/order/dates."""
+    keys = names + ('sort', 'order', 'start', 'end', 'per_page')
+    return {key: request.args[key] for key in keys if request.args.get(key)}
+
+
+def _page_args():
+    """Keyset page arguments shared by the admin listings."""
+    try:
+        start_date = parse_report_date(request.args.get('start'))
+        end_date = parse_report_date(request.args.get('end'))
+    except ValueError:
+        flash('Invalid date range. Use YYYY-MM-DD.', 'error')
+        start_date = end_date = None
+    after, before = request.args.get('after'), request.args.get('before')
+    if not all(is_valid_cursor(token) for token in (after, before) if token):
+        flash('Invalid page link. Showing the first page.', 'error')
+        after = before = None
+    per_page = request.args.get('per_page', Config.ADMIN_PAGE_SIZE, type=int)
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'sort': request.args.get('sort', 'id'),
+        'descending': request.args.get('order', 'desc') != 'asc',
+        'after': after,
+        'before': before,
+        'limit': max(1, min(per_page, Config.ADMIN_MAX_PAGE_SIZE)),
+    }
+
+
 # ----------------------------------------------------------
 # ADMIN DASHBOARD
 # ----------------------------------------------------------
 @admin_bp.route('/dashboard')
 @admin_required
 def dashboard():
-    conn = get_db_connection()
-    if not conn:
+    stats = Stats.get_dashboard()
+    if stats is None:
         flash('Database connection error', 'error')
         return redirect(url_for('auth.login'))
 
-    cursor = conn.cursor()
-
-    try:
-        # User stats
-        cursor.execute("SELECT COUNT(*) as total_users FROM users WHERE role = 'user'")
-        user_stats = cursor.fetchone() or {'total_users': 0}
-
-        cursor.execute("SELECT COUNT(*) as active_users FROM users WHERE role = 'user' AND status = 'active'")
-        active_users = cursor.fetchone() or {'active_users': 0}
-
-        # Session stats
-        cursor.execute("SELECT COUNT(*) as active_sessions FROM sessions WHERE status = 'active'")
-        session_stats = cursor.fetchone() or {'active_sessions': 0}
-
-        # Revenue stats
-        revenue_stats = Payment.get_revenue_stats() or {'total_revenue': 0, 'total_transactions': 0}
-
-        # Voucher stats
-        cursor.execute("SELECT COUNT(*) as total_vouchers, SUM(status = 'unused') as unused_vouchers FROM vouchers")
-        voucher_stats = cursor.fetchone() or {'total_vouchers': 0, 'unused_vouchers': 0}
-
-        stats = {
-            'total_users': user_stats['total_users'],
-            'active_users': active_users['active_users'],
-            'active_sessions': session_stats['active_sessions'],
-            'total_revenue': revenue_stats.get('total_revenue', 0) or 0,
-            'total_transactions': revenue_stats.get('total_transactions', 0) or 0,
-            'total_vouchers': voucher_stats['total_vouchers'] or 0,
-            'unused_vouchers': voucher_stats['unused_vouchers'] or 0
-        }
-
-        return render_template('admin_dashboard.html', stats=stats)
-    finally:
-        conn.close()
+    return render_template('admin_dashboard.html', stats=stats)
 
 
 # ----------------------------------------------------------
@@ -78,11 +116,12 @@ def dashboard():
 @admin_bp.route('/users')
 @admin_required
 def manage_users():
-    users = User.get_all() or []
-    for user in users:
+    filters = _listing_filters('role', 'status')
+    page = User.get_page(role=filters.get('role'), status=filters.get('status'), **_page_args())
+    for user in page['items']:
         user['data_balance_formatted'] = format_data_size(user.get('data_balance', 0) * 1024 * 1024)
         user['time_balance_formatted'] = format_time_duration(user.get('time_balance', 0))
-    return render_template('manage_users.html', users=users)
+    return render_template('manage_users.html', users=page['items'], page=page, filters=filters)
 
 
 @admin_bp.route('/users/<int:user_id>/toggle_status', methods=['POST'])
@@ -102,7 +141,11 @@ def toggle_user_status(user_id):
             new_status = 'inactive' if user['status'] == 'active' else 'active'
             cursor.execute("UPDATE users SET status = %s WHERE id = %s", (new_status, user_id))
             conn.commit()
-            log_action(session['user_id'], 'user_status_change', f"Changed user {user_id} status to {new_status}")
+            Stats.invalidate()
+            if new_status != 'active':
+                # Bearer tokens carry the status claim; make them stop working now.
+                token_revocations.revoke_user(user_id)
+            log_action(current_user_id(), 'user_status_change', f"Changed user {user_id} status to {new_status}")
             flash(f'User status updated to {new_status}', 'success')
     except Exception as e:
         flash(f"Error updating user: {e}", 'error')
@@ -112,16 +155,52 @@ def toggle_user_status(user_id):
     return redirect(url_for('admin.manage_users'))
 
 
+# ----------------------------------------------------------
+# BULK USER IMPORT
+# ----------------------------------------------------------
+@admin_bp.route('/users/import', methods=['POST'])
+@admin_required
+def import_users():
+    """Create users from a CSV upload; progress and rejected rows stream back as server-sent events."""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': 'Choose a CSV file to import'}), 400
+    if import_running():
+        return jsonify({'success': False, 'message': 'A user import is already running'}), 409
+    try:
+        job = UserImport.from_upload(upload, chunk_size=Config.USER_IMPORT_CHUNK,
+                                     hash_processes=Config.USER_IMPORT_HASH_PROCESSES)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'message': f"Not a usable CSV file: {e}"}), 400
+
+    admin_id = current_user_id()
+
+    def events():
+        for event, data in job.run():
+            if event == 'done':
+                log_action(admin_id, 'users_import',
+                           f"Imported {data['created']} users ({data['failed']} rows rejected) in {data['elapsed']}s")
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@admin_bp.route('/users/import/reports/<path:filename>')
+@admin_required
+def import_report(filename):
+    return send_from_directory(os.path.abspath(import_dir()), filename, as_attachment=True)
+
+
 # ----------------------------------------------------------
 # MANAGE PLANS
 # ----------------------------------------------------------
 @admin_bp.route('/plans')
 @admin_required
 def manage_plans():
-    plans = Plan.get_all() or []
-    for plan in plans:
-        plan['data_limit_formatted'] = format_data_size(plan.get('data_limit', 0) * 1024 * 1024)
-        plan['time_limit_formatted'] = format_time_duration(plan.get('time_limit', 0))
+    plans = Plan.get_all_formatted()
     return render_template('manage_plans.html', plans=plans)
 
 
@@ -138,7 +217,7 @@ def create_plan():
 
         plan_id = Plan.create(name, description, data_limit, time_limit, price, validity_days)
         if plan_id:
-            log_action(session['user_id'], 'plan_create', f"Created plan: {name}")
+            log_action(current_user_id(), 'plan_create', f"Created plan: {name}")
             flash('Plan created successfully!', 'success')
         else:
             flash('Error creating plan', 'error')
@@ -154,9 +233,11 @@ def create_plan():
 @admin_bp.route('/vouchers')
 @admin_required
 def manage_vouchers():
-    vouchers = Voucher.get_all() or []
+    filters = _listing_filters('status', 'plan_id')
+    page = Voucher.get_page(status=filters.get('status'), plan_id=filters.get('plan_id'), **_page_args())
     plans = Plan.get_all() or []
-    return render_template('manage_vouchers.html', vouchers=vouchers, plans=plans)
+    return render_template('manage_vouchers.html', vouchers=page['items'], plans=plans,
+                           page=page, filters=filters)
 
 
 @admin_bp.route('/vouchers/generate', methods=['POST'])
@@ -169,23 +250,22 @@ def generate_vouchers():
         flash("Please select a plan to generate vouchers.", "error")
         return redirect(url_for('admin.manage_vouchers'))
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    if quantity < 1 or quantity > Config.VOUCHER_MAX_BATCH:
+        flash(f"Quantity must be between 1 and {Config.VOUCHER_MAX_BATCH}.", "error")
+        return redirect(url_for('admin.manage_vouchers'))
 
     try:
-        generated_codes = []
-        for _ in range(quantity):
-            code = generate_voucher_code()
-            cursor.execute("INSERT INTO vouchers (code, plan_id) VALUES (%s, %s)", (code, plan_id))
-            generated_codes.append(code)
-        conn.commit()
-        log_action(session['user_id'], 'vouchers_generate', f"Generated {quantity} vouchers for plan {plan_id}")
-        flash(f'Generated {quantity} vouchers successfully!', 'success')
+        result = Voucher.bulk_create(plan_id, quantity, generate_voucher_codes,
+                                     chunk_size=Config.VOUCHER_INSERT_CHUNK)
+        log_action(
+            current_user_id(), 'vouchers_generate',
+            f"Generated {result['generated']} vouchers for plan {plan_id} "
+            f"in {result['elapsed']:.2f}s ({result['collisions']} collisions regenerated)"
+        )
+        flash(f"Generated {result['generated']} vouchers successfully! "
+              f"({result['rate']:.0f} vouchers/sec)", 'success')
     except Exception as e:
-        conn.rollback()
         flash(f"Error generating vouchers: {e}", 'error')
-    finally:
-        conn.close()
 
     return redirect(url_for('admin.manage_vouchers'))
 
@@ -196,8 +276,11 @@ def generate_vouchers():
 @admin_bp.route('/sessions')
 @admin_required
 def view_sessions():
-    sessions = UserSession.get_active_sessions() or []
-    return render_template('sessions.html', sessions=sessions)
+    filters = _listing_filters('status', 'user_id')
+    filters.setdefault('status', 'active')
+    page = UserSession.get_page(status=filters['status'] if filters['status'] != 'all' else None,
+                                user_id=filters.get('user_id'), **_page_args())
+    return render_template('sessions.html', sessions=page['items'], page=page, filters=filters)
 
 
 @admin_bp.route('/sessions/<int:session_id>/terminate', methods=['POST'])
@@ -205,74 +288,218 @@ def view_sessions():
 def terminate_session(session_id):
     try:
         UserSession.terminate_session(session_id)
-        log_action(session['user_id'], 'session_terminate', f"Terminated session: {session_id}")
+        log_action(current_user_id(), 'session_terminate', f"Terminated session: {session_id}")
         flash('Session terminated successfully', 'success')
     except Exception as e:
         flash(f"Error terminating session: {e}", 'error')
     return redirect(url_for('admin.view_sessions'))
 
 
+@admin_bp.route('/sessions/sweeper')
+@admin_required
+def sweeper_stats():
+    return jsonify(session_sweeper.stats())
+
+
+@admin_bp.route('/sessions/sweeper/run', methods=['POST'])
+@admin_required
+def run_sweeper():
+    expired = session_sweeper.sweep()
+    flash(f'Sweep expired {expired} sessions', 'success')
+    return redirect(url_for('admin.view_sessions'))
+
+
 # ----------------------------------------------------------
 # REPORT EXPORTS
 # ----------------------------------------------------------
 @admin_bp.route('/reports')
 @admin_required
 def reports():
-    return render_template('reports.html')
+    try:
+        start_date = parse_report_date(request.args.get('start'))
+        end_date = parse_report_date(request.args.get('end'))
+    except ValueError:
+        flash('Invalid date range. Use YYYY-MM-DD.', 'error')
+        start_date = end_date = None
+
+    end_date = (end_date or datetime.now()).date()
+    start_date = start_date.date() if start_date else end_date - timedelta(days=Config.REPORT_DEFAULT_DAYS - 1)
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+
+    summary = Rollups.summary(start_date, end_date)
+    trend = Rollups.trend(start_date, end_date)
+    if summary is None or trend is None:
+        flash('Database connection error', 'error')
+    return render_template('reports.html', summary=summary, trend=trend or [],
+                           start=start_date.isoformat(), end=end_date.isoformat(),
+                           exports=report_jobs.recent())
 
 
 @admin_bp.route('/reports/export/<report_type>')
 @admin_required
 def export_report(report_type):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    filename = f'{report_type}_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    """Download a report, built in the background and reused until its data changes.
+
+    Waits up to REPORT_JOB_WAIT seconds; a longer export keeps running and
+    shows up under Recent Exports on the reports page.
+    """
+    if report_type not in REPORT_QUERIES:
+        flash('Invalid report type', 'error')
+        return redirect(url_for('admin.reports'))
+
+    job, error = _submit_report(report_type, request.args)
+    if error:
+        flash(error[0]['message'], 'error')
+        return redirect(url_for('admin.reports'))
 
+    job = report_jobs.wait(job['id'], Config.REPORT_JOB_WAIT) or job
+    if job['status'] == 'done':
+        return _send_report(job)
+    if job['status'] == 'failed':
+        flash(f"Error exporting report: {job['error']}", 'error')
+    else:
+        flash('The report is still being generated; download it from Recent Exports when it is ready.', 'success')
+    return redirect(url_for('admin.reports'))
+
+
+def _submit_report(report_type, args):
+    """Queue (or reuse) an export from request args: (job, None) or (None, (payload, status))."""
+    try:
+        start_date = parse_report_date(args.get('start'))
+        end_date = parse_report_date(args.get('end'))
+    except ValueError:
+        return None, ({'success': False, 'message': 'Invalid date range. Use YYYY-MM-DD.'}, 400)
     try:
-        if report_type == 'users':
-            cursor.execute("""
-                SELECT id, username, email, phone, status, data_balance, time_balance, created_at 
-                FROM users WHERE role = 'user'
-            """)
-
-        elif report_type == 'payments':
-            cursor.execute("""
-                SELECT p.id, u.username, pl.name as plan_name, p.amount, p.payment_method, p.status, p.created_at
-                FROM payments p
-                JOIN users u ON p.user_id = u.id
-                LEFT JOIN plans pl ON p.plan_id = pl.id
-                ORDER BY p.created_at DESC
-            """)
-
-        elif report_type == 'sessions':
-            cursor.execute("""
-                SELECT s.id, u.username, s.device_mac, s.ip_address, s.start_time, s.end_time, 
-                       s.data_used, s.time_used, s.status
-                FROM sessions s
-                JOIN users u ON s.user_id = u.id
-                ORDER BY s.start_time DESC
-            """)
+        job = report_jobs.submit(report_type, start_date, end_date, compress=args.get('gzip') in ('1', 'true', True))
+    except Exception as e:
+        return None, ({'success': False, 'message': f"Error exporting report: {e}"}, 500)
+    log_action(current_user_id(), 'report_export', f"Requested {report_type} report ({job['status']})")
+    return job, None
 
-        else:
-            flash('Invalid report type', 'error')
-            return redirect(url_for('admin.reports'))
 
-        data = cursor.fetchall() or []
-        output = io.StringIO()
-        if data:
-            writer = csv.DictWriter(output, fieldnames=data[0].keys())
-            writer.writeheader()
-            writer.writerows(data)
+def _send_report(job):
+    path = report_jobs.path(job['id'])
+    if not path:
+        return jsonify({'success': False, 'message': 'Report is not ready'}), 409
+    filename = generate_report_filename(job['type']) + ('.gz' if job['gzip'] else '')
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=filename,
+                     mimetype='application/gzip' if job['gzip'] else 'text/csv')
+
 
-        mem = io.BytesIO(output.getvalue().encode('utf-8'))
-        output.close()
-        mem.seek(0)
+@admin_bp.route('/reports/jobs', methods=['POST'])
+@admin_required
+def create_report_job():
+    """Queue an export: {"type": "payments", "start": "...", "end": "...", "gzip": false}."""
+    args = request.get_json(silent=True) or request.form
+    report_type = args.get('type')
+    if report_type not in REPORT_QUERIES:
+        return jsonify({'success': False, 'message': 'Invalid report type'}), 400
+    job, error = _submit_report(report_type, args)
+    if error:
+        return jsonify(error[0]), error[1]
+    return jsonify(_job_payload(job)), 200 if job['status'] == 'done' else 202
+
+
+@admin_bp.route('/reports/jobs')
+@admin_required
+def list_report_jobs():
+    return jsonify({'success': True, 'jobs': [_job_payload(job) for job in report_jobs.recent()]})
+
+
+@admin_bp.route('/reports/jobs/<job_id>')
+@admin_required
+def report_job_status(job_id):
+    job = report_jobs.status(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown report job'}), 404
+    return jsonify(_job_payload(job))
 
-        log_action(session['user_id'], 'report_export', f"Exported {report_type} report")
 
-        return send_file(mem, as_attachment=True, download_name=filename, mimetype='text/csv')
+@admin_bp.route('/reports/jobs/<job_id>/download')
+@admin_required
+def download_report_job(job_id):
+    job = report_jobs.status(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown report job'}), 404
+    return _send_report(job)
+
+
+def _job_payload(job):
+    payload = dict(job, success=job['status'] != 'failed',
+                   status_url=url_for('admin.report_job_status', job_id=job['id']))
+    if job['status'] == 'done':
+        payload['download_url'] = url_for('admin.download_report_job', job_id=job['id'])
+    return payload
+
+
+# ----------------------------------------------------------
+# ACTIVITY LOGS (live table + archive)
+# ----------------------------------------------------------
+@admin_bp.route('/logs')
+@admin_required
+def query_logs():
+    """Activity log rows for a user and/or date range, newest first."""
+    try:
+        user_id = request.args.get('user_id', type=int)
+        start_date = parse_report_date(request.args.get('start'))
+        end_date = parse_report_date(request.args.get('end'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date range. Use YYYY-MM-DD.'}), 400
+    limit = min(request.args.get('limit', Config.ADMIN_PAGE_SIZE, type=int), Config.ADMIN_MAX_PAGE_SIZE)
+
+    try:
+        rows = log_archiver.query(user_id=user_id, start_date=start_date, end_date=end_date,
+                                  action=request.args.get('action') or None, limit=max(1, limit))
     except Exception as e:
-        flash(f"Error exporting report: {e}", 'error')
-        return redirect(url_for('admin.reports'))
-    finally:
-        conn.close()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    for row in rows:
+        row['timestamp'] = row['timestamp'].isoformat(' ')
+    return jsonify({'success': True, 'logs': rows, 'count': len(rows)})
+
+
+@admin_bp.route('/logs/archive', methods=['POST'])
+@admin_required
+def archive_logs():
+    """Run log archival now instead of waiting for the next interval."""
+    archived = log_archiver.archive()
+    return jsonify({'success': True, 'archived': archived, 'stats': log_archiver.stats()})
+
+
+# ----------------------------------------------------------
+# METRICS
+# ----------------------------------------------------------
+@admin_bp.route('/metrics')
+@metrics_access_required
+def metrics():
+    components = {
+        'audit_log': get_log_writer_stats(),
+        'accounting': usage_accumulator.stats(),
+        'session_sweeper': session_sweeper.stats(),
+        'log_archive': log_archiver.stats(),
+        'assets': asset_pipeline.stats(),
+        'token_revocations': token_revocations.stats(),
+        'session_index': session_index.stats(),
+        'voucher_filter': voucher_filter.stats(),
+        'report_jobs': report_jobs.stats(),
+        'password_hasher': password_hasher.stats(),
+    }
+    for name, stats in admission_control.stats().items():
+        components[f'admission_{name}'] = stats
+    if Config.DB_POOL_ENABLED:
+        components['db_pool'] = get_pool().stats()
+    return Response(db_metrics.render(components), mimetype='text/plain; version=0.0.4')
+
+
+@admin_bp.route('/metrics/admission')
+@metrics_access_required
+def admission_metrics():
+    """Admission control counters per endpoint class."""
+    return jsonify(admission_control.stats())
+
+
+@admin_bp.route('/metrics/queries')
+@metrics_access_required
+def query_metrics():
+    """Per-endpoint query totals, the slow-query log and repeated reads."""
+    return jsonify(db_metrics.snapshot())
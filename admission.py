@@ -0,0 +1,234 @@
+import math
+import time
+import threading
+import collections
+from flask import g, request, jsonify, render_template, flash
+from config import Config
+from tokens import current_user_id
+
+
+# ----------------------------------------------------------
+# TOKEN BUCKETS
+# ----------------------------------------------------------
+class TokenBuckets:
+    """One token bucket per key, refilled at ``rate`` tokens/s up to ``burst``.
+
+    Buckets live in an LRU-ordered dict capped at ``max_keys``; an evicted
+    key simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Spend one token; returns 0 if allowed, else seconds until one is available."""
+        if self.rate <= 0 or key is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# ----------------------------------------------------------
+# ENDPOINT CLASS LIMITS
+# ----------------------------------------------------------
+class EndpointClass:
+    """Per-IP and per-account rate limits plus a concurrency cap."""
+
+    def __init__(self, name, ip_rate, ip_burst, account_rate, account_burst,
+                 concurrency, queue_timeout=0.25, max_keys=100000):
+        self.name = name
+        self.by_ip = TokenBuckets(ip_rate, ip_burst, max_keys)
+        self.by_account = TokenBuckets(account_rate, account_burst, max_keys)
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._stats = {
+            'admitted': 0,
+            'rejected_ip': 0,
+            'rejected_account': 0,
+            'rejected_busy': 0,
+            'queued': 0,
+            'queue_wait_ms': 0.0,
+            'in_flight': 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def admit(self, ip, account):
+        """Returns (status, retry_after) on rejection, or None once a slot is held."""
+        wait = self.by_ip.take(ip)
+        if wait:
+            self._count('rejected_ip')
+            return 429, wait
+        wait = self.by_account.take(account)
+        if wait:
+            self._count('rejected_account')
+            return 429, wait
+
+        if not self._slots.acquire(blocking=False):
+            self._count('queued')
+            started = time.perf_counter()
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+            self._count('queue_wait_ms', (time.perf_counter() - started) * 1000)
+            if not acquired:
+                self._count('rejected_busy')
+                return 503, 1
+        with self._lock:
+            self._stats['admitted'] += 1
+            self._stats['in_flight'] += 1
+        return None
+
+    def release(self):
+        with self._lock:
+            self._stats['in_flight'] -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'concurrency': self.concurrency,
+            'tracked_ips': len(self.by_ip),
+            'tracked_accounts': len(self.by_account),
+        })
+        return stats
+
+
+# ----------------------------------------------------------
+# ADMISSION CONTROLLER
+# ----------------------------------------------------------
+def _login_account():
+    # Voucher logins have no account yet; they are limited per IP only.
+    data = request.form or request.get_json(silent=True)
+    if not hasattr(data, 'get'):
+        return None
+    username = data.get('username') or data.get('email')
+    return username.strip().lower() if isinstance(username, str) and username.strip() else None
+
+
+def _session_account():
+    return current_user_id()
+
+
+class AdmissionController:
+    """Sheds load on the expensive POST endpoints before they reach the DB or KDF.
+
+    Each guarded endpoint maps to an endpoint class. A request must get a
+    token from its client IP's bucket and its account's bucket (429 when
+    either is empty), then one of the class's concurrency slots, waiting
+    at most ``queue_timeout`` (503 otherwise). Both carry Retry-After.
+    The client IP is ``request.remote_addr``, which is only the real
+    client behind a proxy when ``TRUSTED_PROXY_HOPS`` is set.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.classes = {}
+        self._endpoints = {}
+
+    def add_class(self, endpoint_class, endpoints):
+        """Guard ``endpoints``: {endpoint name: (account key function, rejection template or None)}."""
+        self.classes[endpoint_class.name] = endpoint_class
+        for endpoint, rule in endpoints.items():
+            self._endpoints[endpoint] = (endpoint_class,) + rule
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        if not self.enabled or request.method != 'POST':
+            return None
+        rule = self._endpoints.get(request.endpoint)
+        if rule is None:
+            return None
+        endpoint_class, account_key, template = rule
+
+        rejected = endpoint_class.admit(request.remote_addr, account_key())
+        if rejected is None:
+            g._admission_class = endpoint_class
+            return None
+        status, retry_after = rejected
+        return self._reject(status, math.ceil(retry_after), template)
+
+    def _teardown_request(self, exc=None):
+        endpoint_class = g.pop('_admission_class', None)
+        if endpoint_class is not None:
+            endpoint_class.release()
+
+    def _reject(self, status, retry_after, template):
+        if status == 429:
+            message = 'Too many attempts. Please wait a moment and try again.'
+        else:
+            message = 'The hotspot is very busy right now. Please try again shortly.'
+        if template is None:
+            response = jsonify({'success': False, 'message': message})
+        else:
+            flash(message, 'error')
+            response = render_template(template)
+        return response, status, {'Retry-After': str(max(1, retry_after))}
+
+    def stats(self):
+        return {name: endpoint_class.stats() for name, endpoint_class in self.classes.items()}
+
+
+admission_control = AdmissionController(enabled=Config.ADMISSION_ENABLED)
+admission_control.add_class(
+    EndpointClass(
+        'login',
+        ip_rate=Config.ADMISSION_LOGIN_IP_RATE,
+        ip_burst=Config.ADMISSION_LOGIN_IP_BURST,
+        account_rate=Config.ADMISSION_LOGIN_ACCOUNT_RATE,
+        account_burst=Config.ADMISSION_LOGIN_ACCOUNT_BURST,
+        concurrency=Config.ADMISSION_LOGIN_CONCURRENCY,
+        queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT,
+        max_keys=Config.ADMISSION_MAX_KEYS,
+    ),
+    {
+        'auth.login': (_login_account, 'login.html'),
+        'auth.register': (_login_account, 'login.html'),
+        'auth.admin_register': (_login_account, 'admin_register.html'),
+        'api.login': (_login_account, None),
+        'api.redeem_voucher': (_login_account, None),
+        'api.token': (_login_account, None),
+    },
+)
+admission_control.add_class(
+    EndpointClass(
+        'session',
+        ip_rate=Config.ADMISSION_SESSION_IP_RATE,
+        ip_burst=Config.ADMISSION_SESSION_IP_BURST,
+        account_rate=Config.ADMISSION_SESSION_ACCOUNT_RATE,
+        account_burst=Config.ADMISSION_SESSION_ACCOUNT_BURST,
+        concurrency=Config.ADMISSION_SESSION_CONCURRENCY,
+        queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT,
+        max_keys=Config.ADMISSION_MAX_KEYS,
+    ),
+    {
+        'user.start_session': (_session_account, None),
+        'api.start_session': (_session_account, None),
+        'api.batch': (_session_account, None),
+    },
+)
@@ -0,0 +1,359 @@
+from flask import Blueprint, request, session, current_app, Response
+from flask_jwt_extended import jwt_required, get_jwt
+from models import User, Plan, Voucher, Session as UserSession, Payment
+from utils import log_action
+from auth import check_credentials, BUSY_MESSAGE
+from hashing import HashingBusy, VOUCHER_ACCOUNT_HASH
+from notifications import balance_notifier, balance_payload
+from config import Config
+from tokens import current_identity, current_user_id, issue_tokens, token_revocations
+from voucher_filter import voucher_filter
+
+api_bp = Blueprint('api', __name__)
+
+PAYMENT_METHODS = ('online', 'cash')
+
+
+# ----------------------------------------------------------
+# OPERATION REGISTRY
+# ----------------------------------------------------------
+# Every endpoint is a named operation taking a dict of arguments and
+# returning (payload, status), so /batch can run the same code paths.
+_OPERATIONS = {}
+
+
+def operation(name, login=True, batch=True):
+    """Register ``f(args) -> (payload, status)`` as an API operation.
+
+    ``login``: requires a portal session or a bearer access token.
+    ``batch``: may be used inside /batch. Sign-in operations are not, so
+    they stay behind the per-request admission limits.
+    """
+    def register(f):
+        _OPERATIONS[name] = (f, login, batch)
+        return f
+    return register
+
+
+def run_operation(name, args):
+    handler, login, _ = _OPERATIONS[name]
+    if login and current_user_id() is None:
+        return {'success': False, 'message': 'Login required'}, 401
+    return handler(args)
+
+
+def _dumps(payload):
+    return current_app.json.dumps(payload, separators=(',', ':'))
+
+
+def _respond(payload, status=200):
+    return Response(_dumps(payload), status=status, mimetype='application/json')
+
+
+def _conditional(payload, status=200, etag=None):
+    """Read responses: ETag + revalidation, 304 with no body when unchanged.
+
+    With a precomputed ``etag`` the 304 path skips serialization entirely.
+    """
+    if status == 200 and etag and etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+    else:
+        response = _respond(payload, status)
+        if status == 200:
+            if etag:
+                response.set_etag(etag)
+            else:
+                response.add_etag()
+            response.make_conditional(request)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _args():
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.form.to_dict()
+    return data if isinstance(data, dict) else None
+
+
+def _bad_request(message='Request body must be a JSON object'):
+    return _respond({'success': False, 'message': message}, 400)
+
+
+def _sign_in(user_id, username, role):
+    session['user_id'] = user_id
+    session['username'] = username
+    session['role'] = role
+    return {'id': user_id, 'username': username, 'role': role}
+
+
+# ----------------------------------------------------------
+# AUTHENTICATION
+# ----------------------------------------------------------
+def _authenticate(args):
+    """Check a password or voucher login: (user, None) or (None, (payload, status))."""
+    if args.get('voucher_code') or args.get('code'):
+        code = (args.get('voucher_code') or args.get('code')).strip()
+        try:
+            redeemed = voucher_filter.might_contain(code) and Voucher.redeem(code, VOUCHER_ACCOUNT_HASH)
+        except Exception as e:
+            log_action(None, 'voucher_error', f"Voucher login failed: {e}")
+            return None, ({'success': False, 'message': 'Error processing voucher. Please try again.'}, 500)
+        if not redeemed:
+            return None, ({'success': False, 'message': 'Invalid or used voucher code'}, 404)
+        log_action(redeemed['user_id'], 'voucher_login', f"Logged in with voucher: {code}")
+        return {'id': redeemed['user_id'], 'username': redeemed['username'], 'role': 'user',
+                'status': 'active', 'plan_id': redeemed['plan']['id']}, None
+
+    username = args.get('username')
+    user = (User.get_by_username(username) or User.get_by_email(username)) if username else None
+    try:
+        valid = user is not None and check_credentials(user, args.get('password'))
+    except HashingBusy:
+        return None, ({'success': False, 'message': BUSY_MESSAGE}, 503)
+
+    if not valid:
+        return None, ({'success': False, 'message': 'Invalid username or password'}, 401)
+    if user['status'] != 'active':
+        return None, ({'success': False, 'message': 'Account is suspended. Please contact admin.'}, 403)
+
+    log_action(user['id'], 'login', "Login successful (API)", request.remote_addr)
+    return user, None
+
+
+def _login_result(user, extra):
+    payload = dict(extra, success=True)
+    if 'plan_id' in user:
+        payload['plan_id'] = user['plan_id']
+    return payload, 201 if 'plan_id' in user else 200
+
+
+@operation('login', login=False, batch=False)
+def _login(args):
+    user, error = _authenticate(args)
+    if error:
+        return error
+    return _login_result(user, {'user': _sign_in(user['id'], user['username'], user['role'])})
+
+
+@operation('redeem_voucher', login=False, batch=False)
+def _redeem_voucher(args):
+    if not (args.get('code') or '').strip():
+        return {'success': False, 'message': 'Please enter voucher code'}, 400
+    return _login({'code': args['code']})
+
+
+@operation('token', login=False, batch=False)
+def _token(args):
+    """Stateless sign-in: access + refresh token instead of a session cookie."""
+    user, error = _authenticate(args)
+    if error:
+        return error
+    return _login_result(user, dict(issue_tokens(user), user={
+        'id': user['id'], 'username': user['username'], 'role': user['role'],
+    }))
+
+
+@operation('logout', login=False)
+def _logout(args):
+    identity = current_identity()
+    if identity is not None:
+        log_action(identity['user_id'], 'logout', "User logged out (API)")
+    # With a session cookie the bearer token is never verified, so there is no JWT to revoke.
+    if identity is not None and identity['via'] == 'jwt':
+        token_revocations.revoke(get_jwt())
+    session.clear()
+    return {'success': True}, 200
+
+
+# ----------------------------------------------------------
+# BALANCE AND PLANS
+# ----------------------------------------------------------
+@operation('balance')
+def _balance(args):
+    user = User.get_balance(current_user_id())
+    if not user:
+        return {'success': False, 'message': 'User not found'}, 404
+    return balance_payload(user), 200
+
+
+@operation('plans', login=False)
+def _plans(args):
+    return {'success': True, 'plans': Plan.get_all_formatted()}, 200
+
+
+# ----------------------------------------------------------
+# RECHARGE
+# ----------------------------------------------------------
+@operation('recharge')
+def _recharge(args):
+    plan = Plan.get_by_id(args.get('plan_id'))
+    if not plan:
+        return {'success': False, 'message': 'Invalid plan selected.'}, 400
+    payment_method = args.get('payment_method', 'online')
+    if payment_method not in PAYMENT_METHODS:
+        return {'success': False, 'message': f"payment_method must be one of {', '.join(PAYMENT_METHODS)}"}, 400
+
+    user_id = current_user_id()
+    try:
+        Payment.create(user_id, plan['price'], payment_method, plan['id'])
+        User.update_balance(user_id, plan['data_limit'], plan['time_limit'])
+    except Exception as e:
+        log_action(user_id, 'recharge_error', f"Recharge failed: {e}")
+        return {'success': False, 'message': 'Recharge failed. Please try again.'}, 500
+
+    balance_notifier.notify([user_id])
+    log_action(user_id, 'recharge', f"Recharged with plan: {plan['name']}")
+    user = User.get_balance(user_id)
+    return dict(balance_payload(user) if user else {'success': True}, plan_id=plan['id']), 201
+
+
+# ----------------------------------------------------------
+# SESSIONS
+# ----------------------------------------------------------
+@operation('start_session')
+def _start_session(args):
+    user_id = current_user_id()
+    user = User.get_balance(user_id)
+    if not user:
+        return {'success': False, 'message': 'User not found'}, 404
+    if (user.get('data_balance') or 0) <= 0 and (user.get('time_balance') or 0) <= 0:
+        return {'success': False, 'message': 'Insufficient balance'}, 402
+
+    try:
+        session_id = UserSession.create(user_id, args.get('device_mac') or 'unknown', request.remote_addr)
+    except Exception as e:
+        log_action(user_id, 'session_error', f"Failed to start session: {e}")
+        return {'success': False, 'message': 'Could not start session'}, 500
+    log_action(user_id, 'session_start', f"Started session: {session_id}")
+    return {'success': True, 'session_id': session_id}, 201
+
+
+@operation('stop_session')
+def _stop_session(args):
+    user_id = current_user_id()
+    try:
+        session_id = int(args.get('session_id'))
+    except (TypeError, ValueError):
+        return {'success': False, 'message': 'session_id is required'}, 400
+
+    row = UserSession.get_by_id(session_id)
+    if not row or row['user_id'] != user_id:
+        return {'success': False, 'message': 'Session not found'}, 404
+    if row['status'] == 'active':
+        UserSession.terminate_session(session_id)
+        log_action(user_id, 'session_stop', f"Stopped session: {session_id}")
+    return {'success': True, 'session_id': session_id}, 200
+
+
+# ----------------------------------------------------------
+# ROUTES
+# ----------------------------------------------------------
+@api_bp.route('/login', methods=['POST'])
+def login():
+    args = _args()
+    return _bad_request() if args is None else _respond(*run_operation('login', args))
+
+
+@api_bp.route('/vouchers/redeem', methods=['POST'])
+def redeem_voucher():
+    args = _args()
+    return _bad_request() if args is None else _respond(*run_operation('redeem_voucher', args))
+
+
+@api_bp.route('/token', methods=['POST'])
+def token():
+    args = _args()
+    return _bad_request() if args is None else _respond(*run_operation('token', args))
+
+
+@api_bp.route('/token/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    """Swap a refresh token for a new pair; the old refresh token is revoked.
+
+    The only token call that reads the user row, so a suspended or
+    re-roled account is picked up here at the latest.
+    """
+    claims = get_jwt()
+    user = User.get_by_id(int(claims['sub']))
+    if not user or user['status'] != 'active':
+        token_revocations.revoke(claims)
+        return _respond({'success': False, 'message': 'Account is not active'}, 401)
+    token_revocations.revoke(claims)
+    return _respond(dict(issue_tokens(user), success=True))
+
+
+@api_bp.route('/logout', methods=['POST'])
+def logout():
+    return _respond(*run_operation('logout', {}))
+
+
+@api_bp.route('/balance')
+def balance():
+    return _conditional(*run_operation('balance', {}))
+
+
+@api_bp.route('/plans')
+def plans():
+    # The catalog version changes whenever a plan does, so it is the ETag.
+    return _conditional(*run_operation('plans', {}), etag=f"plans-{Plan.catalog_version()}")
+
+
+@api_bp.route('/recharge', methods=['POST'])
+def recharge():
+    args = _args()
+    return _bad_request() if args is None else _respond(*run_operation('recharge', args))
+
+
+@api_bp.route('/sessions', methods=['POST'])
+def start_session():
+    args = _args()
+    return _bad_request() if args is None else _respond(*run_operation('start_session', args))
+
+
+@api_bp.route('/sessions/<int:session_id>/stop', methods=['POST'])
+def stop_session(session_id):
+    return _respond(*run_operation('stop_session', {'session_id': session_id}))
+
+
+# ----------------------------------------------------------
+# BATCH
+# ----------------------------------------------------------
+@api_bp.route('/batch', methods=['POST'])
+def batch():
+    """Run several operations in one round-trip, in order.
+
+    Body: {"ops": [{"op": "balance"}, {"op": "recharge", "args": {"plan_id": 2}}],
+           "stop_on_error": false}
+    Each result carries the status and body the single endpoint would
+    have returned. Operations after a failure are skipped when
+    ``stop_on_error`` is set.
+    """
+    args = _args()
+    ops = args.get('ops') if args else None
+    if not isinstance(ops, list) or not ops:
+        return _bad_request('ops must be a non-empty list')
+    if len(ops) > Config.API_BATCH_MAX_OPS:
+        return _bad_request(f'At most {Config.API_BATCH_MAX_OPS} operations per batch')
+
+    results = []
+    failed = False
+    for item in ops:
+        if failed and args.get('stop_on_error'):
+            results.append({'status': 424, 'body': {'success': False, 'message': 'Skipped after an earlier error'}})
+            continue
+        name = item.get('op') if isinstance(item, dict) else None
+        op_args = item.get('args', {}) if isinstance(item, dict) else None
+        if name not in _OPERATIONS or not _OPERATIONS[name][2]:
+            payload, status = {'success': False, 'message': f'Unknown or non-batchable operation: {name}'}, 400
+        elif not isinstance(op_args, dict):
+            payload, status = {'success': False, 'message': 'args must be an object'}, 400
+        else:
+            payload, status = run_operation(name, op_args)
+        failed = failed or status >= 400
+        results.append({'status': status, 'body': payload})
+
+    return _respond({'success': not failed, 'results': results})
@@ -1,28 +1,52 @@
+import click
+from datetime import date, datetime, timedelta
 from flask import Flask, render_template
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_mysqldb import MySQL
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
+from sweeper import session_sweeper
+from log_archive import log_archiver
+from metrics import db_metrics
+from admission import admission_control
+from assets import asset_pipeline, etag_page
+from tokens import token_revocations
+from voucher_filter import voucher_filter
+from models import Rollups
+from reports import parse_report_date
 
 # Import blueprints
 from auth import auth_bp
 from admin import admin_bp
 from user import user_bp
+from gateway import gateway_bp
+from api import api_bp
 
 # ------------------------------------------------------------
 # APP INITIALIZATION
 # ------------------------------------------------------------
 app = Flask(__name__,
-            static_folder='frontend/static',
-            template_folder='frontend/templates')
+            static_folder='static',
+            template_folder='templates')
 
 # Load configuration
 app.config.from_object(Config)
 
+# Take the client address from the proxy's X-Forwarded-For so per-IP rate
+# limits and logged addresses are the client's, not the proxy's.
+if Config.TRUSTED_PROXY_HOPS:
+    hops = Config.TRUSTED_PROXY_HOPS
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
 # Initialize extensions
 CORS(app)
 jwt = JWTManager(app)
+token_revocations.init_app(jwt)
 mysql = MySQL(app)
+db_metrics.init_app(app)
+admission_control.init_app(app)
+asset_pipeline.init_app(app, build=Config.ASSET_BUILD_ON_START)
 
 # ------------------------------------------------------------
 # REGISTER BLUEPRINTS
@@ -30,11 +54,58 @@ mysql = MySQL(app)
 app.register_blueprint(auth_bp, url_prefix='/')
 app.register_blueprint(admin_bp, url_prefix='/admin')
 app.register_blueprint(user_bp, url_prefix='/user')
+app.register_blueprint(gateway_bp, url_prefix='/gateway')
+app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+# ------------------------------------------------------------
+# BACKGROUND JOBS (started lazily so each gunicorn worker gets its own)
+# ------------------------------------------------------------
+@app.before_request
+def start_background_jobs():
+    if Config.SESSION_SWEEP_ENABLED:
+        session_sweeper.ensure_started()
+    if Config.LOG_ARCHIVE_ENABLED:
+        log_archiver.ensure_started()
+    voucher_filter.ensure_loaded()
+
+# ------------------------------------------------------------
+# CLI: flask --app app rebuild-rollups [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+# ------------------------------------------------------------
+@app.cli.command('rebuild-rollups')
+@click.option('--start', help='First day to rebuild (default: all history)')
+@click.option('--end', help='Last day to rebuild, inclusive')
+def rebuild_rollups(start, end):
+    """Recompute the daily revenue/usage rollups from payments and sessions."""
+    result = Rollups.rebuild(parse_report_date(start), parse_report_date(end))
+    click.echo(f"Rebuilt {result['revenue_rows']} revenue rows and {result['usage_rows']} usage rows")
+
+# ------------------------------------------------------------
+# CLI: flask --app app archive-logs [--days N]
+# ------------------------------------------------------------
+@app.cli.command('archive-logs')
+@click.option('--days', type=int, help='Keep this many days in the live table (default: LOG_RETENTION_DAYS)')
+def archive_logs(days):
+    """Move old log rows into the compressed day archives."""
+    cutoff = None
+    if days is not None:
+        cutoff = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=days)
+    archived = log_archiver.archive(cutoff)
+    click.echo(f"Archived {archived} log rows to {log_archiver.archive_dir}")
+
+# ------------------------------------------------------------
+# CLI: flask --app app build-assets
+# ------------------------------------------------------------
+@app.cli.command('build-assets')
+def build_assets():
+    """Fingerprint and precompress static files (for ASSET_BUILD_ON_START=0)."""
+    manifest = asset_pipeline.build()
+    click.echo(f"Built {len(manifest)} assets into {asset_pipeline.build_dir}")
 
 # ------------------------------------------------------------
 # DEFAULT ROUTE
 # ------------------------------------------------------------
 @app.route('/')
+@etag_page
 def home():
     return render_template('login.html')
 
@@ -0,0 +1,204 @@
+import os
+import gzip
+import json
+import hashlib
+import functools
+import mimetypes
+import threading
+from flask import request, url_for, send_file, abort, make_response
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped without it; gzip still works
+    brotli = None
+
+
+# Worth compressing; images and fonts are already compressed.
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+
+# Preferred first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# ----------------------------------------------------------
+# FINGERPRINTED STATIC ASSETS
+# ----------------------------------------------------------
+class AssetPipeline:
+    """Serves static files under content-hashed names with far-future caching.
+
+    ``build()`` copies every file in ``static_dir`` to ``build_dir`` as
+    ``name.<hash>.ext`` and, for text assets, writes ``.gz`` and ``.br``
+    variants next to it (when smaller). Templates call ``asset_url()``,
+    so a changed file gets a new URL and browsers can keep the old one
+    cached for ``max_age`` without revalidating. Requests are answered
+    with the best prebuilt variant the client accepts; nothing is
+    compressed per request.
+
+    Output files are content-addressed, so several workers building at
+    once write identical bytes and existing files are reused.
+    """
+
+    def __init__(self, static_dir='static', build_dir='static/build', max_age=31536000,
+                 min_compress_size=256):
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.max_age = max_age
+        self.min_compress_size = min_compress_size
+
+        self.manifest = {}
+        self._variants = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'served_br': 0,
+            'served_gzip': 0,
+            'served_identity': 0,
+            'not_modified': 0,
+        }
+
+    def init_app(self, app, build=True):
+        self.static_dir = os.path.join(app.root_path, self.static_dir)
+        self.build_dir = os.path.join(app.root_path, self.build_dir)
+        if build:
+            self.build()
+        else:
+            self.load_manifest()
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+
+    # ------------------------------------------------------
+    def _sources(self):
+        build_dir = os.path.abspath(self.build_dir)
+        for root, dirs, files in os.walk(self.static_dir):
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != build_dir]
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, self.static_dir).replace(os.sep, '/'), path
+
+    def build(self):
+        """Fingerprint and precompress every static file; returns the manifest."""
+        manifest, variants = {}, {}
+        for logical, path in self._sources():
+            with open(path, 'rb') as f:
+                data = f.read()
+            stem, ext = os.path.splitext(logical)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            target = os.path.join(self.build_dir, hashed)
+            _write_once(target, data)
+
+            available = []
+            if ext in COMPRESSIBLE and len(data) >= self.min_compress_size:
+                for encoding, suffix in ENCODINGS:
+                    compressed = _compress(encoding, data)
+                    if compressed is not None and len(compressed) < len(data):
+                        _write_once(target + suffix, compressed)
+                        available.append(encoding)
+            manifest[logical] = hashed
+            variants[hashed] = tuple(available)
+
+        _write_atomic(os.path.join(self.build_dir, 'manifest.json'),
+                      json.dumps({'assets': manifest, 'variants': variants}, indent=2, sort_keys=True).encode())
+        self.manifest, self._variants = manifest, variants
+        return manifest
+
+    def load_manifest(self):
+        """Use a manifest written earlier by ``flask build-assets``."""
+        try:
+            with open(os.path.join(self.build_dir, 'manifest.json'), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[ASSETS ERROR] No usable asset manifest, serving unhashed files: {e}")
+            return
+        self.manifest = data['assets']
+        self._variants = {name: tuple(encodings) for name, encodings in data['variants'].items()}
+
+    # ------------------------------------------------------
+    def url(self, filename):
+        """URL for a file under static/; falls back to the plain static URL."""
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=hashed)
+
+    def serve(self, filename):
+        variants = self._variants.get(filename)
+        if variants is None:
+            abort(404)
+
+        path = os.path.join(self.build_dir, filename)
+        encoding = None
+        for candidate, suffix in ENCODINGS:
+            if candidate in variants and request.accept_encodings[candidate]:
+                encoding, path = candidate, path + suffix
+                break
+
+        response = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                             conditional=True, etag=True, max_age=self.max_age)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if variants:
+            response.vary.add('Accept-Encoding')
+
+        with self._lock:
+            if response.status_code == 304:
+                self._stats['not_modified'] += 1
+            else:
+                self._stats[f'served_{encoding or "identity"}'] += 1
+        return response
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['assets'] = len(self.manifest)
+        return stats
+
+
+def _compress(encoding, data):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _write_once(path, data):
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+
+
+# ----------------------------------------------------------
+# ETAG / 304 FOR TEMPLATE PAGES
+# ----------------------------------------------------------
+def etag_page(f):
+    """Add an ETag to successful GET responses and answer If-None-Match with 304.
+
+    For pages that are the same on every visit (login, register); they
+    are still revalidated each time, so flashed messages show up.
+    """
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.is_streamed:
+            response.add_etag()
+            response.cache_control.no_cache = True
+            response.cache_control.private = True
+            response.make_conditional(request)
+        return response
+    return decorated_function
+
+
+asset_pipeline = AssetPipeline(
+    static_dir='static',
+    build_dir=Config.ASSET_BUILD_DIR,
+    max_age=Config.ASSET_MAX_AGE,
+)
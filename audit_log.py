@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import queue
+import glob
+import datetime
+import threading
+from models import get_db_connection
+from storage import IntegrityError, DataError
+
+
+INSERT_LOG_SQL = """
+    INSERT INTO logs (user_id, action, description, ip_address, timestamp)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+
+# ----------------------------------------------------------
+# BATCHED AUDIT-LOG WRITER
+# ----------------------------------------------------------
+class AuditLogWriter:
+    """Buffers log rows in a bounded queue and writes them in batches.
+
+    A background thread drains the queue every ``flush_interval_ms`` or as
+    soon as ``batch_size`` rows are waiting. When the queue is full, callers
+    block for up to ``enqueue_timeout`` seconds and then apply the overflow
+    policy: ``'drop'`` discards the row, ``'spill'`` appends it to
+    a per-process copy of ``spill_path`` as JSON to be replayed once the
+    database keeps up. If a batch insert fails, its rows are retried one
+    by one and any row the database rejects on its own is discarded.
+    """
+
+    def __init__(self, max_queue=10000, batch_size=500, flush_interval_ms=200,
+                 enqueue_timeout=0.05, overflow='spill', spill_path='logs_spill.jsonl'):
+        if overflow not in ('drop', 'spill'):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.enqueue_timeout = enqueue_timeout
+        self.overflow = overflow
+        self.spill_path = spill_path
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'failed_batches': 0,
+            'rejected': 0,
+        }
+
+    # ------------------------------------------------------
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, user_id, action, description, ip_address=None):
+        """Queue one log row; never raises on the request path."""
+        row = (user_id, action, description, ip_address, datetime.datetime.now())
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+            self._stats['enqueued'] += 1
+        except queue.Full:
+            self._overflow([row])
+
+    def _overflow(self, rows):
+        if self.overflow == 'spill' and self._spill(rows):
+            self._stats['spilled'] += len(rows)
+        else:
+            self._stats['dropped'] += len(rows)
+
+    # ------------------------------------------------------
+    def _spill_file(self, pid=None):
+        # One file per process: workers never read or remove each other's live file.
+        root, ext = os.path.splitext(self.spill_path)
+        return f"{root}.{pid or os.getpid()}{ext}"
+
+    def _spill(self, rows):
+        try:
+            with self._spill_lock, open(self._spill_file(), 'a', encoding='utf-8') as f:
+                for user_id, action, description, ip_address, ts in rows:
+                    f.write(json.dumps([user_id, action, description, ip_address, ts.isoformat()]) + "\n")
+            return True
+        except OSError as e:
+            print(f"[LOG ERROR] Spill to {self.spill_path} failed: {e}")
+            return False
+
+    @staticmethod
+    def _read_and_remove(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                lines = f.readlines()
+            os.remove(path)
+            return lines
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            print(f"[LOG ERROR] Reading spill file {path} failed: {e}")
+            return []
+
+    def _orphaned_spills(self):
+        """Spill files left by processes that are no longer running."""
+        root, ext = os.path.splitext(self.spill_path)
+        for path in glob.glob(f"{glob.escape(root)}.*{ext}"):
+            pid = path[len(root) + 1:len(path) - len(ext)]
+            if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+                yield path
+
+    def _take_spilled(self):
+        with self._spill_lock:
+            lines = self._read_and_remove(self._spill_file())
+        for path in self._orphaned_spills():
+            # Rename first so only one worker adopts the file.
+            claimed = f"{path}.{os.getpid()}.claim"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            lines += self._read_and_remove(claimed)
+        rows = []
+        for line in lines:
+            try:
+                user_id, action, description, ip_address, ts = json.loads(line)
+                rows.append((user_id, action, description, ip_address,
+                             datetime.datetime.fromisoformat(ts)))
+            except (ValueError, TypeError):
+                continue
+        return rows
+
+    # ------------------------------------------------------
+    def _write(self, rows):
+        """Insert ``rows``; returns the rows still to be written (spilled or dropped)."""
+        conn = get_db_connection()
+        if not conn:
+            return rows
+        cursor = conn.cursor()
+        try:
+            # PyMySQL folds executemany() on INSERT ... VALUES into multi-row statements.
+            cursor.executemany(INSERT_LOG_SQL, rows)
+            conn.commit()
+            self._stats['written'] += len(rows)
+            self._stats['batches'] += 1
+            return []
+        except Exception as e:
+            print(f"[LOG ERROR] Failed to write {len(rows)} log rows: {e}")
+            self._stats['failed_batches'] += 1
+            _rollback(conn)
+            return self._write_each(conn, rows)
+        finally:
+            conn.close()
+
+    def _write_each(self, conn, rows):
+        # One bad row (e.g. an unknown user_id) must not hold back the rest of its batch.
+        cursor = conn.cursor()
+        for i, row in enumerate(rows):
+            try:
+                cursor.execute(INSERT_LOG_SQL, row)
+                conn.commit()
+                self._stats['written'] += 1
+            except IntegrityError + DataError as e:
+                _rollback(conn)
+                self._stats['rejected'] += 1
+                print(f"[LOG ERROR] Discarding log row {row[:3]}: {e}")
+            except Exception as e:
+                _rollback(conn)
+                print(f"[LOG ERROR] Retrying log rows failed: {e}")
+                return rows[i:]
+        return []
+
+    def _drain(self, limit):
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _flush_batch(self, rows):
+        for i in range(0, len(rows), self.batch_size):
+            unwritten = self._write(rows[i:i + self.batch_size])
+            if unwritten:
+                self._overflow(unwritten)
+
+    def _task_done(self, count):
+        for _ in range(count):
+            self._queue.task_done()
+
+    def _run(self):
+        while not self._stop.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            rows = []
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                rows.extend(self._drain(self.batch_size - len(rows)))
+
+            if rows:
+                self._flush_batch(rows)
+                self._task_done(len(rows))
+            elif self.overflow == 'spill':
+                # Idle and caught up: replay anything spilled while the DB was slow.
+                self._flush_batch(self._take_spilled())
+
+    def flush(self):
+        """Synchronously write everything currently queued."""
+        while True:
+            rows = self._drain(self.batch_size)
+            if not rows:
+                break
+            self._flush_batch(rows)
+            self._task_done(len(rows))
+        # Also wait for the batch the writer thread may be holding.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.join()
+
+    def shutdown(self):
+        """Stop the background thread and flush what is left."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
+
+
+def _rollback(conn):
+    try:
+        conn.rollback()
+    except Exception:
+        pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -1,16 +1,40 @@
 import os
+import hmac
 from flask import Blueprint, request, render_template, redirect, url_for, session, flash
-from flask_jwt_extended import create_access_token
-from models import User, Plan, Voucher, Payment
+from models import User, Voucher
 from utils import verify_password, hash_password, log_action
+from hashing import password_hasher, HashingBusy, VOUCHER_ACCOUNT_HASH
+from assets import etag_page
+from voucher_filter import voucher_filter
 
 auth_bp = Blueprint('auth', __name__)
 
+BUSY_MESSAGE = 'Too many sign-ins right now. Please try again in a moment.'
+
+
+# ----------------------------------------------------------
+# CREDENTIAL CHECK
+# ----------------------------------------------------------
+def check_credentials(user, password):
+    """Verify a login and upgrade legacy or outdated hashes in the background."""
+    if not password:
+        return False
+    if user['password_hash'] == VOUCHER_ACCOUNT_HASH:
+        # Voucher accounts sign in with their code; nothing to hash.
+        # Bytes: compare_digest rejects str arguments with non-ASCII characters.
+        return hmac.compare_digest(user['username'].encode(), f"voucher_{password}".encode())
+    if not verify_password(password, user['password_hash']):
+        return False
+    if password_hasher.needs_rehash(user['password_hash']):
+        password_hasher.rehash_later(password, lambda new_hash: User.update_password_hash(user['id'], new_hash))
+    return True
+
 
 # ----------------------------------------------------------
 # INDEX / LOGIN PAGE
 # ----------------------------------------------------------
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@etag_page
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -24,7 +48,13 @@ def login():
         # 🔹 Try username or email
         user = User.get_by_username(username) or User.get_by_email(username)
 
-        if user and verify_password(password, user['password_hash']):
+        try:
+            valid = user is not None and check_credentials(user, password)
+        except HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            return render_template('login.html'), 503
+
+        if valid:
             if user['status'] != 'active':
                 flash('Account is suspended. Please contact admin.', 'error')
                 return render_template('login.html')
@@ -48,43 +78,6 @@ def login():
 
 
 
-# ----------------------------------------------------------
-# LOGIN HANDLER
-# ----------------------------------------------------------
-@auth_bp.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-        login_type = request.form.get('login_type', 'password')
-
-        if login_type == 'voucher':
-            return handle_voucher_login(request.form.get('voucher_code'))
-
-        # Try username OR email
-        user = User.get_by_username(username) or User.get_by_email(username)
-
-       if user and verify_password(password, user['password_hash']):
-    if user['status'] != 'active':
-        flash('Account is suspended. Please contact admin.', 'error')
-        return render_template('login.html')
-
-    session['user_id'] = user['id']
-    session['username'] = user['username']
-    session['role'] = user['role']
-
-    log_action(user['id'], 'login', "Login successful", request.remote_addr)
-
-    return redirect(
-        url_for('admin.dashboard') if user['role'] == 'admin' else url_for('user.dashboard')
-    )
-
-        else:
-            flash('Invalid username or password', 'error')
-
-    return render_template('login.html')
-
-
 # ----------------------------------------------------------
 # VOUCHER LOGIN HANDLER
 # ----------------------------------------------------------
@@ -93,36 +86,22 @@ def handle_voucher_login(voucher_code):
         flash('Please enter voucher code', 'error')
         return render_template('login.html')
 
-    voucher = Voucher.get_by_code(voucher_code)
-    if not voucher or voucher['status'] != 'unused':
-        flash('Invalid or used voucher code', 'error')
-        return render_template('login.html')
-
-    temp_username = f"voucher_{voucher_code}"
-    temp_password = hash_password(voucher_code)
-
     try:
-        user_id = User.create(
-            username=temp_username,
-            email=f"{temp_username}@temp.com",
-            password_hash=temp_password
-        )
-
-        plan = Plan.get_by_id(voucher['plan_id'])
-        if plan:
-            User.update_balance(user_id, plan['data_limit'], plan['time_limit'])
-            Voucher.use_voucher(voucher_code, user_id)
-            Payment.create(user_id, plan['price'], 'voucher', plan['id'], voucher['id'])
-
-        session['user_id'] = user_id
-        session['username'] = temp_username
+        # Unknown codes (guessing) are turned away without a DB round-trip.
+        redeemed = voucher_filter.might_contain(voucher_code) and Voucher.redeem(voucher_code, VOUCHER_ACCOUNT_HASH)
+        if not redeemed:
+            flash('Invalid or used voucher code', 'error')
+            return render_template('login.html')
+
+        session['user_id'] = redeemed['user_id']
+        session['username'] = redeemed['username']
         session['role'] = 'user'
 
-        log_action(user_id, 'voucher_login', f"Logged in with voucher: {voucher_code}")
+        log_action(redeemed['user_id'], 'voucher_login', f"Logged in with voucher: {voucher_code}")
         return redirect(url_for('user.dashboard'))
 
     except Exception as e:
-        log_action(0, 'voucher_error', f"Voucher login failed: {e}")
+        log_action(None, 'voucher_error', f"Voucher login failed: {e}")
         flash('Error processing voucher. Please try again.', 'error')
         return render_template('login.html')
 
@@ -131,6 +110,7 @@ def handle_voucher_login(voucher_code):
 # USER REGISTRATION
 # ----------------------------------------------------------
 @auth_bp.route('/register', methods=['GET', 'POST'])
+@etag_page
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -142,7 +122,11 @@ def register():
             flash('Username or email already exists', 'error')
             return render_template('login.html')
 
-        password_hash = hash_password(password)
+        try:
+            password_hash = hash_password(password)
+        except HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            return render_template('login.html'), 503
         user_id = User.create(username, email, password_hash, phone)
 
         if user_id:
@@ -159,6 +143,7 @@ def register():
 # SECURE ADMIN REGISTRATION (via Secret Code)
 # ----------------------------------------------------------
 @auth_bp.route('/admin_register', methods=['GET', 'POST'])
+@etag_page
 def admin_register():
     # ✅ Secure: use environment variable instead of hardcoded secret
     secret_code = os.environ.get("ADMIN_SECRET", "ADMIN123")
@@ -177,7 +162,11 @@ def admin_register():
             flash('Username or email already exists', 'error')
             return render_template('admin_register.html')
 
-        password_hash = hash_password(password)
+        try:
+            password_hash = hash_password(password)
+        except HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            return render_template('admin_register.html'), 503
         admin_id = User.create(username, email, password_hash, role='admin')
 
         if admin_id:
@@ -0,0 +1,63 @@
+"""Requests/sec on /user/check_balance: pooled vs connect-per-call.
+
+Needs a reachable MySQL configured through the usual MYSQL_* variables.
+
+    python benchmarks/bench_check_balance.py --requests 2000 --threads 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from config import Config  # noqa: E402
+import models  # noqa: E402
+
+
+def _worker(user_id, count):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['role'] = 'user'
+    for _ in range(count):
+        resp = client.get('/user/check_balance')
+        if resp.status_code != 200:
+            raise RuntimeError(f"check_balance returned {resp.status_code}")
+
+
+def run(pooled, user_id, requests, threads):
+    Config.DB_POOL_ENABLED = pooled
+    per_thread = max(1, requests // threads)
+
+    # Warm up outside the timed section.
+    _worker(user_id, 10)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(_worker, user_id, per_thread) for _ in range(threads)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    direct = run(False, args.user_id, args.requests, args.threads)
+    pooled = run(True, args.user_id, args.requests, args.threads)
+
+    print(f"connect-per-call : {direct:10.1f} req/s")
+    print(f"pooled           : {pooled:10.1f} req/s  ({pooled / direct:.2f}x)")
+    print(f"pool stats       : {models.get_pool().stats()}")
+
+
+if __name__ == '__main__':
+    main()
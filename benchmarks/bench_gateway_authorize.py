@@ -0,0 +1,116 @@
+"""Gateway authorization lookups: in-memory index vs querying the sessions table.
+
+Seeds a throwaway SQLite database with active and closed sessions, then
+times ``session_index.lookup`` directly, GET /gateway/authorize, bulk
+POST /gateway/authorize, and the per-lookup SELECT it replaces.
+
+    python benchmarks/bench_gateway_authorize.py --sessions 50000 --lookups 20000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config  # noqa: E402
+
+Config.DB_BACKEND = 'sqlite'
+Config.SESSION_SWEEP_ENABLED = False
+Config.GATEWAY_TOKEN = 'bench-gateway-token'
+
+import storage  # noqa: E402
+import models  # noqa: E402
+from app import app  # noqa: E402
+from session_index import session_index  # noqa: E402
+
+HEADERS = {'X-Gateway-Token': Config.GATEWAY_TOKEN}
+
+
+def mac_for(i):
+    return '02:00:%02x:%02x:%02x:%02x' % ((i >> 24) & 255, (i >> 16) & 255, (i >> 8) & 255, i & 255)
+
+
+def ip_for(i):
+    return f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}'
+
+
+def seed(backend, sessions):
+    conn = backend.connect()
+    conn.raw.execute("INSERT INTO users (username, email, password_hash, data_balance, time_balance) "
+                     "VALUES ('bench_user', 'bench_user@example.com', '!voucher', 1000000, 1000000)")
+    user_id = conn.raw.execute("SELECT id FROM users WHERE username = 'bench_user'").fetchone()[0]
+    conn.raw.executemany(
+        "INSERT INTO sessions (user_id, device_mac, ip_address, start_time, end_time, status) "
+        "VALUES (?, ?, ?, datetime('now', 'localtime'), ?, ?)",
+        ((user_id, mac_for(i), ip_for(i), None if i % 2 else '2024-01-01 00:00:00',
+          'active' if i % 2 else 'terminated') for i in range(sessions)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(label, count, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}{count / elapsed:>12.0f}/s{elapsed / count * 1e6:>10.2f} us each")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=50000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hotspot-bench-')
+    try:
+        backend = storage.SQLiteBackend(os.path.join(workdir, 'bench.db'))
+        storage.set_backend(backend)
+        models.reset_pool()
+        seed(backend, args.sessions)
+
+        rng = random.Random(42)
+        picks = [rng.randrange(args.sessions) for _ in range(args.lookups)]
+        started = time.perf_counter()
+        session_index.rebuild()
+        print(f"index rebuild: {session_index.stats()['active_sessions']} active sessions "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        timed('index lookup', len(picks), lambda: [session_index.lookup(mac_for(i), ip_for(i)) for i in picks])
+
+        def query_db():
+            conn = models.get_db_connection()
+            cursor = conn.cursor()
+            for i in picks:
+                cursor.execute("SELECT id, user_id FROM sessions WHERE device_mac = %s AND ip_address = %s "
+                               "AND status = 'active' LIMIT 1", (mac_for(i), ip_for(i)))
+                cursor.fetchone()
+            conn.close()
+        timed('SELECT per lookup', len(picks), query_db)
+
+        client = app.test_client()
+        http_picks = picks[:min(len(picks), 5000)]
+        timed('GET /gateway/authorize', len(http_picks), lambda: [
+            client.get(f'/gateway/authorize?mac={mac_for(i)}&ip={ip_for(i)}', headers=HEADERS) for i in http_picks
+        ])
+
+        def bulk():
+            for start in range(0, len(picks), args.batch):
+                chunk = picks[start:start + args.batch]
+                client.post('/gateway/authorize', headers=HEADERS,
+                            json={'queries': [{'mac': mac_for(i), 'ip': ip_for(i)} for i in chunk]})
+        timed(f'POST /gateway/authorize x{args.batch}', len(picks), bulk)
+        print(f"index stats: {session_index.stats()}")
+    finally:
+        models.reset_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
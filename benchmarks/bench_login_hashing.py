@@ -0,0 +1,119 @@
+"""Password logins/sec through /login as a function of hash cost.
+
+For each werkzeug method string, seeds a throwaway SQLite database whose
+users are hashed at that cost, then has N client threads log in through
+the real /login endpoint. Reports logins/sec, p50/p95 latency and how
+many attempts the bounded hashing pool turned away with 503.
+
+    python benchmarks/bench_login_hashing.py --logins 200 --threads 8
+    python benchmarks/bench_login_hashing.py --methods pbkdf2:sha256:100000 scrypt:16384:8:1
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config  # noqa: E402
+
+Config.DB_BACKEND = 'sqlite'
+Config.SESSION_SWEEP_ENABLED = False
+# Every client here shares one IP; measure the handlers, not the rate limits.
+Config.ADMISSION_ENABLED = False
+
+import storage  # noqa: E402
+import models  # noqa: E402
+from app import app  # noqa: E402
+from hashing import password_hasher  # noqa: E402
+from utils import flush_logs  # noqa: E402
+
+PASSWORD = 'bench-password'
+DEFAULT_METHODS = (
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+)
+
+
+def seed(backend, users):
+    conn = backend.connect()
+    password_hash = password_hasher.hash(PASSWORD)
+    conn.raw.executemany(
+        "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+        ((f'bench_user_{i}', f'bench_user_{i}@example.com', password_hash) for i in range(users)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(method, users, logins, threads, workdir):
+    password_hasher.method = method
+    backend = storage.SQLiteBackend(os.path.join(workdir, f'{method.replace(":", "_")}.db'))
+    storage.set_backend(backend)
+    models.reset_pool()
+    seed(backend, users)
+
+    rng = random.Random(42)
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def worker(count):
+        client = app.test_client()
+        for _ in range(count):
+            started = time.perf_counter()
+            resp = client.post('/login', data={'username': f'bench_user_{rng.randrange(users)}',
+                                               'password': PASSWORD})
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    per_thread = max(1, logins // threads)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(worker, per_thread) for _ in range(threads)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    flush_logs()
+
+    latencies.sort()
+    return {
+        'logins_per_sec': statuses.get(302, 0) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'busy': statuses.get(503, 0),
+        'failed': sum(count for code, count in statuses.items() if code not in (302, 503)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='*', default=DEFAULT_METHODS)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"hashing pool: {password_hasher.workers} workers, capacity {password_hasher.stats()['capacity']}")
+    print(f"{'method':<24}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'503s':>7}{'failed':>8}")
+    workdir = tempfile.mkdtemp(prefix='hotspot-bench-')
+    try:
+        for method in args.methods:
+            result = run(method, args.users, args.logins, args.threads, workdir)
+            print(f"{method:<24}{result['logins_per_sec']:>10.1f}{result['p50_ms']:>10.1f}"
+                  f"{result['p95_ms']:>10.1f}{result['busy']:>7}{result['failed']:>8}")
+    finally:
+        models.reset_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+"""End-to-end benchmark of the portal's hot paths, with a regression gate.
+
+Seeds a throwaway SQLite database (DB_BACKEND=sqlite) at the chosen scale,
+drives the real Flask endpoints through the test client and reports, per
+scenario, throughput, p50/p95/p99 latency and DB queries per request.
+
+    python benchmarks/bench_portal.py --scale small
+    python benchmarks/bench_portal.py --scale medium --check
+    python benchmarks/bench_portal.py --scale medium --save-baseline
+
+--check exits 1 when a scenario is slower than the stored baseline by more
+than --tolerance (throughput or p95), or issues more queries per request.
+Baselines are per machine: refresh them with --save-baseline after an
+intentional change or on new hardware.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config  # noqa: E402
+
+Config.DB_BACKEND = 'sqlite'
+Config.SESSION_SWEEP_ENABLED = False
+# Every client here shares one IP; measure the handlers, not the rate limits.
+Config.ADMISSION_ENABLED = False
+Config.DB_METRICS_ENABLED = True
+# Exports finish inside the request, so each one is timed whole.
+Config.REPORT_JOB_WAIT = 600
+
+import storage  # noqa: E402
+import models  # noqa: E402
+from app import app  # noqa: E402
+from metrics import db_metrics, BACKGROUND  # noqa: E402
+from report_jobs import report_jobs  # noqa: E402
+from utils import hash_password, generate_voucher_codes, flush_logs  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+PASSWORD = 'bench-password'
+
+SCALES = {
+    'small': {'users': 1000, 'vouchers': 2000, 'sessions': 5000, 'payments': 5000, 'logs': 20000},
+    'medium': {'users': 10000, 'vouchers': 20000, 'sessions': 50000, 'payments': 50000, 'logs': 200000},
+    'large': {'users': 100000, 'vouchers': 200000, 'sessions': 500000, 'payments': 500000, 'logs': 2000000},
+}
+
+
+# ----------------------------------------------------------
+# QUERY COUNTING
+# ----------------------------------------------------------
+def request_queries():
+    """Queries issued by request handlers so far (see metrics.DBMetrics)."""
+    endpoints = db_metrics.snapshot()['endpoints']
+    return sum(totals['queries'] for name, totals in endpoints.items() if name != BACKGROUND)
+
+
+# ----------------------------------------------------------
+# SEEDING
+# ----------------------------------------------------------
+def _timestamp(rng, days):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - rng.random() * days * 86400))
+
+
+def seed(backend, sizes, rng):
+    """Fill a fresh database; returns the unused voucher codes."""
+    conn = backend.connect()
+    raw = conn.raw
+    password_hash = hash_password(PASSWORD)
+
+    raw.executemany(
+        "INSERT INTO users (username, email, password_hash, phone, data_balance, time_balance) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        ((f'bench_user_{i}', f'bench_user_{i}@example.com', password_hash, '0000000000',
+          rng.randint(0, 10240), rng.randint(0, 43200)) for i in range(sizes['users'])),
+    )
+    user_ids = [row[0] for row in raw.execute("SELECT id FROM users WHERE role = 'user'")]
+
+    codes = generate_voucher_codes(sizes['vouchers'])
+    half = len(codes) // 2
+    raw.executemany(
+        "INSERT INTO vouchers (code, plan_id, status, used_by) VALUES (?, ?, ?, ?)",
+        ((code, rng.randint(1, 3), 'used' if i < half else 'unused',
+          rng.choice(user_ids) if i < half else None) for i, code in enumerate(codes)),
+    )
+    raw.executemany(
+        "INSERT INTO sessions (user_id, device_mac, ip_address, start_time, data_used, time_used, status) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((rng.choice(user_ids), f'02:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}',
+          '10.0.0.1', _timestamp(rng, 90), rng.randint(0, 2048), rng.randint(0, 7200),
+          rng.choice(('terminated', 'terminated', 'expired', 'active'))) for i in range(sizes['sessions'])),
+    )
+    raw.executemany(
+        "INSERT INTO payments (user_id, plan_id, amount, payment_method, created_at) VALUES (?, ?, ?, ?, ?)",
+        ((rng.choice(user_ids), plan_id, (50, 200, 500)[plan_id - 1], 'online', _timestamp(rng, 365))
+         for plan_id in (rng.randint(1, 3) for _ in range(sizes['payments']))),
+    )
+    raw.executemany(
+        "INSERT INTO logs (user_id, action, description, ip_address, timestamp) VALUES (?, ?, ?, ?, ?)",
+        ((rng.choice(user_ids), 'login', 'Login successful', '10.0.0.1', _timestamp(rng, 90))
+         for _ in range(sizes['logs'])),
+    )
+    raw.commit()
+    raw.execute("ANALYZE")
+    conn.close()
+    return codes[half:]
+
+
+# ----------------------------------------------------------
+# SCENARIOS
+# ----------------------------------------------------------
+def _client(user_id=None, role='user'):
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['role'] = role
+    return client
+
+
+def build_scenarios(sizes, vouchers, rng):
+    """name -> (client factory, request(client, i), expected status)."""
+    users = sizes['users']
+    fresh = iter(range(10 ** 9))
+    codes = iter(vouchers)
+
+    def any_user():
+        # id 1 is the seeded admin
+        return rng.randint(2, users + 1)
+
+    def register(client, i):
+        name = f'bench_new_{next(fresh)}'
+        return client.post('/register', data={
+            'username': name, 'email': f'{name}@example.com', 'password': PASSWORD, 'phone': '0000000000'})
+
+    def cold_export(report_type):
+        # export_* mostly reuses the cached file; drop it first so the export itself is timed.
+        def send(client, i):
+            for entry in os.scandir(report_jobs.folder):
+                if entry.name.startswith(f'{report_type}_'):
+                    os.remove(entry.path)
+            return client.get(f'/admin/reports/export/{report_type}')
+        return send
+
+    return {
+        'login_password': (
+            _client,
+            lambda c, i: c.post('/login', data={'username': f'bench_user_{rng.randrange(users)}', 'password': PASSWORD}),
+            302),
+        'login_voucher': (
+            _client,
+            lambda c, i: c.post('/login', data={'login_type': 'voucher', 'voucher_code': next(codes)}),
+            302),
+        'register': (_client, register, 302),
+        'recharge': (
+            lambda: _client(any_user()),
+            lambda c, i: c.post('/user/recharge', data={'plan_id': str(i % 3 + 1)}),
+            302),
+        'start_session': (
+            lambda: _client(any_user()),
+            lambda c, i: c.post('/user/start_session', data={'device_mac': '02:aa:bb:cc:dd:ee'}),
+            200),
+        'check_balance': (
+            lambda: _client(any_user()),
+            lambda c, i: c.get('/user/check_balance'),
+            200),
+        'admin_dashboard': (
+            lambda: _client(1, 'admin'),
+            lambda c, i: c.get('/admin/dashboard'),
+            200),
+        'export_payments': (
+            lambda: _client(1, 'admin'),
+            lambda c, i: c.get('/admin/reports/export/payments'),
+            200),
+        'export_sessions': (
+            lambda: _client(1, 'admin'),
+            lambda c, i: c.get('/admin/reports/export/sessions'),
+            200),
+        'export_payments_cold': (lambda: _client(1, 'admin'), cold_export('payments'), 200),
+        'export_sessions_cold': (lambda: _client(1, 'admin'), cold_export('sessions'), 200),
+    }
+
+
+def run_scenario(scenario, requests, threads):
+    make_client, send, expected = scenario
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(count):
+        client = make_client()
+        mine = []
+        for i in range(count):
+            started = time.perf_counter()
+            resp = send(client, i)
+            resp.get_data()
+            mine.append(time.perf_counter() - started)
+            if resp.status_code != expected:
+                raise RuntimeError(f"got HTTP {resp.status_code}, expected {expected}")
+        with lock:
+            latencies.extend(mine)
+
+    queries_before = request_queries()
+
+    per_thread = max(1, requests // threads)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(worker, per_thread) for _ in range(threads)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    flush_logs()
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))] * 1000
+
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(pct(50), 3),
+        'p95_ms': round(pct(95), 3),
+        'p99_ms': round(pct(99), 3),
+        'queries': round((request_queries() - queries_before) / len(latencies), 2),
+    }
+
+
+# ----------------------------------------------------------
+# BASELINE
+# ----------------------------------------------------------
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of ``results`` against ``baseline``."""
+    problems = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            problems.append(f"{name}: throughput {current['rps']} req/s < baseline {base['rps']}")
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {current['p95_ms']} ms > baseline {base['p95_ms']}")
+        if current['queries'] > base['queries'] + 0.05:
+            problems.append(f"{name}: {current['queries']} queries/request > baseline {base['queries']}")
+    return problems
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--only', nargs='*', help='scenario names to run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--check', action='store_true', help='fail on regressions against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    sizes = SCALES[args.scale]
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='hotspot-bench-')
+    try:
+        backend = storage.SQLiteBackend(os.path.join(workdir, 'bench.db'))
+        storage.set_backend(backend)
+        models.reset_pool()
+        report_jobs.folder = os.path.join(workdir, 'reports')
+        os.makedirs(report_jobs.folder)
+
+        started = time.perf_counter()
+        vouchers = seed(backend, sizes, rng)
+        print(f"seeded {args.scale} ({', '.join(f'{k}={v}' for k, v in sizes.items())}) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        scenarios = build_scenarios(sizes, vouchers, rng)
+        results = {}
+        print(f"{'scenario':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for name, scenario in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            requests = args.requests
+            if name.startswith('export_'):
+                requests = max(args.threads, requests // 20)
+            result = results[name] = run_scenario(scenario, requests, args.threads)
+            print(f"{name:<22}{result['rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                  f"{result['p99_ms']:>10}{result['queries']:>9}")
+    finally:
+        flush_logs()
+        models.reset_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    key = f"{args.scale}/threads={args.threads}"
+    baseline = load_baseline()
+    if args.save_baseline:
+        baseline.setdefault('_machine', {}).update({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        })
+        baseline[key] = {**baseline.get(key, {}), **results}
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"baseline saved for {key}")
+
+    if args.check:
+        if key not in baseline:
+            print(f"no baseline stored for {key}; run with --save-baseline first")
+            return 1
+        problems = compare(results, baseline[key], args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+        print(f"no regressions against baseline ({key})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
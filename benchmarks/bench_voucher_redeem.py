@@ -0,0 +1,95 @@
+"""Concurrent voucher redemption: throughput and exactly-once check.
+
+Generates fresh vouchers, then has N threads redeem them through
+Voucher.redeem. In 'same' mode every thread races for the same codes;
+in 'different' mode each code is redeemed by exactly one thread. Either
+way each code must end up with exactly one account and one payment.
+
+Needs a reachable MySQL configured through the usual MYSQL_* variables.
+
+    python benchmarks/bench_voucher_redeem.py --codes 500 --threads 16
+"""
+import argparse
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Voucher, get_db_connection  # noqa: E402
+from utils import generate_voucher_codes  # noqa: E402
+
+# Redemption cost is what is measured, not the password KDF.
+PASSWORD_HASH = 'bench-not-a-real-hash'
+
+
+def redeem_all(codes, threads, mode):
+    wins = {}
+    lock = threading.Lock()
+
+    def worker(index):
+        mine = codes if mode == 'same' else codes[index::threads]
+        for code in mine:
+            if Voucher.redeem(code, PASSWORD_HASH):
+                with lock:
+                    wins[code] = wins.get(code, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(worker, i) for i in range(threads)]:
+            future.result()
+    return wins, time.perf_counter() - start
+
+
+def verify(codes, wins):
+    problems = [code for code in codes if wins.get(code) != 1]
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    placeholders = ', '.join(['%s'] * len(codes))
+    cursor.execute(f"""
+        SELECT v.code, v.status, COUNT(p.id) AS payments
+        FROM vouchers v LEFT JOIN payments p ON p.voucher_id = v.id
+        WHERE v.code IN ({placeholders})
+        GROUP BY v.id, v.code, v.status
+    """, codes)
+    for row in cursor.fetchall():
+        if row['status'] != 'used' or row['payments'] != 1:
+            problems.append(row['code'])
+    cursor.execute(
+        f"SELECT COUNT(*) AS n FROM users WHERE username IN ({placeholders})",
+        [f"voucher_{code}" for code in codes],
+    )
+    accounts = cursor.fetchone()['n']
+    conn.close()
+
+    if accounts != len(codes):
+        problems.append(f"{accounts} accounts for {len(codes)} codes")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plan-id', type=int, default=1)
+    parser.add_argument('--codes', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    failed = False
+    for mode in ('different', 'same'):
+        codes = Voucher.bulk_create(args.plan_id, args.codes, generate_voucher_codes)['codes']
+        wins, elapsed = redeem_all(codes, args.threads, mode)
+        problems = verify(codes, wins)
+        attempts = len(codes) * (args.threads if mode == 'same' else 1)
+        print(f"{mode:9s}: {len(wins) / elapsed:8.1f} redemptions/s, "
+              f"{attempts / elapsed:8.1f} attempts/s, "
+              f"exactly-once {'OK' if not problems else 'FAILED: %s' % problems[:5]}")
+        failed = failed or bool(problems)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,16 @@ class Config:
     # Flask secret keys
     SECRET_KEY = os.environ.get('SECRET_KEY', 'wifi-hotspot-secret-key-2024')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', SECRET_KEY)
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    # JWT mode for API clients: short-lived access tokens plus refresh tokens,
+    # sent as 'Authorization: Bearer ...'; revocations sync between workers
+    JWT_TOKEN_LOCATION = ['headers']
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_MINUTES', 15)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_DAYS', 30)))
+    JWT_REVOCATION_SYNC_INTERVAL = int(os.environ.get('JWT_REVOCATION_SYNC_INTERVAL', 10))
+
+    # Storage backend: 'mysql' (default) or 'sqlite' for single-box sites and load tests
+    DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql')
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', 'hotspot.db')
 
     # MySQL configuration (Render or Local)
     MYSQL_HOST = os.environ.get('MYSQL_HOST', 'localhost')
@@ -16,5 +25,132 @@ class Config:
     # Upload folder (for reports or PDFs)
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'reports')
 
+    # Static assets: fingerprinted + gzip/brotli copies are written to ASSET_BUILD_DIR
+    # at startup (set ASSET_BUILD_ON_START=0 and run 'flask build-assets' at deploy)
+    ASSET_BUILD_DIR = os.environ.get('ASSET_BUILD_DIR', 'static/build')
+    ASSET_BUILD_ON_START = os.environ.get('ASSET_BUILD_ON_START', '1') == '1'
+    ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 365 * 24 * 3600))
+
     # Max upload file size (16 MB)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+    # Connection pool (set DB_POOL_ENABLED=0 to connect per call)
+    DB_POOL_ENABLED = os.environ.get('DB_POOL_ENABLED', '1') == '1'
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+    DB_POOL_MAX_AGE = int(os.environ.get('DB_POOL_MAX_AGE', 3600))
+    DB_POOL_PING_INTERVAL = int(os.environ.get('DB_POOL_PING_INTERVAL', 30))
+
+    # Audit log writer (set AUDIT_LOG_ASYNC=0 to write logs inline)
+    AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', '1') == '1'
+    AUDIT_LOG_QUEUE_SIZE = int(os.environ.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+    AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', 500))
+    AUDIT_LOG_FLUSH_MS = int(os.environ.get('AUDIT_LOG_FLUSH_MS', 200))
+    AUDIT_LOG_ENQUEUE_TIMEOUT = float(os.environ.get('AUDIT_LOG_ENQUEUE_TIMEOUT', 0.05))
+    AUDIT_LOG_OVERFLOW = os.environ.get('AUDIT_LOG_OVERFLOW', 'spill')  # 'spill' or 'drop'
+    AUDIT_LOG_SPILL_FILE = os.environ.get('AUDIT_LOG_SPILL_FILE', 'logs_spill.jsonl')
+
+    # Admin dashboard stats cache (seconds)
+    STATS_TTL = int(os.environ.get('STATS_TTL', 60))
+    STATS_MIN_REFRESH = int(os.environ.get('STATS_MIN_REFRESH', 5))
+
+    # Bulk voucher generation
+    VOUCHER_MAX_BATCH = int(os.environ.get('VOUCHER_MAX_BATCH', 100000))
+    VOUCHER_INSERT_CHUNK = int(os.environ.get('VOUCHER_INSERT_CHUNK', 1000))
+    # In-memory filter of unused codes: voucher logins with unknown codes never reach the DB
+    VOUCHER_FILTER_ENABLED = os.environ.get('VOUCHER_FILTER_ENABLED', '1') == '1'
+    VOUCHER_FILTER_ERROR_RATE = float(os.environ.get('VOUCHER_FILTER_ERROR_RATE', 0.01))
+    VOUCHER_FILTER_SYNC_INTERVAL = int(os.environ.get('VOUCHER_FILTER_SYNC_INTERVAL', 2))
+    VOUCHER_FILTER_REBUILD_INTERVAL = int(os.environ.get('VOUCHER_FILTER_REBUILD_INTERVAL', 600))
+
+    # Plan catalog cache: max seconds before re-checking the shared version
+    PLAN_CACHE_TTL = int(os.environ.get('PLAN_CACHE_TTL', 30))
+
+    # JSON API (/api/v1): max operations in one /batch request
+    API_BATCH_MAX_OPS = int(os.environ.get('API_BATCH_MAX_OPS', 20))
+
+    # Gateway integration (shared secret sent as X-Gateway-Token)
+    GATEWAY_TOKEN = os.environ.get('GATEWAY_TOKEN', '')
+
+    # Gateway authorization index (seconds between incremental syncs / full reloads)
+    SESSION_INDEX_SYNC_INTERVAL = float(os.environ.get('SESSION_INDEX_SYNC_INTERVAL', 2))
+    SESSION_INDEX_REBUILD_INTERVAL = int(os.environ.get('SESSION_INDEX_REBUILD_INTERVAL', 300))
+    GATEWAY_AUTHORIZE_MAX_QUERIES = int(os.environ.get('GATEWAY_AUTHORIZE_MAX_QUERIES', 1000))
+
+    # Usage accounting ingestion
+    ACCOUNTING_FLUSH_MS = int(os.environ.get('ACCOUNTING_FLUSH_MS', 1000))
+    ACCOUNTING_MAX_PENDING = int(os.environ.get('ACCOUNTING_MAX_PENDING', 5000))
+    ACCOUNTING_CHUNK_SIZE = int(os.environ.get('ACCOUNTING_CHUNK_SIZE', 500))
+
+    # Session expiry sweeper (seconds; SESSION_IDLE_TIMEOUT=0 disables idle expiry).
+    # Idle means no gateway usage report for that long; unreported sessions are exempt.
+    SESSION_SWEEP_ENABLED = os.environ.get('SESSION_SWEEP_ENABLED', '1') == '1'
+    SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', 60))
+    SESSION_IDLE_TIMEOUT = int(os.environ.get('SESSION_IDLE_TIMEOUT', 900))
+    SESSION_SWEEP_BATCH_SIZE = int(os.environ.get('SESSION_SWEEP_BATCH_SIZE', 500))
+
+    # Balance push (Server-Sent Events); needs threaded or gevent workers
+    BALANCE_POLL_INTERVAL = float(os.environ.get('BALANCE_POLL_INTERVAL', 2))
+    BALANCE_STREAM_KEEPALIVE = int(os.environ.get('BALANCE_STREAM_KEEPALIVE', 25))
+    BALANCE_STREAM_MAX_AGE = int(os.environ.get('BALANCE_STREAM_MAX_AGE', 3600))
+
+    # Log retention: rows older than LOG_RETENTION_DAYS move to gzip JSONL files
+    # in LOG_ARCHIVE_DIR (one per day). With several hosts, point every worker
+    # at shared storage or enable the archiver on one host only.
+    LOG_ARCHIVE_ENABLED = os.environ.get('LOG_ARCHIVE_ENABLED', '1') == '1'
+    LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR', 'log_archive')
+    LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 90))
+    LOG_ARCHIVE_INTERVAL = int(os.environ.get('LOG_ARCHIVE_INTERVAL', 3600))
+    LOG_ARCHIVE_BATCH_SIZE = int(os.environ.get('LOG_ARCHIVE_BATCH_SIZE', 1000))
+    LOG_ARCHIVE_PAUSE_MS = int(os.environ.get('LOG_ARCHIVE_PAUSE_MS', 50))
+
+    # Reports page: default summary window in days
+    REPORT_DEFAULT_DAYS = int(os.environ.get('REPORT_DEFAULT_DAYS', 30))
+    # Report exports: built in the background into UPLOAD_FOLDER and reused until
+    # the underlying rows change; /reports/export waits REPORT_JOB_WAIT seconds
+    # for small ones before handing back a job to poll
+    REPORT_JOB_WORKERS = int(os.environ.get('REPORT_JOB_WORKERS', 2))
+    REPORT_JOB_WAIT = float(os.environ.get('REPORT_JOB_WAIT', 2.0))
+    REPORT_JOB_TIMEOUT = int(os.environ.get('REPORT_JOB_TIMEOUT', 3600))
+    REPORT_CACHE_MAX_AGE = int(os.environ.get('REPORT_CACHE_MAX_AGE', 24 * 3600))
+
+    # Admin listings (keyset pagination)
+    ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', 50))
+    ADMIN_MAX_PAGE_SIZE = int(os.environ.get('ADMIN_MAX_PAGE_SIZE', 500))
+
+    # Password hashing (werkzeug method string including cost, e.g. pbkdf2:sha256:600000)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    HASH_WORKERS = int(os.environ.get('HASH_WORKERS', 0)) or None  # default: CPU count
+    HASH_QUEUE_SIZE = int(os.environ.get('HASH_QUEUE_SIZE', 64))
+    HASH_QUEUE_TIMEOUT = float(os.environ.get('HASH_QUEUE_TIMEOUT', 2.0))
+
+    # Bulk user import (CSV upload under /admin/users/import)
+    USER_IMPORT_HASH_PROCESSES = int(os.environ.get('USER_IMPORT_HASH_PROCESSES', 0)) or None  # default: CPU count
+    USER_IMPORT_CHUNK = int(os.environ.get('USER_IMPORT_CHUNK', 500))
+
+    # Reverse proxies in front of the app whose X-Forwarded-* headers are trusted
+    # (1 on Render). 0 uses the socket address, which behind a proxy is the proxy's.
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+
+    # Admission control for /login, /register and /user/start_session
+    # (rates in requests/second per client IP or account; 0 disables a limit)
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+    ADMISSION_LOGIN_IP_RATE = float(os.environ.get('ADMISSION_LOGIN_IP_RATE', 5))
+    ADMISSION_LOGIN_IP_BURST = int(os.environ.get('ADMISSION_LOGIN_IP_BURST', 30))
+    ADMISSION_LOGIN_ACCOUNT_RATE = float(os.environ.get('ADMISSION_LOGIN_ACCOUNT_RATE', 0.2))
+    ADMISSION_LOGIN_ACCOUNT_BURST = int(os.environ.get('ADMISSION_LOGIN_ACCOUNT_BURST', 5))
+    ADMISSION_LOGIN_CONCURRENCY = int(os.environ.get('ADMISSION_LOGIN_CONCURRENCY', 32))
+    ADMISSION_SESSION_IP_RATE = float(os.environ.get('ADMISSION_SESSION_IP_RATE', 10))
+    ADMISSION_SESSION_IP_BURST = int(os.environ.get('ADMISSION_SESSION_IP_BURST', 40))
+    ADMISSION_SESSION_ACCOUNT_RATE = float(os.environ.get('ADMISSION_SESSION_ACCOUNT_RATE', 1))
+    ADMISSION_SESSION_ACCOUNT_BURST = int(os.environ.get('ADMISSION_SESSION_ACCOUNT_BURST', 5))
+    ADMISSION_SESSION_CONCURRENCY = int(os.environ.get('ADMISSION_SESSION_CONCURRENCY', 64))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 0.25))
+    ADMISSION_MAX_KEYS = int(os.environ.get('ADMISSION_MAX_KEYS', 100000))
+
+    # Query instrumentation and /admin/metrics (bearer token for scrapers)
+    DB_METRICS_ENABLED = os.environ.get('DB_METRICS_ENABLED', '1') == '1'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+    SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 100))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
@@ -36,11 +36,11 @@ CREATE TABLE vouchers (
     code VARCHAR(20) UNIQUE NOT NULL,
     plan_id INT,
     status ENUM('unused', 'used', 'expired') DEFAULT 'unused',
-    user_id INT DEFAULT NULL,
+    used_by INT DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     used_at TIMESTAMP NULL,
     FOREIGN KEY (plan_id) REFERENCES plans(id),
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (used_by) REFERENCES users(id)
 );
 
 -- Sessions table
@@ -54,6 +54,7 @@ CREATE TABLE sessions (
     data_used DECIMAL(10,2) DEFAULT 0.00,
     time_used INT DEFAULT 0,
     status ENUM('active', 'terminated', 'expired') DEFAULT 'active',
+    last_activity TIMESTAMP NULL,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
@@ -78,12 +79,47 @@ CREATE TABLE logs (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT,
     action VARCHAR(100) NOT NULL,
-    details TEXT,
+    description TEXT,
     ip_address VARCHAR(15),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
+-- Cache version counters (bumped on writes so every worker reloads)
+CREATE TABLE cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0
+);
+
+-- Revoked JWTs by jti, or 'user:<id>' for every token issued to a user
+-- before revoked_at; rows are purged once expires_at has passed
+CREATE TABLE revoked_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    user_id INT,
+    expires_at TIMESTAMP NULL,
+    revoked_at TIMESTAMP NOT NULL
+);
+
+-- Daily rollups for reports, maintained alongside payments and sessions
+-- (plan_id 0 = payment without a plan)
+CREATE TABLE revenue_daily (
+    day DATE NOT NULL,
+    plan_id INT NOT NULL DEFAULT 0,
+    payment_method VARCHAR(20) NOT NULL,
+    payments INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (day, plan_id, payment_method)
+);
+
+-- Sessions started/ended per day; usage is counted on the day a session ends
+CREATE TABLE usage_daily (
+    day DATE PRIMARY KEY,
+    sessions_started INT NOT NULL DEFAULT 0,
+    sessions_ended INT NOT NULL DEFAULT 0,
+    data_used DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    time_used BIGINT NOT NULL DEFAULT 0
+);
+
 -- Insert default admin user
 INSERT INTO users (username, email, password_hash, role) VALUES 
 ('admin', 'admin@hotspot.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewF7o7oUiIZjzuM2', 'admin');
@@ -94,8 +130,27 @@ INSERT INTO plans (name, description, data_limit, time_limit, price, validity_da
 ('Standard Plan', '5GB data with 7 days validity', 5120.00, 10080, 200.00, 7),
 ('Premium Plan', '10GB data with 30 days validity', 10240.00, 43200, 500.00, 30);
 
+INSERT INTO cache_versions (name, version) VALUES ('plans', 0);
+
 -- Insert sample vouchers
 INSERT INTO vouchers (code, plan_id) VALUES
 ('WIFI2024001', 1),
 ('WIFI2024002', 2),
-('WIFI2024003', 3);
\ No newline at end of file
+('WIFI2024003', 3);
+
+-- Indexes backing dashboard counters, the session sweeper, balance push,
+-- the paginated admin listings, log archival, the gateway session index
+-- and the voucher filter sync
+CREATE INDEX idx_users_role_status ON users (role, status);
+CREATE INDEX idx_sessions_status_activity ON sessions (status, last_activity);
+CREATE INDEX idx_vouchers_status ON vouchers (status);
+CREATE INDEX idx_payments_status_amount ON payments (status, amount);
+CREATE INDEX idx_users_updated_at ON users (updated_at);
+CREATE INDEX idx_users_created_at ON users (created_at);
+CREATE INDEX idx_vouchers_status_created ON vouchers (status, created_at);
+CREATE INDEX idx_vouchers_used_at ON vouchers (used_at);
+CREATE INDEX idx_sessions_start_time ON sessions (start_time);
+CREATE INDEX idx_sessions_end_time ON sessions (end_time);
+CREATE INDEX idx_logs_timestamp ON logs (timestamp);
+CREATE INDEX idx_logs_user_timestamp ON logs (user_id, timestamp);
+CREATE INDEX idx_revoked_tokens_revoked_at ON revoked_tokens (revoked_at);
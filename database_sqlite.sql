@@ -0,0 +1,159 @@
+-- SQLite equivalent of database.sql, used by DB_BACKEND=sqlite.
+-- ENUMs become CHECK constraints and timestamps default to local time
+-- to match MySQL's NOW().
+
+-- Users table
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    phone VARCHAR(20),
+    role TEXT DEFAULT 'user' CHECK (role IN ('user', 'admin')),
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive', 'suspended')),
+    data_balance DECIMAL(10,2) DEFAULT 0.00,
+    time_balance INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Emulates MySQL's ON UPDATE CURRENT_TIMESTAMP
+CREATE TRIGGER users_updated_at AFTER UPDATE ON users
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE users SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+END;
+
+-- Plans table
+CREATE TABLE plans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    data_limit DECIMAL(10,2) DEFAULT 0.00,
+    time_limit INT DEFAULT 0,
+    price DECIMAL(8,2) NOT NULL,
+    validity_days INT DEFAULT 30,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Vouchers table
+CREATE TABLE vouchers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code VARCHAR(20) UNIQUE NOT NULL,
+    plan_id INT REFERENCES plans(id),
+    status TEXT DEFAULT 'unused' CHECK (status IN ('unused', 'used', 'expired')),
+    used_by INT DEFAULT NULL REFERENCES users(id),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    used_at TIMESTAMP NULL
+);
+
+-- Sessions table
+CREATE TABLE sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id),
+    device_mac VARCHAR(17),
+    ip_address VARCHAR(15),
+    start_time TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    end_time TIMESTAMP NULL,
+    data_used DECIMAL(10,2) DEFAULT 0.00,
+    time_used INT DEFAULT 0,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'terminated', 'expired')),
+    last_activity TIMESTAMP NULL
+);
+
+-- Payments table
+CREATE TABLE payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id),
+    plan_id INT DEFAULT NULL REFERENCES plans(id),
+    voucher_id INT DEFAULT NULL REFERENCES vouchers(id),
+    amount DECIMAL(8,2) NOT NULL,
+    payment_method TEXT DEFAULT 'voucher' CHECK (payment_method IN ('voucher', 'online', 'cash')),
+    status TEXT DEFAULT 'completed' CHECK (status IN ('pending', 'completed', 'failed')),
+    transaction_id VARCHAR(100),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Logs table
+CREATE TABLE logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT REFERENCES users(id),
+    action VARCHAR(100) NOT NULL,
+    description TEXT,
+    ip_address VARCHAR(15),
+    timestamp TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Cache version counters (bumped on writes so every worker reloads)
+CREATE TABLE cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0
+);
+
+-- Revoked JWTs by jti, or 'user:<id>' for every token issued to a user
+-- before revoked_at; rows are purged once expires_at has passed
+CREATE TABLE revoked_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    user_id INT,
+    expires_at TIMESTAMP,
+    revoked_at TIMESTAMP NOT NULL
+);
+
+-- Daily rollups for reports, maintained alongside payments and sessions
+-- (plan_id 0 = payment without a plan)
+CREATE TABLE revenue_daily (
+    day DATE NOT NULL,
+    plan_id INT NOT NULL DEFAULT 0,
+    payment_method VARCHAR(20) NOT NULL,
+    payments INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (day, plan_id, payment_method)
+);
+
+-- Sessions started/ended per day; usage is counted on the day a session ends
+CREATE TABLE usage_daily (
+    day DATE PRIMARY KEY,
+    sessions_started INT NOT NULL DEFAULT 0,
+    sessions_ended INT NOT NULL DEFAULT 0,
+    data_used DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    time_used BIGINT NOT NULL DEFAULT 0
+);
+
+-- Insert default admin user
+INSERT INTO users (username, email, password_hash, role) VALUES
+('admin', 'admin@hotspot.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewF7o7oUiIZjzuM2', 'admin');
+
+-- Insert sample plans
+INSERT INTO plans (name, description, data_limit, time_limit, price, validity_days) VALUES
+('Basic Plan', '1GB data with 24 hours validity', 1024.00, 1440, 50.00, 1),
+('Standard Plan', '5GB data with 7 days validity', 5120.00, 10080, 200.00, 7),
+('Premium Plan', '10GB data with 30 days validity', 10240.00, 43200, 500.00, 30);
+
+INSERT INTO cache_versions (name, version) VALUES ('plans', 0);
+
+-- Insert sample vouchers
+INSERT INTO vouchers (code, plan_id) VALUES
+('WIFI2024001', 1),
+('WIFI2024002', 2),
+('WIFI2024003', 3);
+
+-- Indexes backing dashboard counters, the session sweeper, balance push,
+-- the paginated admin listings, log archival, the gateway session index
+-- and the voucher filter sync
+CREATE INDEX idx_users_role_status ON users (role, status);
+CREATE INDEX idx_sessions_status_activity ON sessions (status, last_activity);
+CREATE INDEX idx_vouchers_status ON vouchers (status);
+CREATE INDEX idx_payments_status_amount ON payments (status, amount);
+CREATE INDEX idx_users_updated_at ON users (updated_at);
+CREATE INDEX idx_users_created_at ON users (created_at);
+CREATE INDEX idx_vouchers_status_created ON vouchers (status, created_at);
+CREATE INDEX idx_vouchers_used_at ON vouchers (used_at);
+CREATE INDEX idx_sessions_start_time ON sessions (start_time);
+CREATE INDEX idx_sessions_end_time ON sessions (end_time);
+CREATE INDEX idx_logs_timestamp ON logs (timestamp);
+CREATE INDEX idx_logs_user_timestamp ON logs (user_id, timestamp);
+CREATE INDEX idx_revoked_tokens_revoked_at ON revoked_tokens (revoked_at);
+CREATE INDEX idx_vouchers_plan_id ON vouchers (plan_id);
+CREATE INDEX idx_sessions_user_id ON sessions (user_id);
+CREATE INDEX idx_payments_user_id ON payments (user_id);
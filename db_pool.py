@@ -0,0 +1,225 @@
+import os
+import time
+import threading
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out in time."""
+
+
+# ----------------------------------------------------------
+# POOLED CONNECTION WRAPPER
+# ----------------------------------------------------------
+class PooledConnection:
+    """Proxy around a raw DB connection; close() returns it to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self._checked_out = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            try:
+                self._raw.rollback()
+            except Exception:
+                pass
+        self.close()
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def close(self):
+        if self._checked_out:
+            self._checked_out = False
+            self._pool.release(self)
+
+    def discard(self):
+        """Close the underlying connection instead of returning it."""
+        if self._checked_out:
+            self._checked_out = False
+            self._pool._discard(self)
+
+
+# ----------------------------------------------------------
+# CONNECTION POOL
+# ----------------------------------------------------------
+class ConnectionPool:
+    """Thread-safe, bounded pool of DB connections.
+
+    Connections are pinged when borrowed after being idle for longer than
+    ``ping_interval`` seconds and are retired once older than ``max_age``.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0,
+                 max_age=3600, ping_interval=30, reset=None):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (min_size, max_size))
+        self._connect = connect
+        self._reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.ping_interval = ping_interval
+
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._pid = os.getpid()
+        self._stats = {
+            'borrows': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'failures': 0,
+            'created': 0,
+            'discarded': 0,
+        }
+
+    # ------------------------------------------------------
+    def _check_fork(self):
+        # Connections must never be shared across gunicorn worker forks.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._size = 0
+
+    def _new_connection(self):
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._stats['failures'] += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return PooledConnection(self, raw)
+
+    def _discard(self, conn):
+        try:
+            conn.raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn):
+        now = time.monotonic()
+        if self.max_age and now - conn.created_at > self.max_age:
+            return False
+        if now - conn.last_used >= self.ping_interval:
+            try:
+                conn.raw.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    # ------------------------------------------------------
+    def warm_up(self):
+        """Open connections until ``min_size`` are available."""
+        conns = []
+        try:
+            while True:
+                with self._cond:
+                    self._check_fork()
+                    if self._size >= self.min_size:
+                        break
+                    self._size += 1
+                conns.append(self._new_connection())
+        finally:
+            for conn in conns:
+                conn._checked_out = True
+                conn.close()
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, waiting up to ``timeout`` seconds."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+
+        while True:
+            with self._cond:
+                self._check_fork()
+                conn = None
+                if self._idle:
+                    conn = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            "No connection available within %.1fs (max_size=%d)"
+                            % (timeout, self.max_size)
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                conn = self._new_connection()
+            elif not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats['borrows'] += 1
+            conn._checked_out = True
+            return conn
+
+    def release(self, conn):
+        """Return a borrowed connection to the pool."""
+        if self._reset:
+            try:
+                self._reset(conn.raw)
+            except Exception:
+                self._discard(conn)
+                return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            if self.max_age and conn.last_used - conn.created_at > self.max_age:
+                expired = True
+            else:
+                expired = False
+                self._idle.append(conn)
+                self._cond.notify()
+        if expired:
+            self._discard(conn)
+
+    def close_all(self):
+        """Close every idle connection (borrowed ones close on release)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return stats
@@ -0,0 +1,107 @@
+import hmac
+import math
+from flask import Blueprint, request, jsonify
+from config import Config
+from accounting import usage_accumulator, MAX_DATA_USED, MAX_TIME_USED
+from session_index import session_index
+
+gateway_bp = Blueprint('gateway', __name__)
+
+
+# ----------------------------------------------------------
+# GATEWAY TOKEN REQUIRED DECORATOR
+# ----------------------------------------------------------
+def gateway_required(f):
+    """Ensure the caller presents the shared gateway token."""
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get('X-Gateway-Token', '')
+        if not Config.GATEWAY_TOKEN or not hmac.compare_digest(token, Config.GATEWAY_TOKEN):
+            return jsonify({'success': False, 'message': 'Invalid gateway token'}), 401
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+
+# ----------------------------------------------------------
+# INTERIM USAGE UPDATES
+# ----------------------------------------------------------
+@gateway_bp.route('/accounting', methods=['POST'])
+@gateway_required
+def accounting():
+    """Accept cumulative usage counters for one or many sessions.
+
+    Body: {"updates": [{"session_id": 1, "data_used": 12.5, "time_used": 300}, ...]}
+    Counters are totals for the session, in the units of the sessions table.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'success': False, 'message': 'Request body must be a JSON object'}), 400
+    items = payload.get('updates', [payload] if 'session_id' in payload else [])
+
+    try:
+        updates = [
+            (int(item['session_id']), float(item.get('data_used', 0)), int(item.get('time_used', 0)))
+            for item in items
+        ]
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return jsonify({'success': False, 'message': 'Malformed usage update'}), 400
+    # A total the sessions table cannot store would poison the accumulator for that session.
+    if any(not (math.isfinite(data_used) and 0 <= data_used <= MAX_DATA_USED and 0 <= time_used <= MAX_TIME_USED)
+           for _, data_used, time_used in updates):
+        return jsonify({'success': False,
+                        'message': f'Usage counters must be between 0 and {MAX_DATA_USED} MB / {MAX_TIME_USED} s'}), 400
+
+    accepted = usage_accumulator.record(updates)
+    return jsonify({'success': True, 'accepted': accepted}), 202
+
+
+@gateway_bp.route('/accounting/stats')
+@gateway_required
+def accounting_stats():
+    return jsonify(usage_accumulator.stats())
+
+
+# ----------------------------------------------------------
+# DEVICE AUTHORIZATION
+# ----------------------------------------------------------
+@gateway_bp.route('/authorize')
+@gateway_required
+def authorize():
+    """Is this device allowed online? ?mac=AA:BB:CC:DD:EE:FF and/or &ip=10.0.0.5
+
+    Answered from the in-memory active-session index; no DB query.
+    """
+    mac, ip = request.args.get('mac'), request.args.get('ip')
+    if not mac and not ip:
+        return jsonify({'success': False, 'message': 'mac or ip is required'}), 400
+    return jsonify(session_index.lookup(mac, ip))
+
+
+@gateway_bp.route('/authorize', methods=['POST'])
+@gateway_required
+def authorize_many():
+    """Bulk form of /authorize.
+
+    Body: {"queries": [{"mac": "...", "ip": "..."}, ...]}
+    Results come back in the same order.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'success': False, 'message': 'Request body must be a JSON object'}), 400
+    queries = payload.get('queries')
+    if not isinstance(queries, list):
+        return jsonify({'success': False, 'message': 'queries must be a list'}), 400
+    if len(queries) > Config.GATEWAY_AUTHORIZE_MAX_QUERIES:
+        return jsonify({'success': False,
+                        'message': f'At most {Config.GATEWAY_AUTHORIZE_MAX_QUERIES} queries per request'}), 400
+    try:
+        pairs = [(item.get('mac'), item.get('ip')) for item in queries]
+    except AttributeError:
+        return jsonify({'success': False, 'message': 'Malformed query'}), 400
+    return jsonify({'success': True, 'results': session_index.lookup_many(pairs)})
+
+
+@gateway_bp.route('/authorize/stats')
+@gateway_required
+def authorize_stats():
+    return jsonify(session_index.stats())
@@ -0,0 +1,217 @@
+import os
+import time
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+
+try:
+    import bcrypt
+except ImportError:  # only needed to verify legacy bcrypt hashes
+    bcrypt = None
+
+
+# Stored for accounts created by voucher login: the voucher code is the
+# credential, so there is nothing to hash and this value never verifies.
+VOUCHER_ACCOUNT_HASH = '!voucher'
+
+_BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+
+class HashingBusy(Exception):
+    """The hashing pool stayed full for longer than the queue timeout."""
+
+
+# ----------------------------------------------------------
+# PASSWORD HASHER
+# ----------------------------------------------------------
+class PasswordHasher:
+    """Runs password KDFs on a bounded pool sized to the CPU count.
+
+    hashlib's scrypt and PBKDF2 release the GIL, so the pool hashes in
+    parallel while capping KDF work at ``workers`` concurrent jobs; at
+    most ``max_queue`` more may wait, for up to ``queue_timeout`` seconds,
+    before callers get ``HashingBusy`` instead of piling up behind it.
+
+    ``method`` is a werkzeug method string including its cost, e.g.
+    ``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. Hashes made with
+    a different method or cost, and legacy bcrypt hashes, report
+    ``needs_rehash`` so they can be upgraded on the next login.
+    """
+
+    def __init__(self, method='scrypt', workers=None, max_queue=64, queue_timeout=2.0):
+        self.method = method
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._slots = threading.BoundedSemaphore(self.workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._stats = {
+            'hashed': 0,
+            'verified': 0,
+            'rehashed': 0,
+            'rejected': 0,
+            'queued': 0,
+            'active': 0,
+            'busy_ms': 0.0,
+            'bulk_hashed': 0,
+        }
+
+    @property
+    def method(self):
+        return self._method
+
+    @method.setter
+    def method(self, value):
+        self._method = value
+        self._method_prefix = None
+
+    def _get_executor(self):
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+        return self._executor
+
+    # ------------------------------------------------------
+    def _timed(self, func, args):
+        with self._lock:
+            self._stats['queued'] -= 1
+            self._stats['active'] += 1
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._stats['active'] -= 1
+                self._stats['busy_ms'] += (time.perf_counter() - started) * 1000
+
+    def _submit(self, func, *args, block=True):
+        if not self._slots.acquire(timeout=self.queue_timeout if block else 0):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HashingBusy(f"{self.workers + self.max_queue} hashing jobs already pending")
+        with self._lock:
+            self._stats['queued'] += 1
+        try:
+            future = self._get_executor().submit(self._timed, func, args)
+        except Exception:
+            with self._lock:
+                self._stats['queued'] -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    # ------------------------------------------------------
+    def hash(self, password):
+        result = self._submit(generate_password_hash, password, self.method).result()
+        with self._lock:
+            self._stats['hashed'] += 1
+        return result
+
+    def verify(self, password, password_hash):
+        if not password or not password_hash or password_hash == VOUCHER_ACCOUNT_HASH:
+            return False
+        if password_hash.startswith(_BCRYPT_PREFIXES):
+            check = _check_bcrypt
+        else:
+            check = _check_werkzeug
+        result = self._submit(check, password, password_hash).result()
+        with self._lock:
+            self._stats['verified'] += 1
+        return result
+
+    def needs_rehash(self, password_hash):
+        if not password_hash or password_hash == VOUCHER_ACCOUNT_HASH:
+            return False
+        if password_hash.startswith(_BCRYPT_PREFIXES):
+            return True
+        if self._method_prefix is None:
+            # werkzeug fills in default costs, so ask it what it would write.
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+    def rehash_later(self, password, save):
+        """Hash ``password`` in the background and pass the result to ``save``.
+
+        Skipped when the pool is busy; the next login will try again.
+        """
+        def job():
+            new_hash = generate_password_hash(password, self.method)
+            save(new_hash)
+            with self._lock:
+                self._stats['rehashed'] += 1
+
+        try:
+            future = self._submit(job, block=False)
+        except HashingBusy:
+            return False
+        future.add_done_callback(_report_rehash_error)
+        return True
+
+    def hash_many(self, passwords, processes=None, chunk_size=64):
+        """Hash a large batch on a process pool; yields one list of hashes per chunk, in order.
+
+        For bulk imports. The work runs in separate processes, so it uses
+        every core without taking slots from the pool that serves logins,
+        and stops early if the caller stops iterating.
+        """
+        chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+        if not chunks:
+            return
+        # spawn, not fork: forking a threaded server can copy held locks.
+        pool = ProcessPoolExecutor(max_workers=min(processes or self.workers, len(chunks)),
+                                   mp_context=multiprocessing.get_context('spawn'))
+        try:
+            for hashes in pool.map(_hash_chunk, chunks, itertools.repeat(self.method)):
+                with self._lock:
+                    self._stats['bulk_hashed'] += len(hashes)
+                yield hashes
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({'workers': self.workers, 'capacity': self.workers + self.max_queue})
+        return stats
+
+
+def _hash_chunk(passwords, method):
+    return [generate_password_hash(password, method) for password in passwords]
+
+
+def _check_werkzeug(password, password_hash):
+    return check_password_hash(password_hash, password)
+
+
+def _check_bcrypt(password, password_hash):
+    if bcrypt is None:
+        print("[AUTH ERROR] bcrypt is not installed; cannot verify legacy password hash")
+        return False
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def _report_rehash_error(future):
+    error = future.exception()
+    if error is not None:
+        print(f"[AUTH ERROR] Password rehash failed: {error}")
+
+
+password_hasher = PasswordHasher(
+    method=Config.PASSWORD_HASH_METHOD,
+    workers=Config.HASH_WORKERS,
+    max_queue=Config.HASH_QUEUE_SIZE,
+    queue_timeout=Config.HASH_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,284 @@
+import os
+import re
+import gzip
+import json
+import time
+import datetime
+import threading
+from models import get_db_connection
+from config import Config
+
+
+LOG_COLUMNS = ('id', 'user_id', 'action', 'description', 'ip_address', 'timestamp')
+
+SELECT_EXPIRED_SQL = """
+    SELECT id, user_id, action, description, ip_address, timestamp
+    FROM logs
+    WHERE timestamp < %s
+    ORDER BY id
+    LIMIT %s
+    FOR UPDATE
+"""
+
+_ARCHIVE_NAME = re.compile(r'^logs-(\d{4}-\d{2}-\d{2})\.jsonl\.gz$')
+
+
+# ----------------------------------------------------------
+# LOG RETENTION / ARCHIVAL
+# ----------------------------------------------------------
+class LogArchiver:
+    """Moves log rows older than ``retention_days`` into gzip JSONL files.
+
+    Rows are archived in chunks of ``batch_size``, oldest first: each chunk
+    is locked, appended to ``<archive_dir>/logs-YYYY-MM-DD.jsonl.gz`` (one
+    file per day, one gzip member per chunk), synced to disk and only then
+    deleted, all in one short transaction. Concurrent runs in other workers
+    wait on the row locks instead of archiving the same rows twice.
+
+    ``query`` reads the live table and the day files together, so callers
+    don't need to know where a row currently lives.
+    """
+
+    def __init__(self, archive_dir='log_archive', retention_days=90, batch_size=1000,
+                 interval=3600, pause_ms=50):
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause_ms / 1000.0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'runs': 0,
+            'failures': 0,
+            'archived_total': 0,
+            'last_run_at': None,
+            'last_run_ms': 0.0,
+            'last_archived': 0,
+            'last_batches': 0,
+        }
+
+    def ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='log-archiver', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.archive()
+
+    # ------------------------------------------------------
+    def cutoff(self):
+        """Rows logged before this moment are due for archival."""
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        return today - datetime.timedelta(days=self.retention_days)
+
+    def archive(self, cutoff=None):
+        """Archive every row older than ``cutoff``; returns the number moved."""
+        cutoff = cutoff or self.cutoff()
+        started = time.perf_counter()
+        archived = batches = 0
+        try:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            while not self._stop.is_set():
+                moved = self._archive_batch(cutoff)
+                if not moved:
+                    break
+                archived += moved
+                batches += 1
+                if moved < self.batch_size:
+                    break
+                # Let the audit writer and request traffic in between chunks.
+                time.sleep(self.pause)
+        except Exception as e:
+            self._stats['failures'] += 1
+            print(f"[LOG ERROR] Log archival failed after {archived} rows: {e}")
+
+        self._stats.update({
+            'runs': self._stats['runs'] + 1,
+            'archived_total': self._stats['archived_total'] + archived,
+            'last_run_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'last_run_ms': (time.perf_counter() - started) * 1000,
+            'last_archived': archived,
+            'last_batches': batches,
+        })
+        return archived
+
+    def _archive_batch(self, cutoff):
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        cursor = conn.cursor()
+        try:
+            cursor.execute(SELECT_EXPIRED_SQL, (cutoff, self.batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                conn.rollback()
+                return 0
+
+            by_day = {}
+            for row in rows:
+                by_day.setdefault(_as_datetime(row['timestamp']).date(), []).append(row)
+            for day, day_rows in by_day.items():
+                self._append(day, day_rows)
+
+            ids = [row['id'] for row in rows]
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(f"DELETE FROM logs WHERE id IN ({placeholders})", ids)
+            conn.commit()
+            return len(rows)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _path(self, day):
+        return os.path.join(self.archive_dir, f'logs-{day.isoformat()}.jsonl.gz')
+
+    def _append(self, day, rows):
+        lines = []
+        for row in rows:
+            record = {column: row[column] for column in LOG_COLUMNS}
+            record['timestamp'] = _as_datetime(record['timestamp']).isoformat(' ')
+            lines.append(json.dumps(record, separators=(',', ':')))
+        # Each append is a separate gzip member; readers see one stream.
+        with open(self._path(day), 'ab') as f:
+            f.write(gzip.compress(('\n'.join(lines) + '\n').encode('utf-8')))
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ------------------------------------------------------
+    def archived_days(self, start_date=None, end_date=None):
+        """Days with an archive file, newest first, within an inclusive range."""
+        try:
+            names = os.listdir(self.archive_dir)
+        except FileNotFoundError:
+            return []
+        days = []
+        for name in names:
+            match = _ARCHIVE_NAME.match(name)
+            if not match:
+                continue
+            day = datetime.date.fromisoformat(match.group(1))
+            if (start_date and day < start_date) or (end_date and day > end_date):
+                continue
+            days.append(day)
+        return sorted(days, reverse=True)
+
+    def _read_day(self, day):
+        rows = []
+        try:
+            with gzip.open(self._path(day), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    rows.append(json.loads(line))
+        except (EOFError, gzip.BadGzipFile, ValueError) as e:
+            # A crash mid-append leaves a truncated last member; keep what came before it.
+            print(f"[LOG ERROR] Archive {self._path(day)} is damaged, read {len(rows)} rows: {e}")
+        for row in rows:
+            row['timestamp'] = datetime.datetime.fromisoformat(row['timestamp'])
+        return rows
+
+    def query(self, user_id=None, start_date=None, end_date=None, action=None, limit=500):
+        """Newest-first log rows from the live table and the archive.
+
+        ``start_date``/``end_date`` are inclusive days. Each row carries
+        ``source`` ('live' or 'archive').
+        """
+        start_day = _as_date(start_date)
+        end_day = _as_date(end_date)
+
+        conditions, params = [], []
+        if user_id is not None:
+            conditions.append("user_id = %s")
+            params.append(user_id)
+        if action:
+            conditions.append("action = %s")
+            params.append(action)
+        if start_day:
+            conditions.append("timestamp >= %s")
+            params.append(datetime.datetime.combine(start_day, datetime.time()))
+        if end_day:
+            conditions.append("timestamp < %s")
+            params.append(datetime.datetime.combine(end_day + datetime.timedelta(days=1), datetime.time()))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"""
+                SELECT id, user_id, action, description, ip_address, timestamp
+                FROM logs {where}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT %s
+                """,
+                params + [limit],
+            )
+            results = [dict(row, source='live') for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+        seen = {row['id'] for row in results}
+        for day in self.archived_days(start_day, end_day):
+            if len(results) >= limit and day < results[-1]['timestamp'].date():
+                break
+            for row in self._read_day(day):
+                # A run that died between writing and deleting leaves the
+                # row in both places (or twice in the archive).
+                if row['id'] in seen:
+                    continue
+                if user_id is not None and row['user_id'] != user_id:
+                    continue
+                if action and row['action'] != action:
+                    continue
+                seen.add(row['id'])
+                results.append(dict(row, source='archive'))
+            results.sort(key=lambda row: (_as_datetime(row['timestamp']), row['id']), reverse=True)
+            del results[limit:]
+        return results
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update({
+            'retention_days': self.retention_days,
+            'interval': self.interval,
+            'batch_size': self.batch_size,
+            'archived_days': len(self.archived_days()),
+        })
+        return stats
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+log_archiver = LogArchiver(
+    archive_dir=Config.LOG_ARCHIVE_DIR,
+    retention_days=Config.LOG_RETENTION_DAYS,
+    batch_size=Config.LOG_ARCHIVE_BATCH_SIZE,
+    interval=Config.LOG_ARCHIVE_INTERVAL,
+    pause_ms=Config.LOG_ARCHIVE_PAUSE_MS,
+)
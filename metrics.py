@@ -0,0 +1,361 @@
+import re
+import time
+import threading
+import functools
+import collections
+from flask import g, request, has_request_context
+from config import Config
+
+
+# Route latency buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Queries-per-request buckets.
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+BACKGROUND = 'background'
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Collapse whitespace and literals so equal statements group together."""
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', sql)
+    return sql
+
+
+@functools.lru_cache(maxsize=2048)
+def _read_table(sql):
+    match = re.match(r'\s*SELECT\b.*?\bFROM\s+(\w+)', sql, re.I | re.S)
+    return match.group(1).lower() if match else None
+
+
+def _hashable(params):
+    try:
+        hash(params)
+        return params
+    except TypeError:
+        return repr(params)
+
+
+# ----------------------------------------------------------
+# INSTRUMENTED CONNECTION / CURSOR
+# ----------------------------------------------------------
+class InstrumentedCursor:
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+
+    def execute(self, sql, params=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            self._metrics.record_query(sql, params, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_params):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_of_params)
+        finally:
+            self._metrics.record_query(sql, None, time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, metrics):
+        self._conn = conn
+        self._metrics = metrics
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._metrics)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# ----------------------------------------------------------
+# PER-REQUEST AND PROCESS-WIDE COUNTERS
+# ----------------------------------------------------------
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'connections', 'reads', 'repeated')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.connections = 0
+        self.reads = set()
+        self.repeated = []
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class DBMetrics:
+    """Query, connection and route latency metrics for this worker.
+
+    Connections handed out by ``get_db_connection`` are wrapped so every
+    execute is timed and attributed to the current request's endpoint
+    (or ``background`` outside a request). Per-request totals are folded
+    into process-wide counters when the request ends, so the shared lock
+    is taken once per request rather than once per query.
+
+    A read is flagged as repeated when a request SELECTs from the same
+    table with the same parameters twice, e.g. looking a user up by
+    username and then by email with the same value.
+    """
+
+    def __init__(self, enabled=True, slow_query_ms=200, slow_log_size=100):
+        self.enabled = enabled
+        self.slow_query = slow_query_ms / 1000.0
+
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._latency = {}
+        self._query_counts = {}
+        self.slow_queries = collections.deque(maxlen=slow_log_size)
+        self.repeated_reads = collections.deque(maxlen=slow_log_size)
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+
+    # ------------------------------------------------------
+    def wrap(self, conn):
+        """Instrument a connection from get_db_connection()."""
+        if not self.enabled or conn is None:
+            return conn
+        stats = self._current()
+        if stats is not None:
+            stats.connections += 1
+        else:
+            self._add(self._endpoint(), connections=1)
+        return InstrumentedConnection(conn, self)
+
+    def _current(self):
+        if has_request_context():
+            return g.get('_db_metrics')
+        return None
+
+    def _endpoint(self):
+        if has_request_context():
+            return request.endpoint or 'unmatched'
+        return BACKGROUND
+
+    def _add(self, endpoint, queries=0, db_time=0.0, connections=0, repeated=0, slow=0):
+        with self._lock:
+            totals = self._endpoints.get(endpoint)
+            if totals is None:
+                totals = self._endpoints[endpoint] = {
+                    'queries': 0, 'db_time': 0.0, 'connections': 0, 'repeated': 0, 'slow': 0,
+                }
+            totals['queries'] += queries
+            totals['db_time'] += db_time
+            totals['connections'] += connections
+            totals['repeated'] += repeated
+            totals['slow'] += slow
+
+    def record_query(self, sql, params, elapsed):
+        stats = self._current()
+        slow = elapsed >= self.slow_query
+        if slow:
+            self._log_slow(sql, elapsed)
+
+        if stats is None:
+            self._add(self._endpoint(), queries=1, db_time=elapsed, slow=int(slow))
+            return
+        stats.queries += 1
+        stats.db_time += elapsed
+        if slow:
+            self._add(self._endpoint(), slow=1)
+
+        table = _read_table(sql)
+        if table is not None and params is not None:
+            key = (table, _hashable(params))
+            if key in stats.reads:
+                stats.repeated.append(normalize_sql(sql))
+            else:
+                stats.reads.add(key)
+
+    def _log_slow(self, sql, elapsed):
+        endpoint = self._endpoint()
+        statement = normalize_sql(sql)
+        self.slow_queries.append({
+            'endpoint': endpoint,
+            'ms': round(elapsed * 1000, 2),
+            'sql': statement,
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        print(f"[DB SLOW] {elapsed * 1000:.1f} ms in {endpoint}: {statement}")
+
+    # ------------------------------------------------------
+    def _start_request(self):
+        if self.enabled:
+            g._db_metrics = RequestStats()
+
+    def _finish_request(self, exc=None):
+        stats = g.pop('_db_metrics', None)
+        if stats is None:
+            return
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        blueprint = request.blueprint or 'app'
+
+        self._add(endpoint, queries=stats.queries, db_time=stats.db_time,
+                  connections=stats.connections, repeated=len(stats.repeated))
+        with self._lock:
+            key = (blueprint, endpoint)
+            latency = self._latency.get(key)
+            if latency is None:
+                latency = self._latency[key] = Histogram(LATENCY_BUCKETS)
+            latency.observe(elapsed)
+            counts = self._query_counts.get(endpoint)
+            if counts is None:
+                counts = self._query_counts[endpoint] = Histogram(QUERY_BUCKETS)
+            counts.observe(stats.queries)
+
+        if stats.repeated:
+            self.repeated_reads.append({
+                'endpoint': endpoint,
+                'statements': stats.repeated,
+                'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            })
+
+    # ------------------------------------------------------
+    def snapshot(self):
+        with self._lock:
+            endpoints = {name: dict(totals) for name, totals in self._endpoints.items()}
+        return {
+            'endpoints': endpoints,
+            'slow_queries': list(self.slow_queries),
+            'repeated_reads': list(self.repeated_reads),
+        }
+
+    def render(self, components=None):
+        """Prometheus text exposition of everything recorded so far.
+
+        ``components`` maps a component name to a stats() dict. Numeric
+        values listed in ``COMPONENT_COUNTERS`` are exported as counters
+        named ``hotspot_<component>_<key>_total``; the rest are gauges named
+        ``hotspot_<component>_<key>``.
+        """
+        lines = []
+        with self._lock:
+            endpoints = {name: dict(totals) for name, totals in self._endpoints.items()}
+            latency = {key: (list(h.counts), h.sum, h.count) for key, h in self._latency.items()}
+            query_counts = {key: (list(h.counts), h.sum, h.count) for key, h in self._query_counts.items()}
+
+        _histogram(lines, 'hotspot_request_duration_seconds', 'Route latency in seconds.',
+                   LATENCY_BUCKETS, {(('blueprint', bp), ('endpoint', ep)): v for (bp, ep), v in latency.items()})
+        _histogram(lines, 'hotspot_db_queries_per_request', 'DB queries issued per request.',
+                   QUERY_BUCKETS, {(('endpoint', ep),): v for ep, v in query_counts.items()})
+
+        for key, name, help_text in (
+            ('queries', 'hotspot_db_queries_total', 'DB queries executed.'),
+            ('db_time', 'hotspot_db_query_seconds_total', 'Time spent executing DB queries.'),
+            ('connections', 'hotspot_db_connections_total', 'Connections taken from get_db_connection().'),
+            ('repeated', 'hotspot_db_repeated_reads_total', 'Reads repeating an earlier read in the same request.'),
+            ('slow', 'hotspot_db_slow_queries_total', f'Queries slower than {self.slow_query * 1000:g} ms.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, totals in sorted(endpoints.items()):
+                lines.append(f'{name}{_labels((("endpoint", endpoint),))} {_number(totals[key])}')
+
+        for component, stats in (components or {}).items():
+            counters = _counter_keys(component)
+            for key, value in sorted(stats.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'hotspot_{component}_{key}'
+                if key in counters:
+                    if not name.endswith('_total'):
+                        name += '_total'
+                    lines.append(f'# TYPE {name} counter')
+                else:
+                    lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# ----------------------------------------------------------
+# PROMETHEUS TEXT FORMAT HELPERS
+# ----------------------------------------------------------
+# Component stats that only ever grow (per process). Exported as counters so
+# rate() and increase() handle worker restarts; every other value is a level.
+COMPONENT_COUNTERS = {
+    'audit_log': {'enqueued', 'written', 'batches', 'dropped', 'spilled', 'failed_batches', 'rejected'},
+    'accounting': {'received', 'coalesced', 'flushes', 'sessions_flushed', 'users_charged', 'failures',
+                   'rejected'},
+    'session_sweeper': {'runs', 'expired_total', 'failures'},
+    'log_archive': {'runs', 'archived_total', 'failures'},
+    'assets': {'not_modified', 'served_br', 'served_gzip', 'served_identity'},
+    'token_revocations': {'revoked_hits', 'syncs', 'sync_failures'},
+    'session_index': {'lookups', 'hits', 'syncs', 'rebuilds', 'failures'},
+    'voucher_filter': {'checks', 'rejected', 'passed', 'syncs', 'rebuilds', 'failures'},
+    'report_jobs': {'submitted', 'cache_hits', 'joined', 'completed', 'failed', 'build_ms'},
+    'password_hasher': {'hashed', 'verified', 'rehashed', 'bulk_hashed', 'rejected', 'busy_ms'},
+    'admission': {'admitted', 'queued', 'queue_wait_ms', 'rejected_ip', 'rejected_account', 'rejected_busy'},
+    'db_pool': {'borrows', 'created', 'discarded', 'failures', 'timeouts', 'waits'},
+}
+
+
+def _counter_keys(component):
+    if component.startswith('admission_'):
+        component = 'admission'
+    return COMPONENT_COUNTERS.get(component, ())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram(lines, name, help_text, buckets, series):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, (counts, total, count) in sorted(series.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+        lines.append(f'{name}_count{_labels(labels)} {count}')
+
+
+db_metrics = DBMetrics(
+    enabled=Config.DB_METRICS_ENABLED,
+    slow_query_ms=Config.SLOW_QUERY_MS,
+    slow_log_size=Config.SLOW_QUERY_LOG_SIZE,
+)
@@ -1,25 +1,170 @@
-import pymysql
-from flask import current_app
-import os
+import json
+import time
+import base64
+import datetime
+import threading
+from decimal import Decimal
+from config import Config
+from db_pool import ConnectionPool
+from storage import get_backend, IntegrityError
+from metrics import db_metrics
 
 # ----------------------------------------------------------
 # DATABASE CONNECTION
 # ----------------------------------------------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _connect():
+    return get_backend().connect()
+
+
+def _reset_connection(conn):
+    get_backend().reset(conn)
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect,
+                    min_size=Config.DB_POOL_MIN_SIZE,
+                    max_size=Config.DB_POOL_MAX_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    max_age=Config.DB_POOL_MAX_AGE,
+                    ping_interval=Config.DB_POOL_PING_INTERVAL,
+                    reset=_reset_connection,
+                )
+                try:
+                    _pool.warm_up()
+                except Exception as e:
+                    print(f"[DB ERROR] Pool warm-up failed: {e}")
+    return _pool
+
+
+def reset_pool():
+    """Close pooled connections, e.g. after switching storage backends."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = None
+
+
 def get_db_connection():
     try:
-        conn = pymysql.connect(
-            host=os.environ.get("MYSQL_HOST", "localhost"),
-            user=os.environ.get("MYSQL_USER", "root"),
-            password=os.environ.get("MYSQL_PASSWORD", ""),
-            database=os.environ.get("MYSQL_DATABASE", "wifi_hotspot_db"),
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        return conn
+        if not Config.DB_POOL_ENABLED:
+            return db_metrics.wrap(_connect())
+        return db_metrics.wrap(get_pool().acquire())
     except Exception as e:
         print(f"[DB ERROR] Connection failed: {e}")
         return None
 
 
+# ----------------------------------------------------------
+# KEYSET PAGINATION
+# ----------------------------------------------------------
+def _encode_cursor(value, row_id):
+    if isinstance(value, (datetime.datetime, datetime.date, Decimal)):
+        value = str(value)
+    raw = json.dumps([value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        value, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        # binascii, UnicodeDecodeError and JSONDecodeError are all ValueErrors.
+        raise ValueError(f"Invalid page cursor: {token!r}") from None
+    if not isinstance(row_id, int) or isinstance(value, (list, dict)):
+        raise ValueError(f"Invalid page cursor: {token!r}")
+    return value, row_id
+
+
+def is_valid_cursor(token):
+    """True if ``token`` decodes as a page cursor (links can be edited by hand)."""
+    try:
+        _decode_cursor(token)
+    except ValueError:
+        return False
+    return True
+
+
+def _keyset_page(select_sql, id_column, sort, conditions, params,
+                 after=None, before=None, descending=True, limit=50):
+    """Fetch one page ordered by ``sort`` with ``id_column`` as tie-breaker.
+
+    ``sort`` is (SQL expression, result key). Instead of OFFSET, the page
+    starts right after (or before) the row encoded in the cursor token, so
+    every page costs one index range read however deep it is. Returns
+    {'items': rows, 'next': token|None, 'prev': token|None}.
+    """
+    sort_column, sort_key = sort
+    conditions, params = list(conditions), list(params)
+    token = before or after
+    backwards = before is not None
+    desc = descending != backwards
+    op = '<' if desc else '>'
+
+    if token:
+        value, last_id = _decode_cursor(token)
+        if sort_column == id_column:
+            conditions.append(f"{id_column} {op} %s")
+            params.append(last_id)
+        else:
+            conditions.append(f"({sort_column} {op} %s OR ({sort_column} = %s AND {id_column} {op} %s))")
+            params += [value, value, last_id]
+
+    direction = 'DESC' if desc else 'ASC'
+    order_by = f"{id_column} {direction}"
+    if sort_column != id_column:
+        order_by = f"{sort_column} {direction}, {order_by}"
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = f"{select_sql}{where} ORDER BY {order_by} LIMIT %s"
+    params.append(limit + 1)
+
+    conn = get_db_connection()
+    if not conn:
+        return {'items': [], 'next': None, 'prev': None}
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = list(cursor.fetchall())
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    def row_token(row):
+        return _encode_cursor(row[sort_key], row['id'])
+
+    if not rows:
+        return {'items': [], 'next': None, 'prev': None}
+    if backwards:
+        return {'items': rows, 'next': row_token(rows[-1]), 'prev': row_token(rows[0]) if has_more else None}
+    return {'items': rows, 'next': row_token(rows[-1]) if has_more else None,
+            'prev': row_token(rows[0]) if token else None}
+
+
+def _date_range(column, start_date, end_date, conditions, params):
+    """Append an inclusive [start_date, end_date] day range on ``column``."""
+    if start_date:
+        conditions.append(f"{column} >= %s")
+        params.append(start_date)
+    if end_date:
+        conditions.append(f"{column} < %s")
+        params.append(end_date + datetime.timedelta(days=1))
+
+
 # ----------------------------------------------------------
 # USER MODEL
 # ----------------------------------------------------------
@@ -35,6 +180,18 @@ class User:
         conn.close()
         return result
 
+    @staticmethod
+    def get_balance(user_id):
+        """Only the balance columns, for frequent polling paths."""
+        conn = get_db_connection()
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, data_balance, time_balance FROM users WHERE id = %s", (user_id,))
+        result = cursor.fetchone()
+        conn.close()
+        return result
+
     @staticmethod
     def get_by_username(username):
         conn = get_db_connection()
@@ -62,8 +219,63 @@ class User:
         conn.commit()
         user_id = cursor.lastrowid
         conn.close()
+        Stats.invalidate()
         return user_id
 
+    @staticmethod
+    def find_existing(usernames, emails, chunk_size=500):
+        """Which of these usernames / emails are already taken: two sets, one IN query per chunk."""
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        cursor = conn.cursor()
+        taken = {'username': set(), 'email': set()}
+        try:
+            for column, values in (('username', list(usernames)), ('email', list(emails))):
+                for i in range(0, len(values), chunk_size):
+                    chunk = values[i:i + chunk_size]
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    cursor.execute(f"SELECT {column} FROM users WHERE {column} IN ({placeholders})", chunk)
+                    taken[column].update(row[column].lower() for row in cursor.fetchall())
+        finally:
+            conn.close()
+        return taken['username'], taken['email']
+
+    @staticmethod
+    def bulk_create(rows):
+        """Insert ``(username, email, password_hash, phone)`` rows with one multi-row INSERT.
+
+        If a row collides with one inserted since it was checked, the chunk
+        is retried row by row. Returns ``(created, failed)``: the number
+        inserted and the ``(row, message)`` pairs that were not.
+        """
+        # Placeholders only: PyMySQL folds executemany() into one multi-row
+        # statement only when VALUES (...) holds nothing else.
+        sql = "INSERT INTO users (username, email, password_hash, phone, role, status) VALUES (%s, %s, %s, %s, %s, %s)"
+        params = [tuple(row) + ('user', 'active') for row in rows]
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        cursor = conn.cursor()
+        failed = []
+        try:
+            try:
+                cursor.executemany(sql, params)
+                conn.commit()
+            except IntegrityError:
+                conn.rollback()
+                for row, values in zip(rows, params):
+                    try:
+                        cursor.execute(sql, values)
+                        conn.commit()
+                    except IntegrityError:
+                        conn.rollback()
+                        failed.append((row, 'Username or email already exists'))
+        finally:
+            conn.close()
+        Stats.invalidate()
+        return len(rows) - len(failed), failed
+
     @staticmethod
     def update_balance(user_id, data_limit, time_limit):
         conn = get_db_connection()
@@ -75,6 +287,38 @@ class User:
         conn.commit()
         conn.close()
 
+    @staticmethod
+    def update_password_hash(user_id, password_hash):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (password_hash, user_id))
+        conn.commit()
+        conn.close()
+
+    PAGE_SORTS = {
+        'id': ('id', 'id'),
+        'created_at': ('created_at', 'created_at'),
+        'username': ('username', 'username'),
+    }
+
+    @staticmethod
+    def get_page(role=None, status=None, start_date=None, end_date=None,
+                 sort='id', descending=True, after=None, before=None, limit=50):
+        """One keyset page of users with only the columns the admin list shows."""
+        conditions, params = [], []
+        if role:
+            conditions.append("role = %s")
+            params.append(role)
+        if status:
+            conditions.append("status = %s")
+            params.append(status)
+        _date_range('created_at', start_date, end_date, conditions, params)
+        return _keyset_page(
+            "SELECT id, username, email, phone, role, status, data_balance, time_balance, created_at FROM users",
+            'id', User.PAGE_SORTS.get(sort, User.PAGE_SORTS['id']), conditions, params,
+            after=after, before=before, descending=descending, limit=limit,
+        )
+
     @staticmethod
     def get_all():
         conn = get_db_connection()
@@ -88,24 +332,103 @@ class User:
 # ----------------------------------------------------------
 # PLAN MODEL
 # ----------------------------------------------------------
+class PlanCatalog:
+    """Immutable snapshot of the plans table plus lookups built from it."""
+
+    def __init__(self, version, plans):
+        # Imported here: utils imports this module at load time.
+        from utils import format_data_size, format_time_duration
+
+        self.version = version
+        self.plans = plans
+        self.by_id = {plan['id']: plan for plan in plans}
+        self.formatted = [
+            dict(plan,
+                 data_limit_formatted=format_data_size((plan.get('data_limit') or 0) * 1024 * 1024),
+                 time_limit_formatted=format_time_duration(plan.get('time_limit') or 0))
+            for plan in plans
+        ]
+
+
 class Plan:
+    """Plans are served from a per-worker catalog cache.
+
+    Plan.create bumps the shared ``cache_versions`` row for 'plans'. Every
+    worker compares its catalog against that counter at most once per
+    ``Config.PLAN_CACHE_TTL`` seconds and reloads when it has moved, which
+    bounds how stale another worker's view can get. Returned rows are
+    shared between requests and must be treated as read-only.
+    """
+
+    _catalog = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _fetch_version(cursor):
+        cursor.execute("SELECT version FROM cache_versions WHERE name = 'plans'")
+        row = cursor.fetchone()
+        return row['version'] if row else 0
+
+    @staticmethod
+    def _catalog_snapshot():
+        catalog = Plan._catalog
+        if catalog is not None and time.monotonic() - Plan._checked_at < Config.PLAN_CACHE_TTL:
+            return catalog
+
+        with Plan._lock:
+            if Plan._catalog is not catalog:
+                return Plan._catalog
+
+            conn = get_db_connection()
+            if not conn:
+                return catalog
+            try:
+                cursor = conn.cursor()
+                version = Plan._fetch_version(cursor)
+                if catalog is None or catalog.version != version:
+                    cursor.execute("SELECT * FROM plans")
+                    catalog = PlanCatalog(version, cursor.fetchall())
+            finally:
+                conn.close()
+
+            Plan._catalog = catalog
+            Plan._checked_at = time.monotonic()
+            return catalog
+
+    @staticmethod
+    def invalidate():
+        """Drop this worker's catalog so the next read reloads it."""
+        with Plan._lock:
+            Plan._catalog = None
+            Plan._checked_at = 0.0
+
     @staticmethod
     def get_all():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM plans")
-        plans = cursor.fetchall()
-        conn.close()
-        return plans
+        catalog = Plan._catalog_snapshot()
+        return list(catalog.plans) if catalog else []
+
+    @staticmethod
+    def catalog_version():
+        """Version of the catalog this worker is serving (changes with any plan)."""
+        catalog = Plan._catalog_snapshot()
+        return catalog.version if catalog else 0
+
+    @staticmethod
+    def get_all_formatted():
+        """Plans with data_limit_formatted / time_limit_formatted precomputed."""
+        catalog = Plan._catalog_snapshot()
+        return list(catalog.formatted) if catalog else []
 
     @staticmethod
     def get_by_id(plan_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM plans WHERE id = %s", (plan_id,))
-        plan = cursor.fetchone()
-        conn.close()
-        return plan
+        catalog = Plan._catalog_snapshot()
+        if not catalog:
+            return None
+        try:
+            return catalog.by_id.get(int(plan_id))
+        except (TypeError, ValueError):
+            return None
 
     @staticmethod
     def create(name, description, data_limit, time_limit, price, validity_days):
@@ -116,9 +439,15 @@ class Plan:
             VALUES (%s, %s, %s, %s, %s, %s)
         """
         cursor.execute(sql, (name, description, data_limit, time_limit, price, validity_days))
-        conn.commit()
         plan_id = cursor.lastrowid
+        # Upsert: databases created before cache_versions was seeded have no 'plans' row.
+        cursor.execute("""
+            INSERT INTO cache_versions (name, version) VALUES ('plans', 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """)
+        conn.commit()
         conn.close()
+        Plan.invalidate()
         return plan_id
 
 
@@ -126,6 +455,49 @@ class Plan:
 # VOUCHER MODEL
 # ----------------------------------------------------------
 class Voucher:
+    PAGE_SORTS = {
+        'id': ('v.id', 'id'),
+        'created_at': ('v.created_at', 'created_at'),
+    }
+
+    _listeners = []
+
+    @staticmethod
+    def add_listener(callback):
+        """Call ``callback(event, codes)`` after vouchers are 'created' or 'redeemed' in this worker."""
+        Voucher._listeners.append(callback)
+
+    @staticmethod
+    def _notify(event, codes):
+        for callback in Voucher._listeners:
+            try:
+                callback(event, codes)
+            except Exception as e:
+                print(f"[DB ERROR] Voucher listener failed: {e}")
+
+    @staticmethod
+    def get_page(status=None, plan_id=None, start_date=None, end_date=None,
+                 sort='id', descending=True, after=None, before=None, limit=50):
+        """One keyset page of vouchers joined with plan name and redeeming user."""
+        conditions, params = [], []
+        if status:
+            conditions.append("v.status = %s")
+            params.append(status)
+        if plan_id:
+            conditions.append("v.plan_id = %s")
+            params.append(plan_id)
+        _date_range('v.created_at', start_date, end_date, conditions, params)
+        return _keyset_page(
+            """
+            SELECT v.id, v.code, v.status, v.created_at, v.used_at, pl.name AS plan_name, u.username
+            FROM vouchers v
+            LEFT JOIN plans pl ON pl.id = v.plan_id
+            LEFT JOIN users u ON u.id = v.used_by
+            """,
+            'v.id', Voucher.PAGE_SORTS.get(sort, Voucher.PAGE_SORTS['id']), conditions, params,
+            after=after, before=before, descending=descending, limit=limit,
+        )
+
     @staticmethod
     def get_all():
         conn = get_db_connection()
@@ -154,6 +526,139 @@ class Voucher:
         )
         conn.commit()
         conn.close()
+        Stats.invalidate()
+        Voucher._notify('redeemed', [code])
+
+    @staticmethod
+    def redeem(code, password_hash):
+        """Redeem a voucher into a new account in a single transaction.
+
+        The conditional UPDATE is the claim: only one caller can move a code
+        from 'unused' to 'used', so concurrent redemptions of the same code
+        credit exactly one account. Returns the new account details, or None
+        if the code is unknown, already used or has no valid plan.
+        """
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+
+        cursor = conn.cursor()
+        try:
+            claimed = cursor.execute(
+                "UPDATE vouchers SET status = 'used', used_at = NOW() WHERE code = %s AND status = 'unused'",
+                (code,),
+            )
+            if not claimed:
+                conn.rollback()
+                return None
+
+            cursor.execute("SELECT id, plan_id FROM vouchers WHERE code = %s", (code,))
+            voucher = cursor.fetchone()
+            plan = Plan.get_by_id(voucher['plan_id'])
+            if not plan:
+                conn.rollback()
+                return None
+
+            username = f"voucher_{code}"
+            cursor.execute(
+                """
+                INSERT INTO users (username, email, password_hash, role, status, data_balance, time_balance)
+                VALUES (%s, %s, %s, 'user', 'active', %s, %s)
+                """,
+                (username, f"{username}@temp.com", password_hash, plan['data_limit'], plan['time_limit']),
+            )
+            user_id = cursor.lastrowid
+
+            cursor.execute("UPDATE vouchers SET used_by = %s WHERE id = %s", (user_id, voucher['id']))
+            cursor.execute(
+                """
+                INSERT INTO payments (user_id, amount, payment_method, plan_id, voucher_id, status, created_at)
+                VALUES (%s, %s, 'voucher', %s, %s, 'completed', NOW())
+                """,
+                (user_id, plan['price'], plan['id'], voucher['id']),
+            )
+            Rollups.record_payment(cursor, plan['id'], 'voucher', plan['price'])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        Stats.invalidate()
+        Voucher._notify('redeemed', [code])
+        return {'user_id': user_id, 'username': username, 'plan': plan, 'voucher_id': voucher['id']}
+
+    @staticmethod
+    def bulk_create(plan_id, quantity, code_factory, chunk_size=1000, max_retries=5):
+        """Insert ``quantity`` vouchers in one transaction using multi-row INSERTs.
+
+        ``code_factory(n)`` must return ``n`` distinct codes. Codes that already
+        exist are replaced chunk by chunk, so a collision only costs the
+        colliding codes. Returns the codes and throughput figures.
+        """
+        started = time.perf_counter()
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+
+        cursor = conn.cursor()
+        seen = set()
+        created = []
+        collisions = 0
+
+        def fresh_codes(n):
+            codes = []
+            while len(codes) < n:
+                for code in code_factory(n - len(codes)):
+                    if code not in seen:
+                        seen.add(code)
+                        codes.append(code)
+            return codes
+
+        try:
+            remaining = quantity
+            while remaining > 0:
+                chunk = fresh_codes(min(chunk_size, remaining))
+                for attempt in range(max_retries + 1):
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    cursor.execute(f"SELECT code FROM vouchers WHERE code IN ({placeholders})", chunk)
+                    taken = {row['code'] for row in cursor.fetchall()}
+                    if taken:
+                        collisions += len(taken)
+                        chunk = [c for c in chunk if c not in taken] + fresh_codes(len(taken))
+                        continue
+                    try:
+                        cursor.executemany(
+                            "INSERT INTO vouchers (code, plan_id) VALUES (%s, %s)",
+                            [(code, plan_id) for code in chunk],
+                        )
+                        break
+                    except IntegrityError:
+                        # Lost a race with a concurrent generator; re-check this chunk.
+                        if attempt == max_retries:
+                            raise
+                else:
+                    raise RuntimeError("Could not find unique voucher codes")
+                created.extend(chunk)
+                remaining -= len(chunk)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        Stats.invalidate()
+        Voucher._notify('created', created)
+
+        elapsed = time.perf_counter() - started
+        return {
+            'codes': created,
+            'generated': len(created),
+            'collisions': collisions,
+            'elapsed': elapsed,
+            'rate': len(created) / elapsed if elapsed > 0 else 0.0,
+        }
 
 
 # ----------------------------------------------------------
@@ -169,9 +674,11 @@ class Payment:
             VALUES (%s, %s, %s, %s, %s, 'completed', NOW())
         """
         cursor.execute(sql, (user_id, amount, method, plan_id, voucher_id))
-        conn.commit()
         payment_id = cursor.lastrowid
+        Rollups.record_payment(cursor, plan_id, method, amount)
+        conn.commit()
         conn.close()
+        Stats.invalidate()
         return payment_id
 
     @staticmethod
@@ -179,7 +686,7 @@ class Payment:
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT SUM(amount) AS total_revenue, COUNT(*) AS total_transactions FROM payments WHERE status = 'completed'"
+            "SELECT SUM(revenue) AS total_revenue, SUM(payments) AS total_transactions FROM revenue_daily"
         )
         stats = cursor.fetchone()
         conn.close()
@@ -190,6 +697,71 @@ class Payment:
 # SESSION MODEL
 # ----------------------------------------------------------
 class Session:
+    PAGE_SORTS = {
+        'id': ('s.id', 'id'),
+        'start_time': ('s.start_time', 'start_time'),
+    }
+
+    _listeners = []
+
+    @staticmethod
+    def add_listener(callback):
+        """Call ``callback(event, sessions)`` after sessions start or end in this worker.
+
+        'started' passes rows with id, user_id, device_mac and ip_address;
+        'ended' passes session ids (terminated or expired).
+        """
+        Session._listeners.append(callback)
+
+    @staticmethod
+    def _notify(event, sessions):
+        for callback in Session._listeners:
+            try:
+                callback(event, sessions)
+            except Exception as e:
+                print(f"[DB ERROR] Session listener failed: {e}")
+
+    @staticmethod
+    def get_page(status='active', user_id=None, start_date=None, end_date=None,
+                 sort='id', descending=True, after=None, before=None, limit=50):
+        """One keyset page of sessions joined with the owner's username."""
+        conditions, params = [], []
+        if status:
+            conditions.append("s.status = %s")
+            params.append(status)
+        if user_id:
+            conditions.append("s.user_id = %s")
+            params.append(user_id)
+        _date_range('s.start_time', start_date, end_date, conditions, params)
+        return _keyset_page(
+            """
+            SELECT s.id, s.user_id, u.username, s.ip_address, s.device_mac, s.start_time,
+                   s.data_used, s.time_used, s.status
+            FROM sessions s
+            JOIN users u ON u.id = s.user_id
+            """,
+            's.id', Session.PAGE_SORTS.get(sort, Session.PAGE_SORTS['id']),
+            conditions, params,
+            after=after, before=before, descending=descending, limit=limit,
+        )
+
+    @staticmethod
+    def get_by_id(session_id):
+        conn = get_db_connection()
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, user_id, device_mac, ip_address, start_time, end_time, data_used, time_used, status
+            FROM sessions WHERE id = %s
+            """,
+            (session_id,),
+        )
+        result = cursor.fetchone()
+        conn.close()
+        return result
+
     @staticmethod
     def get_active_sessions():
         conn = get_db_connection()
@@ -208,18 +780,490 @@ class Session:
             VALUES (%s, %s, %s, NOW(), 'active')
         """
         cursor.execute(sql, (user_id, device_mac, ip_address))
-        conn.commit()
         session_id = cursor.lastrowid
+        Rollups.record_sessions(cursor, started=1)
+        conn.commit()
         conn.close()
+        Stats.invalidate()
+        Session._notify('started', [{
+            'id': session_id, 'user_id': user_id, 'device_mac': device_mac, 'ip_address': ip_address,
+        }])
         return session_id
 
     @staticmethod
     def terminate_session(session_id):
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE sessions SET status = 'terminated', end_time = NOW() WHERE id = %s",
-            (session_id,),
-        )
-        conn.commit()
-        conn.close()
+        try:
+            cursor.execute(
+                "SELECT data_used, time_used FROM sessions WHERE id = %s AND status = 'active' FOR UPDATE",
+                (session_id,),
+            )
+            row = cursor.fetchone()
+            if row:
+                cursor.execute(
+                    "UPDATE sessions SET status = 'terminated', end_time = NOW() WHERE id = %s",
+                    (session_id,),
+                )
+                Rollups.record_sessions(cursor, ended=1, data_used=row['data_used'], time_used=row['time_used'])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        Stats.invalidate()
+        if row:
+            Session._notify('ended', [session_id])
+
+    @staticmethod
+    def apply_usage(usage):
+        """Record cumulative usage counters and charge the owners' balances.
+
+        ``usage`` maps session_id -> (data_used, time_used), both cumulative
+        totals for the session as reported by the gateway. Only growth since
+        the stored counters is charged, so resent or out-of-order reports are
+        harmless. Each statement covers the whole batch and rows are locked
+        in id order, so a flush takes every user row lock once. Returns the
+        ids of users whose balance changed.
+        """
+        if not usage:
+            return []
+
+        session_ids = sorted(usage)
+        placeholders = ', '.join(['%s'] * len(session_ids))
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"""
+                SELECT id, user_id, data_used, time_used FROM sessions
+                WHERE id IN ({placeholders}) AND status = 'active'
+                ORDER BY id FOR UPDATE
+                """,
+                session_ids,
+            )
+            sessions = cursor.fetchall()
+
+            session_rows, charges = [], {}
+            for row in sessions:
+                data_used, time_used = usage[row['id']]
+                data_used = max(Decimal(str(data_used)), row['data_used'] or 0)
+                time_used = max(int(time_used), row['time_used'] or 0)
+                session_rows.append((row['id'], data_used, time_used))
+
+                data_delta = data_used - (row['data_used'] or 0)
+                time_delta = time_used - (row['time_used'] or 0)
+                if data_delta or time_delta:
+                    charged = charges.setdefault(row['user_id'], [Decimal(0), 0])
+                    charged[0] += data_delta
+                    charged[1] += time_delta
+
+            if session_rows:
+                ids = [sid for sid, _, _ in session_rows]
+                case = ' '.join(['WHEN %s THEN %s'] * len(session_rows))
+                params = [v for sid, data, _ in session_rows for v in (sid, data)]
+                params += [v for sid, _, secs in session_rows for v in (sid, secs)]
+                params += ids
+                cursor.execute(
+                    f"""
+                    UPDATE sessions
+                    SET data_used = CASE id {case} END,
+                        time_used = CASE id {case} END,
+                        last_activity = NOW()
+                    WHERE id IN ({', '.join(['%s'] * len(ids))})
+                    """,
+                    params,
+                )
+
+            if charges:
+                user_ids = sorted(charges)
+                case = ' '.join(['WHEN %s THEN %s'] * len(user_ids))
+                params = [v for uid in user_ids for v in (uid, charges[uid][0])]
+                params += [v for uid in user_ids for v in (uid, charges[uid][1])]
+                params += user_ids
+                cursor.execute(
+                    f"""
+                    UPDATE users
+                    SET data_balance = GREATEST(data_balance - CASE id {case} END, 0),
+                        time_balance = GREATEST(time_balance - CASE id {case} END, 0)
+                    WHERE id IN ({', '.join(['%s'] * len(user_ids))})
+                    """,
+                    params,
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        return sorted(charges)
+
+    @staticmethod
+    def expire_stale(idle_before=None, batch_size=500):
+        """Expire active sessions whose owner is out of balance or that went idle.
+
+        Sessions are picked ``batch_size`` at a time through the (status, ...)
+        indexes and closed with one multi-row UPDATE per batch, committing
+        between batches so locks stay short. ``idle_before`` is the cutoff
+        for the last usage report; sessions no gateway has reported on yet
+        are never idle-expired. None skips the idle check.
+        Returns {'exhausted': [ids], 'idle': [ids]}.
+        """
+        queries = {
+            'exhausted': (
+                """
+                SELECT s.id FROM sessions s JOIN users u ON u.id = s.user_id
+                WHERE s.status = 'active' AND (u.data_balance <= 0 OR u.time_balance <= 0)
+                ORDER BY s.id LIMIT %s
+                """,
+                (),
+            ),
+        }
+        if idle_before is not None:
+            queries['idle'] = (
+                """
+                SELECT id FROM sessions
+                WHERE status = 'active' AND last_activity < %s
+                ORDER BY id LIMIT %s
+                """,
+                (idle_before,),
+            )
+
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+
+        expired = {reason: [] for reason in ('exhausted', 'idle')}
+        cursor = conn.cursor()
+        try:
+            for reason, (sql, params) in queries.items():
+                while True:
+                    cursor.execute(sql, params + (batch_size,))
+                    candidates = [row['id'] for row in cursor.fetchall()]
+                    if not candidates:
+                        break
+                    # Lock the rows that are still active (another worker may be
+                    # sweeping too) so their usage is rolled up exactly once.
+                    placeholders = ', '.join(['%s'] * len(candidates))
+                    cursor.execute(
+                        f"""
+                        SELECT id, data_used, time_used FROM sessions
+                        WHERE id IN ({placeholders}) AND status = 'active' ORDER BY id FOR UPDATE
+                        """,
+                        candidates,
+                    )
+                    rows = cursor.fetchall()
+                    ids = [row['id'] for row in rows]
+                    if ids:
+                        placeholders = ', '.join(['%s'] * len(ids))
+                        cursor.execute(
+                            f"UPDATE sessions SET status = 'expired', end_time = NOW() WHERE id IN ({placeholders})",
+                            ids,
+                        )
+                        Rollups.record_sessions(
+                            cursor, ended=len(ids),
+                            data_used=sum(row['data_used'] or 0 for row in rows),
+                            time_used=sum(row['time_used'] or 0 for row in rows),
+                        )
+                    conn.commit()
+                    expired[reason].extend(ids)
+                    if len(candidates) < batch_size:
+                        break
+        finally:
+            conn.close()
+
+        if expired['exhausted'] or expired['idle']:
+            Stats.invalidate()
+            Session._notify('ended', expired['exhausted'] + expired['idle'])
+        return expired
+
+
+# ----------------------------------------------------------
+# DASHBOARD STATS (CACHED SNAPSHOT)
+# ----------------------------------------------------------
+class Stats:
+    """Admin dashboard counters computed in one round-trip and cached.
+
+    Write paths call ``Stats.invalidate()``; the snapshot is then rebuilt on
+    the next read, but never more often than ``Config.STATS_MIN_REFRESH``
+    seconds. ``Config.STATS_TTL`` bounds staleness for changes made by
+    other workers.
+    """
+
+    _snapshot = None
+    _computed_at = 0.0
+    _dirty = False
+    _lock = threading.Lock()
+
+    SNAPSHOT_SQL = """
+        SELECT
+            (SELECT COUNT(*) FROM users WHERE role = 'user') AS total_users,
+            (SELECT COUNT(*) FROM users WHERE role = 'user' AND status = 'active') AS active_users,
+            (SELECT COUNT(*) FROM sessions WHERE status = 'active') AS active_sessions,
+            (SELECT COALESCE(SUM(revenue), 0) FROM revenue_daily) AS total_revenue,
+            (SELECT COALESCE(SUM(payments), 0) FROM revenue_daily) AS total_transactions,
+            (SELECT COUNT(*) FROM vouchers) AS total_vouchers,
+            (SELECT COUNT(*) FROM vouchers WHERE status = 'unused') AS unused_vouchers
+    """
+
+    @staticmethod
+    def _compute():
+        conn = get_db_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(Stats.SNAPSHOT_SQL)
+            row = cursor.fetchone() or {}
+        finally:
+            conn.close()
+        return {
+            'total_users': row.get('total_users') or 0,
+            'active_users': row.get('active_users') or 0,
+            'active_sessions': row.get('active_sessions') or 0,
+            'total_revenue': float(row.get('total_revenue') or 0),
+            'total_transactions': row.get('total_transactions') or 0,
+            'total_vouchers': row.get('total_vouchers') or 0,
+            'unused_vouchers': row.get('unused_vouchers') or 0,
+        }
+
+    @staticmethod
+    def get_dashboard():
+        now = time.monotonic()
+        age = now - Stats._computed_at
+        snapshot = Stats._snapshot
+        if snapshot is not None and age < Config.STATS_TTL and not (
+                Stats._dirty and age >= Config.STATS_MIN_REFRESH):
+            return snapshot
+
+        # One thread refreshes; the rest keep serving the previous snapshot.
+        if not Stats._lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if Stats._snapshot is not snapshot:
+                return Stats._snapshot
+            Stats._dirty = False
+            fresh = Stats._compute()
+            if fresh is not None:
+                Stats._snapshot = fresh
+                Stats._computed_at = time.monotonic()
+            return Stats._snapshot
+        finally:
+            Stats._lock.release()
+
+    @staticmethod
+    def invalidate():
+        Stats._dirty = True
+
+
+# ----------------------------------------------------------
+# REPORT ROLLUPS (DAILY AGGREGATES)
+# ----------------------------------------------------------
+class Rollups:
+    """Daily revenue and usage aggregates behind the reports page.
+
+    Write paths add to today's row inside their own transaction, so a
+    report over any date range reads one row per day (or per day, plan and
+    method) instead of scanning payment and session history. ``rebuild``
+    recomputes a range from the source tables, for backfills and repairs.
+    """
+
+    REVENUE_UPSERT_SQL = """
+        INSERT INTO revenue_daily (day, plan_id, payment_method, payments, revenue)
+        VALUES (CURDATE(), %s, %s, 1, %s)
+        ON DUPLICATE KEY UPDATE payments = payments + VALUES(payments), revenue = revenue + VALUES(revenue)
+    """
+
+    USAGE_UPSERT_SQL = """
+        INSERT INTO usage_daily (day, sessions_started, sessions_ended, data_used, time_used)
+        VALUES (CURDATE(), %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            sessions_started = sessions_started + VALUES(sessions_started),
+            sessions_ended = sessions_ended + VALUES(sessions_ended),
+            data_used = data_used + VALUES(data_used),
+            time_used = time_used + VALUES(time_used)
+    """
+
+    @staticmethod
+    def _day(value):
+        # Rollup keys are DATE columns; compare them with dates, not datetimes.
+        return value.date() if isinstance(value, datetime.datetime) else value
+
+    @staticmethod
+    def record_payment(cursor, plan_id, method, amount):
+        cursor.execute(Rollups.REVENUE_UPSERT_SQL, (plan_id or 0, method, amount))
+
+    @staticmethod
+    def record_sessions(cursor, started=0, ended=0, data_used=0, time_used=0):
+        cursor.execute(Rollups.USAGE_UPSERT_SQL, (started, ended, data_used or 0, time_used or 0))
+
+    # ------------------------------------------------------
+    @staticmethod
+    def rebuild(start_date=None, end_date=None):
+        """Recompute the rollups for an inclusive day range (default: all history).
+
+        Run it when payments and sessions are quiet (e.g. at deploy time):
+        rows written while it runs may be counted twice or not at all.
+        """
+        day_conditions, day_params = [], []
+        _date_range('day', Rollups._day(start_date), Rollups._day(end_date), day_conditions, day_params)
+        day_where = f"WHERE {' AND '.join(day_conditions)}" if day_conditions else ""
+
+        def source_range(column):
+            conditions, params = [], []
+            _date_range(column, start_date, end_date, conditions, params)
+            return (" AND " + " AND ".join(conditions)) if conditions else "", params
+
+        payments_where, payments_params = source_range('created_at')
+        started_where, started_params = source_range('start_time')
+        ended_where, ended_params = source_range('end_time')
+
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DELETE FROM revenue_daily {day_where}", day_params)
+            cursor.execute(f"DELETE FROM usage_daily {day_where}", day_params)
+            cursor.execute(
+                f"""
+                INSERT INTO revenue_daily (day, plan_id, payment_method, payments, revenue)
+                SELECT DATE(created_at), COALESCE(plan_id, 0), payment_method, COUNT(*), SUM(amount)
+                FROM payments
+                WHERE status = 'completed'{payments_where}
+                GROUP BY DATE(created_at), COALESCE(plan_id, 0), payment_method
+                """,
+                payments_params,
+            )
+            revenue_days = cursor.rowcount
+            cursor.execute(
+                f"""
+                INSERT INTO usage_daily (day, sessions_started, sessions_ended, data_used, time_used)
+                SELECT day, SUM(started), SUM(ended), SUM(data_used), SUM(time_used)
+                FROM (
+                    SELECT DATE(start_time) AS day, 1 AS started, 0 AS ended, 0 AS data_used, 0 AS time_used
+                    FROM sessions WHERE start_time IS NOT NULL{started_where}
+                    UNION ALL
+                    SELECT DATE(end_time), 0, 1, data_used, time_used
+                    FROM sessions WHERE status <> 'active' AND end_time IS NOT NULL{ended_where}
+                ) AS daily
+                GROUP BY day
+                """,
+                started_params + ended_params,
+            )
+            usage_days = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        Stats.invalidate()
+        return {'revenue_rows': revenue_days, 'usage_rows': usage_days}
+
+    # ------------------------------------------------------
+    @staticmethod
+    def summary(start_date, end_date):
+        """Totals for an inclusive day range, with revenue split by plan and method."""
+        conditions, params = [], []
+        _date_range('r.day', Rollups._day(start_date), Rollups._day(end_date), conditions, params)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = get_db_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT r.plan_id, COALESCE(p.name, 'No plan') AS plan_name,
+                       SUM(r.payments) AS payments, SUM(r.revenue) AS revenue
+                FROM revenue_daily r LEFT JOIN plans p ON p.id = r.plan_id
+                {where}
+                GROUP BY r.plan_id, p.name ORDER BY revenue DESC
+                """,
+                params,
+            )
+            by_plan = cursor.fetchall()
+            cursor.execute(
+                f"""
+                SELECT r.payment_method, SUM(r.payments) AS payments, SUM(r.revenue) AS revenue
+                FROM revenue_daily r {where}
+                GROUP BY r.payment_method ORDER BY revenue DESC
+                """,
+                params,
+            )
+            by_method = cursor.fetchall()
+            cursor.execute(
+                f"""
+                SELECT SUM(sessions_started) AS sessions_started, SUM(sessions_ended) AS sessions_ended,
+                       SUM(data_used) AS data_used, SUM(time_used) AS time_used
+                FROM usage_daily r {where}
+                """,
+                params,
+            )
+            usage = cursor.fetchone() or {}
+        finally:
+            conn.close()
+
+        for row in by_plan + by_method:
+            row['revenue'] = float(row['revenue'] or 0)
+            row['payments'] = int(row['payments'] or 0)
+        return {
+            'revenue': sum(row['revenue'] for row in by_method),
+            'payments': sum(row['payments'] for row in by_method),
+            'by_plan': by_plan,
+            'by_method': by_method,
+            'sessions_started': int(usage.get('sessions_started') or 0),
+            'sessions_ended': int(usage.get('sessions_ended') or 0),
+            'data_used': float(usage.get('data_used') or 0),
+            'time_used': int(usage.get('time_used') or 0),
+        }
+
+    @staticmethod
+    def trend(start_date, end_date):
+        """One entry per day in the inclusive range: revenue, payments, sessions and usage."""
+        start_date, end_date = Rollups._day(start_date), Rollups._day(end_date)
+        conditions, params = [], []
+        _date_range('day', start_date, end_date, conditions, params)
+        where = f"WHERE {' AND '.join(conditions)}"
+
+        conn = get_db_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT day, SUM(payments) AS payments, SUM(revenue) AS revenue FROM revenue_daily {where} GROUP BY day",
+                params,
+            )
+            revenue = {str(row['day']): row for row in cursor.fetchall()}
+            cursor.execute(
+                f"SELECT day, sessions_started, sessions_ended, data_used, time_used FROM usage_daily {where}",
+                params,
+            )
+            usage = {str(row['day']): row for row in cursor.fetchall()}
+        finally:
+            conn.close()
+
+        days = []
+        day = start_date
+        while day <= end_date:
+            key = day.isoformat()
+            r, u = revenue.get(key, {}), usage.get(key, {})
+            days.append({
+                'day': key,
+                'payments': int(r.get('payments') or 0),
+                'revenue': float(r.get('revenue') or 0),
+                'sessions_started': int(u.get('sessions_started') or 0),
+                'sessions_ended': int(u.get('sessions_ended') or 0),
+                'data_used': float(u.get('data_used') or 0),
+                'time_used': int(u.get('time_used') or 0),
+            })
+            day += datetime.timedelta(days=1)
+        return days
@@ -0,0 +1,155 @@
+import os
+import threading
+from models import get_db_connection
+from utils import format_data_size, format_time_duration
+from config import Config
+from accounting import usage_accumulator
+
+
+def balance_payload(row):
+    """JSON-ready balance fields, as returned by /user/check_balance."""
+    data_balance = row.get('data_balance') or 0
+    time_balance = row.get('time_balance') or 0
+    return {
+        'success': True,
+        'data_balance': float(data_balance),
+        'time_balance': int(time_balance),
+        'data_balance_formatted': format_data_size(data_balance * 1024 * 1024),
+        'time_balance_formatted': format_time_duration(time_balance),
+    }
+
+
+# ----------------------------------------------------------
+# BALANCE CHANGE NOTIFIER
+# ----------------------------------------------------------
+class Subscription:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.payload = None
+        self.event = threading.Event()
+
+    def wait(self, timeout):
+        """Return the latest payload if it changed within ``timeout``, else None."""
+        if not self.event.wait(timeout):
+            return None
+        self.event.clear()
+        return self.payload
+
+
+class BalanceNotifier:
+    """Fans out balance changes to subscribed clients of this worker.
+
+    The shared source of truth is ``users.updated_at``: one watcher thread
+    per worker reads rows changed since its last watermark (an index range
+    scan) every ``poll_interval`` seconds while anyone is subscribed, so
+    changes made by any worker or node reach every stream. ``notify()``
+    wakes the watcher early for changes made locally.
+    """
+
+    def __init__(self, poll_interval=2.0):
+        self.poll_interval = poll_interval
+
+        self._subscribers = {}
+        self._last_sent = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._watermark = None
+        self._stats = {'polls': 0, 'pushes': 0, 'failures': 0}
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._watermark = None
+            self._thread = threading.Thread(target=self._run, name='balance-notifier', daemon=True)
+            self._thread.start()
+
+    # ------------------------------------------------------
+    def subscribe(self, user_id, initial=None):
+        self._ensure_started()
+        sub = Subscription(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(sub)
+            if initial is not None:
+                self._last_sent[user_id] = initial
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.user_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.user_id]
+                    self._last_sent.pop(sub.user_id, None)
+
+    def notify(self, user_ids=None):
+        """Hint that balances changed; the watcher polls immediately."""
+        self._wakeup.set()
+
+    # ------------------------------------------------------
+    def _publish(self, user_id, payload):
+        with self._lock:
+            if self._last_sent.get(user_id) == payload:
+                return
+            self._last_sent[user_id] = payload
+            subs = list(self._subscribers.get(user_id, ()))
+        for sub in subs:
+            sub.payload = payload
+            sub.event.set()
+        self._stats['pushes'] += len(subs)
+
+    def _poll(self):
+        conn = get_db_connection()
+        if not conn:
+            self._stats['failures'] += 1
+            return
+        try:
+            cursor = conn.cursor()
+            if self._watermark is None:
+                cursor.execute("SELECT NOW() AS now")
+                self._watermark = cursor.fetchone()['now']
+                return
+            cursor.execute(
+                "SELECT id, data_balance, time_balance, updated_at FROM users WHERE updated_at >= %s",
+                (self._watermark,),
+            )
+            rows = cursor.fetchall()
+        except Exception as e:
+            self._stats['failures'] += 1
+            print(f"[NOTIFY ERROR] Balance poll failed: {e}")
+            return
+        finally:
+            conn.close()
+
+        self._stats['polls'] += 1
+        for row in rows:
+            # updated_at has one-second resolution, so the watermark is
+            # inclusive and re-read rows are filtered by value in _publish.
+            if row['updated_at'] and row['updated_at'] > self._watermark:
+                self._watermark = row['updated_at']
+            if row['id'] in self._subscribers:
+                self._publish(row['id'], balance_payload(row))
+
+    def _run(self):
+        while True:
+            if self._subscribers or self._watermark is None:
+                self._poll()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribed_users'] = len(self._subscribers)
+            stats['streams'] = sum(len(subs) for subs in self._subscribers.values())
+        return stats
+
+
+balance_notifier = BalanceNotifier(poll_interval=Config.BALANCE_POLL_INTERVAL)
+usage_accumulator.add_listener(balance_notifier.notify)
@@ -0,0 +1,287 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from reports import REPORT_QUERIES, iter_report_csv, report_version
+from config import Config
+
+
+_ARTIFACT_NAME = re.compile(
+    r'^(?P<type>[a-z]+)_(?P<start>\d{8}|all)_(?P<end>\d{8}|all)_(?P<id>[0-9a-f]{16})'
+    r'\.csv(?P<gzip>\.gz)?(?P<part>\.part)?$'
+)
+
+
+def _day(value):
+    return value.strftime('%Y%m%d') if value else 'all'
+
+
+# ----------------------------------------------------------
+# REPORT EXPORT JOBS
+# ----------------------------------------------------------
+class ReportJobs:
+    """Report exports run on a background pool and are kept as files for reuse.
+
+    A job is identified by report type, date range, compression and a
+    fingerprint of the rows it covers (``reports.report_version``). Asking
+    again while nothing has changed returns the finished file, or joins the
+    export already running, instead of querying again; once the data
+    changes the fingerprint does too and a fresh export is made.
+
+    Artifacts live in ``folder`` under names that encode all of the above,
+    so every worker shares the same cache. A file being written has a
+    ``.part`` suffix and is claimed with an exclusive create, so two
+    workers never build the same report. A newer artifact replaces older
+    ones for the same parameters; anything older than ``max_age`` seconds
+    is removed.
+    """
+
+    def __init__(self, folder='reports', workers=2, max_age=86400, job_timeout=3600):
+        self.folder = folder
+        self.workers = workers
+        self.max_age = max_age
+        self.job_timeout = job_timeout
+
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._stats = {
+            'submitted': 0,
+            'cache_hits': 0,
+            'joined': 0,
+            'completed': 0,
+            'failed': 0,
+            'build_ms': 0.0,
+        }
+
+    def _get_executor(self):
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report-job')
+        return self._executor
+
+    # ------------------------------------------------------
+    def submit(self, report_type, start_date=None, end_date=None, compress=False):
+        """Queue an export (or reuse one); returns the job's status dict."""
+        if report_type not in REPORT_QUERIES:
+            raise ValueError(f"Invalid report type: {report_type}")
+        version = report_version(report_type, start_date, end_date)
+        key = f"{report_type}|{_day(start_date)}|{_day(end_date)}|{int(compress)}|{version}"
+        job_id = hashlib.sha256(key.encode()).hexdigest()[:16]
+        name = f"{report_type}_{_day(start_date)}_{_day(end_date)}_{job_id}.csv{'.gz' if compress else ''}"
+        path = os.path.join(self.folder, name)
+
+        # Files can appear and disappear between any two of these checks (another
+        # worker finishing, failing or cleaning up), so look again until one holds.
+        while True:
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None and job['status'] in ('queued', 'running'):
+                    self._stats['joined'] += 1
+                    return self._public(job)
+            described = self._describe(name)
+            if described is not None:
+                with self._lock:
+                    self._stats['cache_hits'] += 1
+                return described
+
+            os.makedirs(self.folder, exist_ok=True)
+            try:
+                fd = self._claim(path + '.part')
+            except FileExistsError:
+                # Another worker is building this exact report.
+                described = self._describe(name + '.part') or self._describe(name)
+                if described is not None:
+                    with self._lock:
+                        self._stats['joined'] += 1
+                    return described
+                continue
+            if os.path.exists(path):
+                # Finished by another worker while we were claiming.
+                os.close(fd)
+                _remove(path + '.part')
+                continue
+            break
+
+        job = {
+            'id': job_id,
+            'type': report_type,
+            'start': start_date.date().isoformat() if start_date else None,
+            'end': end_date.date().isoformat() if end_date else None,
+            'gzip': compress,
+            'status': 'queued',
+            'size': 0,
+            'error': None,
+            'created_at': datetime.now().isoformat(' ', 'seconds'),
+            '_done': threading.Event(),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._stats['submitted'] += 1
+        self._get_executor().submit(self._run, job, fd, path)
+        self.cleanup()
+        return self._public(job)
+
+    def _claim(self, part):
+        try:
+            return os.open(part, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            try:
+                age = time.time() - os.path.getmtime(part)
+            except FileNotFoundError:
+                age = None
+            if age is not None and age < self.job_timeout:
+                raise
+            if age is not None:
+                # Left behind by a worker that died mid-export.
+                _remove(part)
+            return os.open(part, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+
+    def _run(self, job, fd, path):
+        started = time.perf_counter()
+        job['status'] = 'running'
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter_report_csv(job['type'], _parse_day(job['start']), _parse_day(job['end']),
+                                             compress=job['gzip']):
+                    f.write(chunk)
+                    job['size'] += len(chunk)
+            os.replace(path + '.part', path)
+            job['status'] = 'done'
+            self._remove_superseded(os.path.basename(path))
+            with self._lock:
+                self._stats['completed'] += 1
+                self._stats['build_ms'] += (time.perf_counter() - started) * 1000
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            with self._lock:
+                self._stats['failed'] += 1
+            print(f"[REPORT ERROR] Export {job['type']} ({job['id']}) failed: {e}")
+            _remove(path + '.part')
+        finally:
+            job['_done'].set()
+
+    def wait(self, job_id, timeout):
+        """Block up to ``timeout`` seconds for a job queued by this worker; returns its status."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job['_done'].wait(timeout)
+        return self.status(job_id)
+
+    # ------------------------------------------------------
+    def _artifacts(self):
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            return []
+        return [entry for entry in entries if _ARTIFACT_NAME.match(entry.name)]
+
+    def _describe(self, name):
+        match = _ARTIFACT_NAME.match(name)
+        path = os.path.join(self.folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        start, end = match['start'], match['end']
+        return {
+            'id': match['id'],
+            'type': match['type'],
+            'start': None if start == 'all' else f"{start[:4]}-{start[4:6]}-{start[6:]}",
+            'end': None if end == 'all' else f"{end[:4]}-{end[4:6]}-{end[6:]}",
+            'gzip': bool(match['gzip']),
+            'status': 'running' if match['part'] else 'done',
+            'size': stat.st_size,
+            'error': None,
+            'created_at': datetime.fromtimestamp(stat.st_mtime).isoformat(' ', 'seconds'),
+        }
+
+    @staticmethod
+    def _public(job):
+        return {key: value for key, value in job.items() if not key.startswith('_')}
+
+    def status(self, job_id):
+        """Status of a job queued by any worker, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and job['status'] != 'done':
+            return self._public(job)
+        for entry in self._artifacts():
+            if _ARTIFACT_NAME.match(entry.name)['id'] == job_id:
+                return self._describe(entry.name)
+        return None
+
+    def path(self, job_id):
+        """Finished artifact for ``job_id``, or None."""
+        for entry in self._artifacts():
+            match = _ARTIFACT_NAME.match(entry.name)
+            if match['id'] == job_id and not match['part']:
+                return entry.path
+        return None
+
+    def recent(self, limit=20):
+        """Finished and running exports, newest first, plus this worker's failures."""
+        jobs = [self._describe(entry.name) for entry in self._artifacts()]
+        jobs = [job for job in jobs if job]
+        with self._lock:
+            jobs += [self._public(job) for job in self._jobs.values() if job['status'] == 'failed']
+        jobs.sort(key=lambda job: job['created_at'], reverse=True)
+        return jobs[:limit]
+
+    # ------------------------------------------------------
+    def _remove_superseded(self, name):
+        prefix = name.rsplit('_', 1)[0] + '_'
+        suffix = '.csv.gz' if name.endswith('.gz') else '.csv'
+        for entry in self._artifacts():
+            if entry.name != name and entry.name.startswith(prefix) and entry.name.endswith(suffix):
+                _remove(entry.path)
+
+    def cleanup(self):
+        """Drop artifacts older than ``max_age`` and forget old jobs."""
+        cutoff = time.time() - self.max_age
+        for entry in self._artifacts():
+            try:
+                if not entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+        with self._lock:
+            if len(self._jobs) > 100:
+                finished = [job_id for job_id, job in self._jobs.items() if job['status'] in ('done', 'failed')]
+                for job_id in finished[:len(self._jobs) - 100]:
+                    del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['active'] = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+        stats['cached'] = sum(1 for entry in self._artifacts() if not entry.name.endswith('.part'))
+        return stats
+
+
+def _parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+report_jobs = ReportJobs(
+    folder=Config.UPLOAD_FOLDER,
+    workers=Config.REPORT_JOB_WORKERS,
+    max_age=Config.REPORT_CACHE_MAX_AGE,
+    job_timeout=Config.REPORT_JOB_TIMEOUT,
+)
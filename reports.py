@@ -0,0 +1,188 @@
+import os
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta
+import pymysql
+from models import get_db_connection
+
+
+# ----------------------------------------------------------
+# REPORT QUERIES
+# ----------------------------------------------------------
+# report type -> (base query, date column, ORDER BY clause)
+REPORT_QUERIES = {
+    'users': (
+        """
+        SELECT id, username, email, phone, status, data_balance, time_balance, created_at
+        FROM users WHERE role = 'user'
+        """,
+        'created_at',
+        '',
+    ),
+    'payments': (
+        """
+        SELECT p.id, u.username, pl.name as plan_name, p.amount, p.payment_method, p.status, p.created_at
+        FROM payments p
+        JOIN users u ON p.user_id = u.id
+        LEFT JOIN plans pl ON p.plan_id = pl.id
+        """,
+        'p.created_at',
+        'ORDER BY p.created_at DESC',
+    ),
+    'sessions': (
+        """
+        SELECT s.id, u.username, s.device_mac, s.ip_address, s.start_time, s.end_time,
+               s.data_used, s.time_used, s.status
+        FROM sessions s
+        JOIN users u ON s.user_id = u.id
+        """,
+        's.start_time',
+        'ORDER BY s.start_time DESC',
+    ),
+}
+
+# report type -> (query, timestamp columns). Each value is one index lookup
+# and moves with any insert or update the app makes to the exported columns:
+# new rows raise MAX(id); balance and status changes touch users.updated_at;
+# usage reports set last_activity on active sessions and ending a session
+# sets end_time. Payments are never updated. Rows are never deleted.
+REPORT_VERSIONS = {
+    'users': ("SELECT MAX(id) AS last_id, MAX(updated_at) AS changed, NOW() AS now FROM users",
+              ('changed',)),
+    'payments': ("SELECT MAX(id) AS last_id, NOW() AS now FROM payments", ()),
+    'sessions': (
+        "SELECT (SELECT MAX(id) FROM sessions) AS last_id, "
+        "(SELECT MAX(end_time) FROM sessions) AS ended, "
+        "(SELECT MAX(last_activity) FROM sessions WHERE status = 'active') AS changed, "
+        "NOW() AS now",
+        ('ended', 'changed'),
+    ),
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_report_date(value):
+    """Parse a YYYY-MM-DD query parameter; empty means no bound."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def _with_date_range(sql, date_column, start_date=None, end_date=None):
+    conditions, params = [], []
+    if start_date:
+        conditions.append(f"{date_column} >= %s")
+        params.append(start_date)
+    if end_date:
+        conditions.append(f"{date_column} < %s")
+        params.append(end_date + timedelta(days=1))
+
+    if conditions:
+        joiner = ' AND ' if 'WHERE' in sql else ' WHERE '
+        sql = sql.rstrip() + joiner + ' AND '.join(conditions)
+    return sql, params
+
+
+def build_report_query(report_type, start_date=None, end_date=None):
+    """Return (sql, params) for a report, optionally limited to a date range.
+
+    ``end_date`` is inclusive.
+    """
+    if report_type not in REPORT_QUERIES:
+        raise ValueError(f"Invalid report type: {report_type}")
+
+    sql, date_column, order_by = REPORT_QUERIES[report_type]
+    sql, params = _with_date_range(sql, date_column, start_date, end_date)
+    return f"{sql} {order_by}", params
+
+
+def _as_datetime(value):
+    # SQLite returns MAX() over a timestamp column as text.
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def report_version(report_type, start_date=None, end_date=None):
+    """Fingerprint that changes whenever the report's rows may have.
+
+    Built from a few indexed MAX() lookups over the whole table, not the
+    date range: a change outside the range only costs one extra export,
+    while aggregating the range would scan it on every request. The date
+    range is part of the cache key separately.
+
+    Timestamps have one-second resolution, so a change in the current
+    second could be followed by another the fingerprint cannot see; while
+    that is possible the fingerprint is made unique, and nothing is reused.
+    """
+    if report_type not in REPORT_VERSIONS:
+        raise ValueError(f"Invalid report type: {report_type}")
+
+    sql, timestamps = REPORT_VERSIONS[report_type]
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        row = dict(cursor.fetchone() or {})
+    finally:
+        conn.close()
+
+    now = _as_datetime(row.pop('now', None))
+    version = '|'.join(str(row[key]) for key in sorted(row))
+    changed = [_as_datetime(row[key]) for key in timestamps if row.get(key)]
+    if now is None or any(value >= now - timedelta(seconds=1) for value in changed):
+        version += '|' + os.urandom(8).hex()
+    return version
+
+
+# ----------------------------------------------------------
+# STREAMING CSV
+# ----------------------------------------------------------
+def iter_report_csv(report_type, start_date=None, end_date=None, compress=False):
+    """Yield a report as CSV chunks straight from an unbuffered cursor.
+
+    Rows are fetched one at a time from the server, so memory stays flat
+    regardless of table size. With ``compress`` the chunks form a gzip stream.
+    """
+    sql, params = build_report_query(report_type, start_date, end_date)
+
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+
+    gzipper = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    finished = False
+    try:
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        cursor.execute(sql, params)
+        fieldnames = [col[0] for col in cursor.description]
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for row in cursor:
+            writer.writerow(row)
+            if buffer.tell() >= CHUNK_SIZE:
+                data = buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+                chunk = gzipper.compress(data) if gzipper else data
+                if chunk:
+                    yield chunk
+
+        data = buffer.getvalue().encode('utf-8')
+        if gzipper:
+            data = gzipper.compress(data) + gzipper.flush()
+        if data:
+            yield data
+        cursor.close()
+        finished = True
+    finally:
+        if finished or not hasattr(conn, 'discard'):
+            conn.close()
+        else:
+            # Abandoned mid-stream: an unread result set can't be handed back
+            # to the pool without draining it, so drop the connection instead.
+            conn.discard()
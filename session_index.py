@@ -0,0 +1,238 @@
+import re
+import time
+import datetime
+import threading
+from models import Session as UserSession, get_db_connection
+from config import Config
+
+
+ACTIVE_SESSIONS_SQL = """
+    SELECT id, user_id, device_mac, ip_address FROM sessions WHERE status = 'active'
+"""
+
+CHANGED_SESSIONS_SQL = """
+    SELECT id, user_id, device_mac, ip_address, status FROM sessions
+    WHERE start_time >= %s OR end_time >= %s
+"""
+
+_MAC_SEPARATORS = re.compile(r'[^0-9a-f]')
+
+
+def normalize_mac(mac):
+    """'AA-BB-CC-DD-EE-FF', 'aabb.ccdd.eeff' -> 'aa:bb:cc:dd:ee:ff'; other values unchanged."""
+    if not mac:
+        return None
+    mac = str(mac).strip().lower()
+    digits = _MAC_SEPARATORS.sub('', mac)
+    if len(digits) != 12:
+        return mac
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+# ----------------------------------------------------------
+# ACTIVE SESSION INDEX
+# ----------------------------------------------------------
+class ActiveSessionIndex:
+    """In-memory index of active sessions by device MAC and client IP.
+
+    Loaded from the sessions table on first use, then kept current by the
+    Session start/end hooks in this worker. Sessions started or ended by
+    other workers are picked up by an incremental sync at most every
+    ``sync_interval`` seconds, and the whole index is reloaded every
+    ``rebuild_interval`` seconds to heal anything missed.
+
+    The maps hold tuples of session ids that are replaced, never mutated,
+    so lookups read them without taking the lock.
+    """
+
+    # Re-read changes this far behind the last sync, so rows whose
+    # transaction committed late are not skipped.
+    SYNC_OVERLAP = 10
+
+    def __init__(self, sync_interval=2, rebuild_interval=300):
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+
+        self._sessions = {}
+        self._by_mac = {}
+        self._by_ip = {}
+        self._loaded = False
+        self._synced_at = 0.0
+        self._rebuilt_at = 0.0
+        self._sync_since = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stats = {
+            'lookups': 0,
+            'hits': 0,
+            'syncs': 0,
+            'rebuilds': 0,
+            'failures': 0,
+        }
+
+    # ------------------------------------------------------
+    def _add(self, session_id, user_id, mac, ip):
+        mac = normalize_mac(mac)
+        self._discard(session_id)
+        self._sessions[session_id] = (user_id, mac, ip)
+        if mac:
+            self._by_mac[mac] = self._by_mac.get(mac, ()) + (session_id,)
+        if ip:
+            self._by_ip[ip] = self._by_ip.get(ip, ()) + (session_id,)
+
+    def _discard(self, session_id):
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return
+        _, mac, ip = entry
+        for index, key in ((self._by_mac, mac), (self._by_ip, ip)):
+            if key is None:
+                continue
+            remaining = tuple(sid for sid in index.get(key, ()) if sid != session_id)
+            if remaining:
+                index[key] = remaining
+            else:
+                index.pop(key, None)
+
+    def on_session_change(self, event, sessions):
+        """Session.add_listener hook."""
+        if not self._loaded:
+            return
+        with self._lock:
+            if event == 'started':
+                for row in sessions:
+                    self._add(row['id'], row['user_id'], row['device_mac'], row['ip_address'])
+            elif event == 'ended':
+                for session_id in sessions:
+                    self._discard(session_id)
+
+    # ------------------------------------------------------
+    def _refresh(self):
+        now = time.monotonic()
+        if self._loaded and now - self._synced_at < self.sync_interval:
+            return
+        # One thread refreshes; the others answer from the current index.
+        blocking = not self._loaded
+        if not self._refresh_lock.acquire(blocking=blocking):
+            return
+        try:
+            if not self._loaded or now - self._rebuilt_at >= self.rebuild_interval:
+                self.rebuild()
+            elif now - self._synced_at >= self.sync_interval:
+                self.sync()
+        finally:
+            self._refresh_lock.release()
+
+    def _query(self, sql, params=()):
+        """Returns the DB's NOW() (read first) and the rows.
+
+        The sync watermark comes from the database clock, which also writes
+        start_time and end_time, so app-host clock skew cannot skip rows.
+        """
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT NOW() AS now")
+            now = cursor.fetchone()['now']
+            cursor.execute(sql, params)
+            return now, cursor.fetchall()
+        finally:
+            conn.close()
+
+    def rebuild(self):
+        """Reload every active session from the database."""
+        try:
+            started_at, rows = self._query(ACTIVE_SESSIONS_SQL)
+        except Exception as e:
+            self._stats['failures'] += 1
+            self._synced_at = self._rebuilt_at = time.monotonic()
+            print(f"[GATEWAY ERROR] Session index rebuild failed: {e}")
+            return
+        with self._lock:
+            self._sessions, self._by_mac, self._by_ip = {}, {}, {}
+            for row in rows:
+                self._add(row['id'], row['user_id'], row['device_mac'], row['ip_address'])
+            self._loaded = True
+            self._sync_since = started_at
+            self._stats['rebuilds'] += 1
+        self._synced_at = self._rebuilt_at = time.monotonic()
+
+    def sync(self):
+        """Apply sessions started or ended (by any worker) since the last sync."""
+        since = self._sync_since - datetime.timedelta(seconds=self.SYNC_OVERLAP)
+        try:
+            started_at, rows = self._query(CHANGED_SESSIONS_SQL, (since, since))
+        except Exception as e:
+            self._stats['failures'] += 1
+            self._synced_at = time.monotonic()
+            print(f"[GATEWAY ERROR] Session index sync failed: {e}")
+            return
+        with self._lock:
+            for row in rows:
+                if row['status'] == 'active':
+                    self._add(row['id'], row['user_id'], row['device_mac'], row['ip_address'])
+                else:
+                    self._discard(row['id'])
+            self._sync_since = started_at
+            self._stats['syncs'] += 1
+        self._synced_at = time.monotonic()
+
+    # ------------------------------------------------------
+    def _match(self, mac, ip):
+        mac = normalize_mac(mac)
+        ip = str(ip) if ip else None
+        if mac and ip:
+            by_ip = self._by_ip.get(ip, ())
+            ids = tuple(sid for sid in self._by_mac.get(mac, ()) if sid in by_ip)
+        elif mac:
+            ids = self._by_mac.get(mac, ())
+        elif ip:
+            ids = self._by_ip.get(ip, ())
+        else:
+            ids = ()
+        for session_id in ids:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                return {'allowed': True, 'session_id': session_id, 'user_id': entry[0]}
+        return {'allowed': False}
+
+    def lookup(self, mac=None, ip=None):
+        """Is a device with this MAC and/or IP in an active session?
+
+        With both given, one session must match both.
+        """
+        self._refresh()
+        result = self._match(mac, ip)
+        self._count(1, int(result['allowed']))
+        return result
+
+    def lookup_many(self, queries):
+        """``lookup`` for an iterable of (mac, ip) pairs."""
+        self._refresh()
+        results = [self._match(mac, ip) for mac, ip in queries]
+        self._count(len(results), sum(1 for result in results if result['allowed']))
+        return results
+
+    def _count(self, lookups, hits):
+        with self._lock:
+            self._stats['lookups'] += lookups
+            self._stats['hits'] += hits
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'active_sessions': len(self._sessions),
+                'macs': len(self._by_mac),
+                'ips': len(self._by_ip),
+            })
+        return stats
+
+
+session_index = ActiveSessionIndex(
+    sync_interval=Config.SESSION_INDEX_SYNC_INTERVAL,
+    rebuild_interval=Config.SESSION_INDEX_REBUILD_INTERVAL,
+)
+UserSession.add_listener(session_index.on_session_change)
@@ -159,17 +159,27 @@ function startSessionTimer() {
 }
 
 // Update balance display
+function renderBalance(data) {
+    document.getElementById('dataBalance').textContent = data.data_balance_formatted;
+    document.getElementById('timeBalance').textContent = data.time_balance_formatted;
+}
+
 function updateBalanceDisplay() {
     fetch('/user/check_balance')
         .then(response => response.json())
-        .then(data => {
-            document.getElementById('dataBalance').textContent = data.data_balance_formatted;
-            document.getElementById('timeBalance').textContent = data.time_balance_formatted;
-        })
+        .then(renderBalance)
         .catch(error => {
             console.error('Error updating balance:', error);
         });
 }
 
-// Auto-refresh balance every 30 seconds
-setInterval(updateBalanceDisplay, 30000);
\ No newline at end of file
+// Receive balance changes as they happen; fall back to polling every
+// 30 seconds where Server-Sent Events are unavailable.
+if (window.EventSource) {
+    const balanceStream = new EventSource('/user/balance/stream');
+    balanceStream.addEventListener('balance', event => {
+        renderBalance(JSON.parse(event.data));
+    });
+} else {
+    setInterval(updateBalanceDisplay, 30000);
+}
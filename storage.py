@@ -0,0 +1,235 @@
+import os
+import re
+import sqlite3
+import datetime
+import functools
+from decimal import Decimal
+import pymysql
+from pymysql.constants import SERVER_STATUS
+from config import Config
+
+
+# Duplicate-key errors from either engine.
+IntegrityError = (pymysql.err.IntegrityError, sqlite3.IntegrityError)
+
+# Values a column rejects (out of range, too long under strict mode).
+DataError = (pymysql.err.DataError, sqlite3.DataError)
+
+
+# ----------------------------------------------------------
+# MYSQL BACKEND
+# ----------------------------------------------------------
+class MySQLBackend:
+    name = 'mysql'
+
+    def connect(self):
+        return pymysql.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DATABASE,
+            cursorclass=pymysql.cursors.DictCursor
+        )
+
+    def reset(self, conn):
+        # Drop any open transaction so the next borrower gets a fresh snapshot.
+        if conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            conn.rollback()
+
+
+# ----------------------------------------------------------
+# SQLITE BACKEND
+# ----------------------------------------------------------
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+)
+
+_LOCAL_NOW = "datetime('now', 'localtime')"
+
+
+@functools.lru_cache(maxsize=1024)
+def translate_sql(sql):
+    """Rewrite the MySQL dialect used by the models into SQLite.
+
+    Returns (sql, needs_write_lock). Results are cached, so a given model
+    statement always maps to the same string and hits sqlite3's per-
+    connection prepared statement cache.
+    """
+    needs_write_lock = bool(re.search(r'\bFOR\s+UPDATE\b', sql, re.I))
+    sql = re.sub(r'\s*\bFOR\s+UPDATE\b', '', sql, flags=re.I)
+    sql = re.sub(r'\bNOW\(\)\s+AS\s+(\w+)', lambda m: f'{_LOCAL_NOW} AS "{m.group(1)} [TIMESTAMP]"', sql)
+    sql = sql.replace('NOW()', _LOCAL_NOW)
+    sql = re.sub(r'\bGREATEST\(', 'MAX(', sql)
+    sql = sql.replace('CURDATE()', "date('now', 'localtime')")
+    upsert = re.search(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', sql, re.I)
+    if upsert:
+        # VALUES(col) in the update list is SQLite's excluded.col.
+        update = re.sub(r'\bVALUES\((\w+)\)', r'excluded.\1', sql[upsert.end():])
+        sql = sql[:upsert.start()] + 'ON CONFLICT DO UPDATE SET' + update
+    sql = sql.replace('%s', '?')
+    return sql, needs_write_lock
+
+
+def _convert_timestamp(value):
+    text = value.decode()
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+
+
+class SQLiteCursor:
+    """DB-API cursor with the PyMySQL DictCursor behaviour the models rely on."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn.raw.cursor()
+
+    def _begin_for_write(self, needs_write_lock):
+        # SELECT ... FOR UPDATE: take the write lock up front so a later
+        # UPDATE in the same transaction can't hit a lock-upgrade deadlock.
+        if needs_write_lock and not self._conn.raw.in_transaction:
+            self._cursor.execute("BEGIN IMMEDIATE")
+
+    def execute(self, sql, params=None):
+        sql, needs_write_lock = translate_sql(sql)
+        self._begin_for_write(needs_write_lock)
+        self._cursor.execute(sql, tuple(params or ()))
+        return self._cursor.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        sql, needs_write_lock = translate_sql(sql)
+        self._begin_for_write(needs_write_lock)
+        self._cursor.executemany(sql, seq_of_params)
+        return self._cursor.rowcount
+
+    def _as_dict(self, row):
+        if row is None:
+            return None
+        return dict(zip([col[0] for col in self._cursor.description], row))
+
+    def fetchone(self):
+        return self._as_dict(self._cursor.fetchone())
+
+    def fetchall(self):
+        names = [col[0] for col in self._cursor.description or ()]
+        return [dict(zip(names, row)) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        names = [col[0] for col in self._cursor.description or ()]
+        for row in self._cursor:
+            yield dict(zip(names, row))
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, cursorclass=None):
+        # sqlite3 cursors already step through results lazily, so the
+        # server-side cursor classes used for exports need no special case.
+        return SQLiteCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def ping(self, reconnect=False):
+        self.raw.execute("SELECT 1")
+
+    def close(self):
+        self.raw.close()
+
+
+class SQLiteBackend:
+    """Embedded single-file database for one-box sites and load tests."""
+
+    name = 'sqlite'
+    schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database_sqlite.sql')
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._schema_checked = False
+
+    def connect(self):
+        raw = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            check_same_thread=False,
+            cached_statements=512,
+        )
+        for pragma in _PRAGMAS:
+            raw.execute(pragma)
+        if not self._schema_checked:
+            self.ensure_schema(raw)
+            self._schema_checked = True
+        return SQLiteConnection(raw)
+
+    def ensure_schema(self, raw):
+        """Create the tables on first use of an empty database file."""
+        exists = raw.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+        ).fetchone()
+        if not exists:
+            with open(self.schema_path, encoding='utf-8') as f:
+                raw.executescript(f.read())
+
+    def reset(self, conn):
+        if conn.raw.in_transaction:
+            conn.rollback()
+
+
+# ----------------------------------------------------------
+# BACKEND SELECTION
+# ----------------------------------------------------------
+_backend = None
+
+
+def get_backend():
+    """The storage backend selected by Config.DB_BACKEND ('mysql' or 'sqlite')."""
+    global _backend
+    if _backend is None:
+        if Config.DB_BACKEND == 'sqlite':
+            _backend = SQLiteBackend(Config.SQLITE_PATH)
+        elif Config.DB_BACKEND == 'mysql':
+            _backend = MySQLBackend()
+        else:
+            raise ValueError(f"Unknown DB_BACKEND: {Config.DB_BACKEND}")
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the storage backend (benchmarks and scripts)."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,116 @@
+import os
+import time
+import datetime
+import threading
+from models import Session as UserSession
+from utils import log_action
+from config import Config
+
+
+# ----------------------------------------------------------
+# SESSION EXPIRY SWEEPER
+# ----------------------------------------------------------
+class SessionSweeper:
+    """Periodically expires exhausted and idle sessions.
+
+    Every worker may run a sweeper; the UPDATE only touches rows that are
+    still active, so concurrent sweeps never expire a session twice.
+    """
+
+    def __init__(self, interval=60, idle_timeout=900, batch_size=500):
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._listeners = []
+        self._stats = {
+            'runs': 0,
+            'failures': 0,
+            'expired_total': 0,
+            'last_run_at': None,
+            'last_run_ms': 0.0,
+            'last_expired': 0,
+            'last_exhausted': 0,
+            'last_idle': 0,
+        }
+
+    def add_listener(self, callback):
+        """Call ``callback(session_ids)`` after each sweep that expired sessions."""
+        self._listeners.append(callback)
+
+    def ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='session-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sweep(self):
+        """Run one sweep now and return the number of sessions expired."""
+        started = time.perf_counter()
+        idle_before = None
+        if self.idle_timeout:
+            idle_before = datetime.datetime.now() - datetime.timedelta(seconds=self.idle_timeout)
+
+        try:
+            expired = UserSession.expire_stale(idle_before, self.batch_size)
+        except Exception as e:
+            self._stats['failures'] += 1
+            print(f"[SWEEPER ERROR] Sweep failed: {e}")
+            return 0
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        exhausted, idle = len(expired['exhausted']), len(expired['idle'])
+        total = exhausted + idle
+        self._stats.update({
+            'runs': self._stats['runs'] + 1,
+            'expired_total': self._stats['expired_total'] + total,
+            'last_run_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'last_run_ms': elapsed_ms,
+            'last_expired': total,
+            'last_exhausted': exhausted,
+            'last_idle': idle,
+        })
+
+        if total:
+            log_action(None, 'session_sweep',
+                       f"Expired {total} sessions ({exhausted} out of balance, {idle} idle) "
+                       f"in {elapsed_ms:.0f} ms")
+            session_ids = expired['exhausted'] + expired['idle']
+            for callback in self._listeners:
+                try:
+                    callback(session_ids)
+                except Exception as e:
+                    print(f"[SWEEPER ERROR] Listener failed: {e}")
+        return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sweep()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update({
+            'interval': self.interval,
+            'idle_timeout': self.idle_timeout,
+            'batch_size': self.batch_size,
+        })
+        return stats
+
+
+session_sweeper = SessionSweeper(
+    interval=Config.SESSION_SWEEP_INTERVAL,
+    idle_timeout=Config.SESSION_IDLE_TIMEOUT,
+    batch_size=Config.SESSION_SWEEP_BATCH_SIZE,
+)
@@ -0,0 +1,200 @@
+import time
+import datetime
+import threading
+from flask import g, request, session
+from flask_jwt_extended import create_access_token, create_refresh_token, verify_jwt_in_request, get_jwt
+from models import get_db_connection
+from config import Config
+
+
+# ----------------------------------------------------------
+# REVOCATION SET
+# ----------------------------------------------------------
+class TokenRevocations:
+    """Revoked JWTs, kept in memory and synced from ``revoked_tokens``.
+
+    A row is either one token (``jti``) or ``user:<id>``, which revokes
+    every token that user was issued up to ``revoked_at`` (e.g. when an
+    admin suspends the account). Revocations made in this worker apply
+    at once; other workers and nodes pick them up on their next sync, at
+    most ``sync_interval`` seconds later, so checking a token never
+    needs a query of its own.
+    """
+
+    # Re-read rows this far behind the newest one seen, so a revocation
+    # committed late (or from a node with a slower clock) is not skipped.
+    SYNC_OVERLAP = 60
+
+    def __init__(self, sync_interval=10, purge_interval=3600):
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+
+        self._jtis = {}
+        self._user_cutoffs = {}
+        self._watermark = None
+        self._synced_at = 0.0
+        self._purged_at = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stats = {
+            'syncs': 0,
+            'sync_failures': 0,
+            'revoked_hits': 0,
+        }
+
+    def init_app(self, jwt):
+        jwt.token_in_blocklist_loader(lambda header, claims: self.is_revoked(claims))
+
+    # ------------------------------------------------------
+    def is_revoked(self, claims):
+        self._maybe_sync()
+        revoked = claims['jti'] in self._jtis
+        if not revoked:
+            cutoff = self._user_cutoffs.get(claims.get('sub'))
+            revoked = cutoff is not None and claims['iat'] <= cutoff
+        if revoked:
+            with self._lock:
+                self._stats['revoked_hits'] += 1
+        return revoked
+
+    def revoke(self, claims):
+        """Revoke one token until it would have expired anyway."""
+        expires = claims['exp']
+        with self._lock:
+            self._jtis[claims['jti']] = expires
+        self._store(claims['jti'], claims.get('sub'), expires)
+
+    def revoke_user(self, user_id):
+        """Revoke every token issued to ``user_id`` so far."""
+        now = time.time()
+        with self._lock:
+            self._user_cutoffs[str(user_id)] = now
+        self._store(f'user:{user_id}', str(user_id), now + Config.JWT_REFRESH_TOKEN_EXPIRES.total_seconds())
+
+    def _store(self, jti, user_id, expires):
+        conn = get_db_connection()
+        if not conn:
+            print("[AUTH ERROR] Token revocation not persisted: DB connection failed")
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                INSERT INTO revoked_tokens (jti, user_id, expires_at, revoked_at)
+                VALUES (%s, %s, %s, NOW())
+                ON DUPLICATE KEY UPDATE expires_at = VALUES(expires_at), revoked_at = VALUES(revoked_at)
+                """,
+                (jti, int(user_id) if user_id else None, datetime.datetime.fromtimestamp(expires)),
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[AUTH ERROR] Token revocation not persisted: {e}")
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------
+    def _maybe_sync(self):
+        if time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        # One thread syncs; the others carry on with the current set.
+        if self._sync_lock.acquire(blocking=False):
+            try:
+                self.sync()
+            finally:
+                self._sync_lock.release()
+
+    def sync(self):
+        """Load revocations recorded since the last sync (by any worker)."""
+        self._synced_at = time.monotonic()
+        conn = get_db_connection()
+        if not conn:
+            self._stats['sync_failures'] += 1
+            return
+        cursor = conn.cursor()
+        try:
+            if time.monotonic() - self._purged_at >= self.purge_interval:
+                cursor.execute("DELETE FROM revoked_tokens WHERE expires_at < NOW()")
+                conn.commit()
+                self._purged_at = time.monotonic()
+
+            if self._watermark is None:
+                cursor.execute("SELECT jti, expires_at, revoked_at FROM revoked_tokens")
+            else:
+                cursor.execute(
+                    "SELECT jti, expires_at, revoked_at FROM revoked_tokens WHERE revoked_at >= %s",
+                    (self._watermark - datetime.timedelta(seconds=self.SYNC_OVERLAP),),
+                )
+            rows = cursor.fetchall()
+        except Exception as e:
+            self._stats['sync_failures'] += 1
+            print(f"[AUTH ERROR] Token revocation sync failed: {e}")
+            return
+        finally:
+            conn.close()
+
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                if row['jti'].startswith('user:'):
+                    user_id = row['jti'][5:]
+                    cutoff = row['revoked_at'].timestamp()
+                    self._user_cutoffs[user_id] = max(cutoff, self._user_cutoffs.get(user_id, 0))
+                else:
+                    self._jtis[row['jti']] = row['expires_at'].timestamp()
+                if self._watermark is None or row['revoked_at'] > self._watermark:
+                    self._watermark = row['revoked_at']
+            self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+            self._stats['syncs'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'revoked_tokens': len(self._jtis), 'revoked_users': len(self._user_cutoffs)})
+        return stats
+
+
+# ----------------------------------------------------------
+# TOKEN ISSUE / REQUEST IDENTITY
+# ----------------------------------------------------------
+def issue_tokens(user, refresh=True):
+    """Access (and refresh) token for a user row: id, role and status ride along as claims."""
+    claims = {'role': user['role'], 'status': user.get('status', 'active'), 'username': user['username']}
+    tokens = {
+        'access_token': create_access_token(identity=str(user['id']), additional_claims=claims),
+        'token_type': 'Bearer',
+        'expires_in': int(Config.JWT_ACCESS_TOKEN_EXPIRES.total_seconds()),
+    }
+    if refresh:
+        tokens['refresh_token'] = create_refresh_token(identity=str(user['id']), additional_claims=claims)
+    return tokens
+
+
+def current_identity():
+    """``{'user_id', 'role', 'via'}`` from the portal session or a bearer access token.
+
+    Bearer tokens are checked against the signature, expiry and the
+    revocation set only; no database read. Returns None when the request
+    carries neither (an invalid token raises and gets flask-jwt-extended's
+    401/422 response).
+    """
+    if '_identity' in g:
+        return g._identity
+    identity = None
+    if 'user_id' in session:
+        identity = {'user_id': session['user_id'], 'role': session.get('role'), 'via': 'session'}
+    elif request.headers.get('Authorization', '').startswith('Bearer '):
+        verify_jwt_in_request()
+        claims = get_jwt()
+        if claims.get('status', 'active') == 'active':
+            identity = {'user_id': int(claims['sub']), 'role': claims.get('role'), 'via': 'jwt'}
+    g._identity = identity
+    return identity
+
+
+def current_user_id():
+    identity = current_identity()
+    return identity['user_id'] if identity else None
+
+
+token_revocations = TokenRevocations(sync_interval=Config.JWT_REVOCATION_SYNC_INTERVAL)
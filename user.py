@@ -1,6 +1,11 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify, flash
+import json
+import time
+from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify, flash, Response
 from models import User, Plan, Session as UserSession, Payment
 from utils import log_action, format_data_size, format_time_duration
+from notifications import balance_notifier, balance_payload
+from config import Config
+from tokens import current_identity, current_user_id
 
 user_bp = Blueprint('user', __name__)
 
@@ -9,9 +14,12 @@ user_bp = Blueprint('user', __name__)
 # LOGIN REQUIRED DECORATOR
 # ----------------------------------------------------------
 def login_required(f):
-    """Ensure user is logged in before accessing protected routes."""
+    """Ensure user is logged in (portal session or bearer access token)."""
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        identity = current_identity()
+        if identity is None:
+            if request.headers.get('Authorization'):
+                return jsonify({'success': False, 'message': 'Login required'}), 401
             flash('Please login to continue.', 'error')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -25,7 +33,7 @@ def login_required(f):
 @user_bp.route('/dashboard')
 @login_required
 def dashboard():
-    user = User.get_by_id(session['user_id'])
+    user = User.get_by_id(current_user_id())
     if not user:
         session.clear()
         flash('Session expired. Please login again.', 'error')
@@ -44,10 +52,7 @@ def dashboard():
 @user_bp.route('/plans')
 @login_required
 def view_plans():
-    plans = Plan.get_all() or []
-    for plan in plans:
-        plan['data_limit_formatted'] = format_data_size(plan.get('data_limit', 0) * 1024 * 1024)
-        plan['time_limit_formatted'] = format_time_duration(plan.get('time_limit', 0))
+    plans = Plan.get_all_formatted()
     return render_template('plans.html', plans=plans)
 
 
@@ -69,7 +74,7 @@ def recharge():
         flash('Invalid plan selected.', 'error')
         return redirect(url_for('user.view_plans'))
 
-    user_id = session['user_id']
+    user_id = current_user_id()
 
     try:
         # Create payment record
@@ -78,6 +83,7 @@ def recharge():
         # Add balance to user
         User.update_balance(user_id, plan['data_limit'], plan['time_limit'])
 
+        balance_notifier.notify([user_id])
         log_action(user_id, 'recharge', f"Recharged with plan: {plan['name']}")
         flash(f"Successfully recharged with {plan['name']}!", 'success')
 
@@ -94,7 +100,7 @@ def recharge():
 @user_bp.route('/start_session', methods=['POST'])
 @login_required
 def start_session():
-    user_id = session['user_id']
+    user_id = current_user_id()
     device_mac = request.form.get('device_mac', 'unknown')
     ip_address = request.remote_addr
 
@@ -120,14 +126,41 @@ def start_session():
 @user_bp.route('/check_balance')
 @login_required
 def check_balance():
-    user = User.get_by_id(session['user_id'])
+    user = User.get_balance(current_user_id())
     if not user:
         return jsonify({'success': False, 'message': 'User not found'})
 
-    return jsonify({
-        'success': True,
-        'data_balance': user.get('data_balance', 0),
-        'time_balance': user.get('time_balance', 0),
-        'data_balance_formatted': format_data_size(user.get('data_balance', 0) * 1024 * 1024),
-        'time_balance_formatted': format_time_duration(user.get('time_balance', 0))
+    return jsonify(balance_payload(user))
+
+
+# ----------------------------------------------------------
+# BALANCE STREAM (SERVER-SENT EVENTS)
+# ----------------------------------------------------------
+@user_bp.route('/balance/stream')
+@login_required
+def balance_stream():
+    """Push balance changes instead of having the page poll check_balance."""
+    user = User.get_balance(current_user_id())
+    if not user:
+        return jsonify({'success': False, 'message': 'User not found'}), 404
+
+    initial = balance_payload(user)
+    sub = balance_notifier.subscribe(user['id'], initial)
+
+    def events():
+        try:
+            yield f"retry: 5000\nevent: balance\ndata: {json.dumps(initial)}\n\n"
+            deadline = time.monotonic() + Config.BALANCE_STREAM_MAX_AGE
+            while time.monotonic() < deadline:
+                payload = sub.wait(Config.BALANCE_STREAM_KEEPALIVE)
+                if payload is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: balance\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            balance_notifier.unsubscribe(sub)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
     })
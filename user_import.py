@@ -0,0 +1,185 @@
+import os
+import re
+import csv
+import time
+import threading
+from datetime import datetime
+from werkzeug.utils import secure_filename
+from models import User
+from hashing import password_hasher
+from config import Config
+
+
+REQUIRED_COLUMNS = ('username', 'email', 'password')
+MAX_LENGTHS = {'username': 50, 'email': 100, 'phone': 20}
+
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# One import per worker at a time; each one already uses every core for hashing.
+_running = threading.Lock()
+
+
+def import_dir():
+    return os.path.join(Config.UPLOAD_FOLDER, 'imports')
+
+
+def import_running():
+    return _running.locked()
+
+
+# ----------------------------------------------------------
+# BULK USER IMPORT
+# ----------------------------------------------------------
+class UserImport:
+    """Creates user accounts from an uploaded CSV.
+
+    Columns: username, email, password and optionally phone (header row
+    required, any order). ``run()`` is a generator of ``(event, data)``
+    pairs: ``progress`` as each stage advances, ``row_error`` for each
+    rejected row and a final ``done`` (or ``failed`` if the import had to
+    stop; rows inserted before that are kept). Rows are validated in memory,
+    checked against existing users with set-based queries, hashed on a
+    process pool and inserted ``chunk_size`` rows per statement; valid
+    rows are imported even when others fail. Rejected rows are also
+    written to an error report CSV next to the upload.
+    """
+
+    def __init__(self, path, chunk_size=500, hash_processes=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.hash_processes = hash_processes
+        self.errors = []
+
+    @classmethod
+    def from_upload(cls, upload, **kwargs):
+        """Save an uploaded file under UPLOAD_FOLDER/imports and check its header."""
+        os.makedirs(import_dir(), exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        path = os.path.join(import_dir(), f"users_{stamp}_{secure_filename(upload.filename) or 'upload.csv'}")
+        upload.save(path)
+        job = cls(path, **kwargs)
+        try:
+            job.read_header()
+        except ValueError:
+            os.remove(path)
+            raise
+        return job
+
+    @property
+    def report_name(self):
+        return os.path.splitext(os.path.basename(self.path))[0] + '_errors.csv'
+
+    def read_header(self):
+        with open(self.path, newline='', encoding='utf-8-sig') as f:
+            header = next(csv.reader(f), [])
+        columns = [name.strip().lower() for name in header]
+        missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+        return columns
+
+    # ------------------------------------------------------
+    def _reject(self, line, row, message):
+        error = {'line': line, 'username': row.get('username') or '', 'email': row.get('email') or '',
+                 'message': message}
+        self.errors.append(error)
+        return error
+
+    def _validate(self):
+        """Parse the file; returns the rows that pass, rejecting the rest."""
+        rows = []
+        seen_usernames, seen_emails = set(), set()
+        with open(self.path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+            for row in reader:
+                line = reader.line_num
+                row = {key: (value or '').strip() for key, value in row.items() if key}
+                missing = [name for name in REQUIRED_COLUMNS if not row.get(name)]
+                too_long = [name for name, limit in MAX_LENGTHS.items() if len(row.get(name) or '') > limit]
+                username, email = row.get('username', '').lower(), row.get('email', '').lower()
+                if missing:
+                    self._reject(line, row, f"Missing {', '.join(missing)}")
+                elif too_long:
+                    self._reject(line, row, f"Too long: {', '.join(too_long)}")
+                elif not _EMAIL.match(row['email']):
+                    self._reject(line, row, 'Invalid email address')
+                elif username in seen_usernames or email in seen_emails:
+                    self._reject(line, row, 'Duplicate username or email in file')
+                else:
+                    seen_usernames.add(username)
+                    seen_emails.add(email)
+                    rows.append((line, row))
+        return rows
+
+    def run(self):
+        if not _running.acquire(blocking=False):
+            yield 'failed', {'message': 'A user import is already running'}
+            return
+        started = time.perf_counter()
+        created = 0
+        hashes = None
+        try:
+            rows = self._validate()
+            for error in self.errors:
+                yield 'row_error', error
+            yield 'progress', {'stage': 'validate', 'done': len(rows), 'total': len(rows) + len(self.errors)}
+
+            taken_usernames, taken_emails = User.find_existing(
+                [row['username'] for _, row in rows], [row['email'] for _, row in rows], self.chunk_size)
+            accepted = []
+            for line, row in rows:
+                if row['username'].lower() in taken_usernames or row['email'].lower() in taken_emails:
+                    yield 'row_error', self._reject(line, row, 'Username or email already exists')
+                else:
+                    accepted.append((line, row))
+            yield 'progress', {'stage': 'check', 'done': len(accepted), 'total': len(rows)}
+
+            # Hash on the process pool and insert each chunk as soon as it is ready.
+            hashes = password_hasher.hash_many([row['password'] for _, row in accepted],
+                                               processes=self.hash_processes)
+            pending = []
+            for (line, row), password_hash in zip(accepted, (h for chunk in hashes for h in chunk)):
+                pending.append((line, (row['username'], row['email'], password_hash, row.get('phone') or None)))
+                if len(pending) >= self.chunk_size:
+                    created += yield from self._insert(pending)
+                    pending = []
+                    yield 'progress', {'stage': 'import', 'done': created, 'total': len(accepted)}
+            if pending:
+                created += yield from self._insert(pending)
+                yield 'progress', {'stage': 'import', 'done': created, 'total': len(accepted)}
+        except Exception as e:
+            print(f"[IMPORT ERROR] User import stopped: {e}")
+            yield 'failed', {'message': str(e), 'created': created}
+            return
+        finally:
+            if hashes is not None:
+                hashes.close()
+            _running.release()
+            self._write_report()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+        yield 'done', {
+            'created': created,
+            'failed': len(self.errors),
+            'elapsed': round(time.perf_counter() - started, 2),
+            'error_report': self.report_name if self.errors else None,
+        }
+
+    def _insert(self, pending):
+        lines = {values: line for line, values in pending}
+        count, failed = User.bulk_create([values for _, values in pending])
+        for values, message in failed:
+            yield 'row_error', self._reject(lines[values], {'username': values[0], 'email': values[1]}, message)
+        return count
+
+    def _write_report(self):
+        if not self.errors:
+            return
+        with open(os.path.join(import_dir(), self.report_name), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['line', 'username', 'email', 'message'])
+            writer.writeheader()
+            writer.writerows(sorted(self.errors, key=lambda error: error['line']))
@@ -1,30 +1,48 @@
 import os
 import hashlib
 import datetime
-import random
+import secrets
 import string
-from werkzeug.security import generate_password_hash, check_password_hash
+import atexit
 from models import get_db_connection
+from config import Config
+from audit_log import AuditLogWriter
+from hashing import password_hasher
 
 
 # ----------------------------------------------------------
 # PASSWORD HASHING
 # ----------------------------------------------------------
 def hash_password(password):
-    """Generate secure password hash."""
-    return generate_password_hash(password)
+    """Generate secure password hash (on the bounded hashing pool)."""
+    return password_hasher.hash(password)
 
 
 def verify_password(password, password_hash):
-    """Verify hashed password."""
-    return check_password_hash(password_hash, password)
+    """Verify hashed password; accepts legacy bcrypt hashes too."""
+    return password_hasher.verify(password, password_hash)
 
 
 # ----------------------------------------------------------
 # LOGGING USER ACTIONS
 # ----------------------------------------------------------
+_audit_writer = AuditLogWriter(
+    max_queue=Config.AUDIT_LOG_QUEUE_SIZE,
+    batch_size=Config.AUDIT_LOG_BATCH_SIZE,
+    flush_interval_ms=Config.AUDIT_LOG_FLUSH_MS,
+    enqueue_timeout=Config.AUDIT_LOG_ENQUEUE_TIMEOUT,
+    overflow=Config.AUDIT_LOG_OVERFLOW,
+    spill_path=Config.AUDIT_LOG_SPILL_FILE,
+)
+atexit.register(_audit_writer.shutdown)
+
+
 def log_action(user_id, action, description, ip_address=None):
     """Log user or admin actions."""
+    if Config.AUDIT_LOG_ASYNC:
+        _audit_writer.submit(user_id, action, description, ip_address)
+        return
+
     conn = get_db_connection()
     if not conn:
         print("[LOG ERROR] DB connection failed.")
@@ -44,14 +62,49 @@ def log_action(user_id, action, description, ip_address=None):
         conn.close()
 
 
+def flush_logs():
+    """Write any queued log rows now (e.g. before exit or in scripts)."""
+    _audit_writer.flush()
+
+
+def get_log_writer_stats():
+    """Queue depth and write/drop/spill counters for the audit log writer."""
+    return _audit_writer.stats()
+
+
 # ----------------------------------------------------------
 # VOUCHER CODE GENERATION
 # ----------------------------------------------------------
+VOUCHER_ALPHABET = string.ascii_uppercase + string.digits
+# Largest multiple of the alphabet size that fits in a byte; bytes at or
+# above it are rejected so every character is equally likely.
+_VOUCHER_BYTE_LIMIT = 256 - (256 % len(VOUCHER_ALPHABET))
+
+
 def generate_voucher_code(length=10):
     """Generate random alphanumeric voucher code."""
-    characters = string.ascii_uppercase + string.digits
-    code = ''.join(random.choice(characters) for _ in range(length))
-    return code
+    return generate_voucher_codes(1, length)[0]
+
+
+def generate_voucher_codes(count, length=10):
+    """Generate ``count`` distinct voucher codes from the OS CSPRNG.
+
+    Random bytes are drawn in bulk rather than one call per character.
+    """
+    alphabet = VOUCHER_ALPHABET
+    size = len(alphabet)
+    limit = _VOUCHER_BYTE_LIMIT
+    codes = set()
+    while len(codes) < count:
+        missing = count - len(codes)
+        # ~1.6% of bytes are rejected; over-draw a little to avoid extra rounds.
+        raw = secrets.token_bytes(int(missing * length * 1.05) + length)
+        chars = [alphabet[b % size] for b in raw if b < limit]
+        for i in range(0, len(chars) - length + 1, length):
+            codes.add(''.join(chars[i:i + length]))
+            if len(codes) == count:
+                break
+    return list(codes)
 
 
 # ----------------------------------------------------------
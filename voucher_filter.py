@@ -0,0 +1,252 @@
+import os
+import sys
+import math
+import time
+import hashlib
+import datetime
+import threading
+from models import Voucher, get_db_connection
+from config import Config
+
+
+UNUSED_CODES_SQL = "SELECT code FROM vouchers WHERE status = 'unused'"
+
+CREATED_CODES_SQL = "SELECT code FROM vouchers WHERE status = 'unused' AND created_at >= %s"
+
+USED_CODES_SQL = "SELECT code FROM vouchers WHERE used_at >= %s"
+
+# vouchers.code is VARCHAR(20); anything longer cannot exist.
+MAX_CODE_LENGTH = 20
+
+
+def normalize_code(code):
+    # MySQL compares codes case-insensitively, so the filter must too.
+    return str(code).strip().upper()
+
+
+# ----------------------------------------------------------
+# BLOOM FILTER
+# ----------------------------------------------------------
+class BloomFilter:
+    """Fixed-size Bloom filter sized for ``capacity`` keys at ``error_rate``.
+
+    Positions come from a keyed BLAKE2b digest (double hashing), with a
+    random key per filter so the bit pattern cannot be predicted from
+    outside the process.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._key = os.urandom(16)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16, key=self._key).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def false_positive_rate(self):
+        """Expected rate for the keys added so far."""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+# ----------------------------------------------------------
+# REDEEMABLE VOUCHER FILTER
+# ----------------------------------------------------------
+class VoucherFilter:
+    """Membership filter of redeemable (unused) voucher codes.
+
+    Voucher logins call ``might_contain`` before touching the database:
+    a code the filter has never seen cannot be redeemable, so guessing
+    traffic is answered from memory. Codes generated in this worker are
+    added at once; codes generated by other workers are picked up by an
+    incremental sync at most every ``sync_interval`` seconds. Redeemed
+    codes go into a small exact set checked after the Bloom filter, and
+    the whole filter is rebuilt from ``status = 'unused'`` every
+    ``rebuild_interval`` seconds (which also drops expired codes) or when
+    it outgrows its capacity.
+
+    Until the first build succeeds every code is let through.
+    """
+
+    # Re-read changes this far behind the last sync, so rows whose
+    # transaction committed late are not skipped.
+    SYNC_OVERLAP = 10
+
+    def __init__(self, enabled=True, error_rate=0.01, sync_interval=2, rebuild_interval=600,
+                 min_capacity=10000):
+        self.enabled = enabled
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.min_capacity = min_capacity
+
+        self._bloom = None
+        self._removed = set()
+        self._synced_at = 0.0
+        self._rebuilt_at = 0.0
+        self._sync_since = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stats = {
+            'checks': 0,
+            'rejected': 0,
+            'passed': 0,
+            'syncs': 0,
+            'rebuilds': 0,
+            'failures': 0,
+        }
+
+    # ------------------------------------------------------
+    def on_voucher_change(self, event, codes):
+        """Voucher.add_listener hook."""
+        if self._bloom is None:
+            return
+        with self._lock:
+            if event == 'created':
+                for code in codes:
+                    code = normalize_code(code)
+                    self._removed.discard(code)
+                    self._bloom.add(code)
+            elif event == 'redeemed':
+                self._removed.update(normalize_code(code) for code in codes)
+
+    def ensure_loaded(self):
+        """Build the filter now rather than on the first voucher login."""
+        if self.enabled and self._bloom is None:
+            self._refresh()
+
+    # ------------------------------------------------------
+    def _refresh(self):
+        now = time.monotonic()
+        if self._bloom is not None and now - self._synced_at < self.sync_interval:
+            return
+        # One thread refreshes; the others answer from the current filter.
+        if not self._refresh_lock.acquire(blocking=self._bloom is None):
+            return
+        try:
+            bloom = self._bloom
+            if (bloom is None or now - self._rebuilt_at >= self.rebuild_interval
+                    or bloom.count > bloom.capacity or len(self._removed) > bloom.count // 2):
+                self.rebuild()
+            elif now - self._synced_at >= self.sync_interval:
+                self.sync()
+        finally:
+            self._refresh_lock.release()
+
+    def _query(self, *statements):
+        """Run ``(sql, params)`` statements; returns the DB's NOW() (read first) and each one's codes.
+
+        The sync watermark comes from the database clock, which also writes
+        created_at and used_at, so app-host clock skew cannot skip rows.
+        """
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT NOW() AS now")
+            now = cursor.fetchone()['now']
+            results = []
+            for sql, params in statements:
+                cursor.execute(sql, params)
+                results.append([row['code'] for row in cursor.fetchall()])
+            return now, results
+        finally:
+            conn.close()
+
+    def rebuild(self):
+        """Reload every unused code, sized for twice the current count."""
+        try:
+            started_at, (codes,) = self._query((UNUSED_CODES_SQL, ()))
+        except Exception as e:
+            self._stats['failures'] += 1
+            self._synced_at = self._rebuilt_at = time.monotonic()
+            print(f"[VOUCHER ERROR] Voucher filter rebuild failed: {e}")
+            return
+        bloom = BloomFilter(max(self.min_capacity, 2 * len(codes)), self.error_rate)
+        for code in codes:
+            bloom.add(normalize_code(code))
+        with self._lock:
+            self._bloom = bloom
+            self._removed = set()
+            self._sync_since = started_at
+            self._stats['rebuilds'] += 1
+        self._synced_at = self._rebuilt_at = time.monotonic()
+
+    def sync(self):
+        """Apply codes generated or redeemed (by any worker) since the last sync."""
+        since = self._sync_since - datetime.timedelta(seconds=self.SYNC_OVERLAP)
+        try:
+            started_at, (created, used) = self._query((CREATED_CODES_SQL, (since,)), (USED_CODES_SQL, (since,)))
+        except Exception as e:
+            self._stats['failures'] += 1
+            self._synced_at = time.monotonic()
+            print(f"[VOUCHER ERROR] Voucher filter sync failed: {e}")
+            return
+        with self._lock:
+            for code in created:
+                code = normalize_code(code)
+                if code not in self._bloom:
+                    self._bloom.add(code)
+            self._removed.update(normalize_code(code) for code in used)
+            self._sync_since = started_at
+            self._stats['syncs'] += 1
+        self._synced_at = time.monotonic()
+
+    # ------------------------------------------------------
+    def might_contain(self, code):
+        """False only if ``code`` is certainly not a redeemable voucher."""
+        if not self.enabled:
+            return True
+        self._refresh()
+        code = normalize_code(code) if code else ''
+        bloom = self._bloom
+        if bloom is None:
+            allowed = True
+        else:
+            allowed = (0 < len(code) <= MAX_CODE_LENGTH and code in bloom
+                       and code not in self._removed)
+        with self._lock:
+            self._stats['checks'] += 1
+            self._stats['passed' if allowed else 'rejected'] += 1
+        return allowed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            bloom = self._bloom
+            removed = self._removed
+        stats.update({
+            'loaded': int(bloom is not None),
+            'codes': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else 0,
+            'hash_functions': bloom.hashes if bloom else 0,
+            'removed': len(removed),
+            'memory_bytes': (len(bloom.bits) if bloom else 0) + sys.getsizeof(removed),
+            'false_positive_rate': round(bloom.false_positive_rate(), 6) if bloom else 0.0,
+        })
+        return stats
+
+
+voucher_filter = VoucherFilter(
+    enabled=Config.VOUCHER_FILTER_ENABLED,
+    error_rate=Config.VOUCHER_FILTER_ERROR_RATE,
+    sync_interval=Config.VOUCHER_FILTER_SYNC_INTERVAL,
+    rebuild_interval=Config.VOUCHER_FILTER_REBUILD_INTERVAL,
+)
+Voucher.add_listener(voucher_filter.on_voucher_change)